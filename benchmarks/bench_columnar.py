@@ -0,0 +1,55 @@
+"""bench_columnar.py - compare loading a catalog from JSON with opening it as a
+memory-mapped columnar file: time to open, memory held by the process once
+open, and time of the dataframe method.
+
+    python benchmarks/bench_columnar.py 10000 100000
+"""
+
+from __future__ import print_function
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from fonoapi import CompactDevices
+from fonoapi.columnar import open_columnar, write_columnar
+from fonoapi.testing import synthetic_devices
+
+from bench_memory import best_of, retained
+
+
+def main(sizes):
+    directory = tempfile.mkdtemp()
+    print('{:>9} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}'.format(
+        'devices', 'file (MB)', 'json (s)', 'mmap (s)', 'json (MB)',
+        'mmap (MB)', 'df (s)'))
+    try:
+        for n in sizes:
+            path = os.path.join(directory, 'catalog')
+            devices = synthetic_devices(n)
+            with open(path + '.json', 'w') as f:
+                json.dump(devices, f)
+            write_columnar(devices, path + '.col')
+            del devices
+
+            def load():
+                with open(path + '.json') as f:
+                    return CompactDevices(json.load(f))
+
+            loaded, json_mb = retained(load)
+            mapped, mmap_mb = retained(open_columnar, path + '.col')
+            assert mapped.list_of_dicts() == loaded.list_of_dicts()
+            print('{:>9} {:>10.1f} {:>10.3f} {:>10.4f} {:>10.1f} {:>10.1f} '
+                  '{:>10.3f}'.format(
+                      n, os.path.getsize(path + '.col') / 2.0 ** 20,
+                      best_of(load, 1),
+                      best_of(lambda: open_columnar(path + '.col')),
+                      json_mb, mmap_mb, best_of(mapped.dataframe)))
+            mapped.table.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [10000, 100000])
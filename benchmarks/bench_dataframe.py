@@ -0,0 +1,55 @@
+"""bench_dataframe.py - compare the time and peak memory of Devices.dataframe
+with the row-wise construction it replaced (list_of_lists, then DataFrame, then
+fillna).
+
+    python benchmarks/bench_dataframe.py 1000 100000
+"""
+
+from __future__ import print_function
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from fonoapi import Devices
+from fonoapi.testing import synthetic_devices
+
+
+def rowwise_dataframe(devices, columns=None):
+    rows, columns = devices.list_of_lists(columns=columns)
+    return pd.DataFrame(rows, columns=columns).fillna(value=np.nan)
+
+
+def measure(function, *args, **kwargs):
+    """Return the result, the best time in seconds out of repeat runs and the
+    peak MB allocated. Time and memory are measured in separate runs, as
+    tracemalloc slows down allocations.
+    """
+    seconds = float('inf')
+    for _ in range(kwargs.get('repeat', 3)):
+        start = time.perf_counter()
+        result = function(*args)
+        seconds = min(seconds, time.perf_counter() - start)
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1] / 2.0 ** 20
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def main(sizes):
+    print('{:>9} {:>10} {:>10} {:>11} {:>11}'.format(
+        'devices', 'rows (s)', 'cols (s)', 'rows (MB)', 'cols (MB)'))
+    for n in sizes:
+        devices = Devices(synthetic_devices(n))
+        old, old_seconds, old_peak = measure(rowwise_dataframe, devices)
+        new, new_seconds, new_peak = measure(devices.dataframe)
+        assert old.equals(new)
+        print('{:>9} {:>10.3f} {:>10.3f} {:>11.1f} {:>11.1f}'.format(
+            n, old_seconds, new_seconds, old_peak, new_peak))
+
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [1000, 10000, 100000])
@@ -0,0 +1,61 @@
+"""bench_import.py - measure how long "import fonoapi" takes in a fresh
+interpreter, and check that it does not import the heavy dataframe
+dependencies. Exits with an error if they are imported, or if the median
+import time exceeds --max-ms.
+
+    python benchmarks/bench_import.py --runs 10 --max-ms 300
+"""
+
+from __future__ import print_function
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+HEAVY_MODULES = ['numpy', 'pandas', 'asyncio', 'aiohttp']
+
+_PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import fonoapi
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "modules": sorted(sys.modules)}))
+'''
+
+
+def probe():
+    """Import fonoapi in a fresh interpreter. Returns the seconds taken and
+    the set of modules loaded.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    output = subprocess.check_output([sys.executable, '-c', _PROBE], env=env)
+    result = json.loads(output.decode('utf-8'))
+    return result['seconds'], set(result['modules'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--max-ms', type=float, default=None)
+    args = parser.parse_args()
+    times, modules = [], set()
+    for _ in range(args.runs):
+        seconds, modules = probe()
+        times.append(seconds * 1000)
+    times.sort()
+    median = times[len(times) // 2]
+    heavy = sorted(m for m in HEAVY_MODULES if m in modules)
+    print('import fonoapi: median {:.1f} ms, min {:.1f} ms over {} runs'
+          .format(median, times[0], args.runs))
+    print('heavy modules imported: {}'.format(', '.join(heavy) or 'none'))
+    if heavy:
+        sys.exit('import fonoapi must not import {}'.format(', '.join(heavy)))
+    if args.max_ms is not None and median > args.max_ms:
+        sys.exit('import fonoapi took {:.1f} ms, more than {:.1f} ms'.format(
+            median, args.max_ms))
+
+
+if __name__ == '__main__':
+    main()
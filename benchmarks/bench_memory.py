@@ -0,0 +1,57 @@
+"""bench_memory.py - compare the memory held by Devices (one dict per device)
+and CompactDevices (a DeviceTable), and the time of their dataframe method.
+Devices are decoded from JSON, like API responses, so that every device has
+its own strings.
+
+    python benchmarks/bench_memory.py 10000 100000
+"""
+
+from __future__ import print_function
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+from fonoapi import CompactDevices, Devices
+from fonoapi.testing import synthetic_devices
+
+
+def retained(function, *args):
+    """Return the result of function and the MB it allocated and still holds.
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = function(*args)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] / 2.0 ** 20
+    tracemalloc.stop()
+    return result, size
+
+
+def best_of(function, repeat=3):
+    seconds = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds = min(seconds, time.perf_counter() - start)
+    return seconds
+
+
+def main(sizes):
+    print('{:>9} {:>11} {:>11} {:>7} {:>10} {:>10}'.format(
+        'devices', 'dicts (MB)', 'table (MB)', 'ratio', 'dicts (s)',
+        'table (s)'))
+    for n in sizes:
+        encoded = json.dumps(synthetic_devices(n))
+        devices, dicts_mb = retained(lambda: Devices(json.loads(encoded)))
+        compact, table_mb = retained(
+            lambda: CompactDevices(json.loads(encoded)))
+        assert compact.list_of_dicts() == devices.list_of_dicts()
+        print('{:>9} {:>11.1f} {:>11.1f} {:>6.1f}x {:>10.3f} {:>10.3f}'.format(
+            n, dicts_mb, table_mb, dicts_mb / table_mb,
+            best_of(devices.dataframe), best_of(compact.dataframe)))
+
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [10000, 100000])
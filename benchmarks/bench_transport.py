@@ -0,0 +1,67 @@
+"""bench_transport.py - measure the JSON decode time and the bytes transferred
+per getdevice call against a local stub server, for every JSON codec with and
+without gzip compression of the responses.
+
+    python benchmarks/bench_transport.py --sizes 100 1000 --requests 50
+"""
+
+from __future__ import print_function
+import argparse
+
+from fonoapi import FonoAPI, Metrics
+from fonoapi.codec import get_codec
+from fonoapi.testing import StubFonoAPIServer, synthetic_devices
+
+
+def codecs():
+    """The names of the codecs that are installed.
+    """
+    names = ['json']
+    try:
+        get_codec('orjson')
+        names.append('orjson')
+    except ImportError:
+        print('orjson is not installed, only measuring the json module')
+    return names
+
+
+def measure(size, requests, codec, compress):
+    """Return the mean decode and network milliseconds, and the mean bytes
+    received, of getdevice calls returning size devices.
+    """
+    with StubFonoAPIServer(synthetic_devices(size),
+                           compress=compress) as server:
+        metrics = Metrics()
+        with FonoAPI('ABC', api_url=server.api_url, metrics=metrics,
+                     json_codec=codec) as fon:
+            for _ in range(requests):
+                # Every synthetic device name contains 'Model'
+                assert len(fon.getdevice('Model').devices) == size
+    snapshot = metrics.snapshot()['getdevice']
+    phases = snapshot['phases']
+    return (1000.0 * phases['decode']['sum'] / requests,
+            1000.0 * phases['network']['sum'] / requests,
+            snapshot['bytes_received'] / float(requests))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000],
+                        help='devices per response')
+    parser.add_argument('--requests', type=int, default=50,
+                        help='getdevice calls per configuration')
+    args = parser.parse_args(argv)
+    print('{:>7} {:>7} {:>5} {:>11} {:>12} {:>10}'.format(
+        'devices', 'codec', 'gzip', 'decode (ms)', 'network (ms)', 'KB/call'))
+    for size in args.sizes:
+        for codec in codecs():
+            for compress in (False, True):
+                decode, network, received = measure(size, args.requests,
+                                                    codec, compress)
+                print('{:>7} {:>7} {:>5} {:>11.3f} {:>12.3f} {:>10.1f}'.format(
+                    size, codec, 'yes' if compress else 'no', decode, network,
+                    received / 1024.0))
+
+
+if __name__ == '__main__':
+    main()
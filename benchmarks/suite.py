@@ -0,0 +1,182 @@
+"""suite.py - benchmark suite of the fonoapi package. Runs a local stub of the
+Fono API and measures:
+
+- client throughput and latency (requests/s, p50/p99 ms) of sequential
+  getdevice calls and of concurrent getdevices batches, including requests
+  without results and error responses;
+- the cost of converting Devices to list_of_lists and to a DataFrame for
+  synthetic result sets of increasing size.
+
+Results are printed and written as JSON, to compare versions:
+
+    python benchmarks/suite.py --output results.json
+    python benchmarks/suite.py --sizes 1000 100000 --requests 500 --latency 0.002
+"""
+
+from __future__ import print_function
+import argparse
+import json
+import platform
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fonoapi
+from fonoapi import Devices, FonoAPI
+from fonoapi.testing import StubFonoAPIServer, synthetic_devices
+
+
+def percentile(values, q):
+    """The q-th percentile (0 <= q <= 100) of a list of numbers, using the
+    nearest rank.
+    """
+    values = sorted(values)
+    rank = max(0, min(len(values) - 1,
+                      int(round(q / 100.0 * len(values))) - 1))
+    return values[rank]
+
+
+def queries(n, devices):
+    """n getdevice queries: mostly existing devices (with and without brand),
+    and one in ten without results.
+    """
+    result = []
+    for i in range(n):
+        device = devices[i % len(devices)]
+        if i % 10 == 9:
+            result.append('madeupcellphone {}'.format(i))
+        elif i % 2:
+            result.append((device['DeviceName'], device['Brand']))
+        else:
+            result.append(device['DeviceName'])
+    return result
+
+
+def timed_getdevice(fon, query):
+    """Run one getdevice query, returning its latency in seconds and whether
+    it raised.
+    """
+    kwargs = fonoapi.fonoapi._query_kwargs(query)
+    start = time.perf_counter()
+    try:
+        fon.getdevice(verbose=False, **kwargs)
+        failed = False
+    except Exception:
+        failed = True
+    return time.perf_counter() - start, failed
+
+
+def bench_client(server, n_requests, concurrency):
+    """Measure throughput and latency of n_requests getdevice calls made by
+    concurrency threads sharing one FonoAPI object.
+    """
+    batch = queries(n_requests, server.devices)
+    requests_before = server.stats['requests']
+    with FonoAPI(server.token, api_url=server.api_url,
+                 pool_maxsize=concurrency, coalesce=False) as fon:
+        start = time.perf_counter()
+        if concurrency == 1:
+            results = [timed_getdevice(fon, query) for query in batch]
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                results = list(executor.map(
+                    lambda query: timed_getdevice(fon, query), batch))
+        seconds = time.perf_counter() - start
+    latencies = [latency * 1000 for latency, _ in results]
+    return {
+        'benchmark': 'client',
+        'concurrency': concurrency,
+        'requests': n_requests,
+        'http_requests': server.stats['requests'] - requests_before,
+        'errors': sum(failed for _, failed in results),
+        'seconds': seconds,
+        'requests_per_second': n_requests / seconds,
+        'p50_ms': percentile(latencies, 50),
+        'p99_ms': percentile(latencies, 99),
+    }
+
+
+def best_of(function, repeat):
+    """Best time in seconds of repeat calls to function.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_conversion(n, repeat):
+    """Measure list_of_lists and dataframe for n synthetic devices.
+    """
+    devices = Devices(synthetic_devices(n))
+    # Import pandas before timing, so its import is not counted
+    devices.dataframe(['Brand'])
+    results = []
+    for method in ('list_of_lists', 'dataframe'):
+        seconds = best_of(getattr(devices, method), repeat)
+        results.append({
+            'benchmark': 'conversion',
+            'method': method,
+            'devices': n,
+            'seconds': seconds,
+            'devices_per_second': n / seconds,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--output', default='benchmark_results.json',
+                        help='Where to write the JSON results')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 100000, 1000000],
+                        help='Numbers of devices of the conversion benchmark')
+    parser.add_argument('--requests', type=int, default=1000,
+                        help='Number of requests of each client benchmark')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8],
+                        help='Numbers of threads of the client benchmark')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Latency of the stub server, in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='Random extra latency, in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.01,
+                        help='Fraction of requests answered with an error')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Conversions are timed as the best of repeat')
+    args = parser.parse_args()
+
+    results = []
+    with StubFonoAPIServer(synthetic_devices(200), latency=args.latency,
+                           jitter=args.jitter, error_rate=args.error_rate,
+                           empty_result='list', seed=0) as server:
+        for concurrency in args.concurrency:
+            result = bench_client(server, args.requests, concurrency)
+            print(('client x{concurrency}: {requests_per_second:.0f} req/s, '
+                   'p50 {p50_ms:.2f} ms, p99 {p99_ms:.2f} ms, '
+                   '{errors} errors').format(**result))
+            results.append(result)
+    for n in args.sizes:
+        for result in bench_conversion(n, args.repeat):
+            print(('{method} x{devices}: {seconds:.3f} s '
+                   '({devices_per_second:.0f} devices/s)').format(**result))
+            results.append(result)
+
+    import pandas
+    report = {
+        'fonoapi': fonoapi.__version__,
+        'python': platform.python_version(),
+        'pandas': pandas.__version__,
+        'platform': platform.platform(),
+        'timestamp': time.time(),
+        'arguments': vars(args),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Results written to {}'.format(args.output))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,5 @@
 from .fonoapi import (
+    CircuitOpenException,
     Devices,
     FonoAPI,
     InvalidAPITokenException,
@@ -6,6 +7,16 @@ from .fonoapi import (
     StatusCodeError200Exception,
     StatusCodeErrorNon200Exception
 )
+from .aio import AsyncFonoAPI
+from .breaker import CircuitBreaker
+from .cache import LRUCache, SQLiteCache
+from .catalog import DeviceCatalog
+from .compact import CompactDevices, DeviceTable
+from .metrics import Metrics
+from .planner import BatchPlanner
+from .ratelimit import Retry, TokenBucket
+from .sync import CatalogSync, Snapshot
+from .version import __version__
 
 
 __all__ = (
@@ -14,17 +25,6 @@ __all__ = (
 )
 
 
-def __get_version():
-    """Copied from: https://github.com/kdheepak/fono
-    """
-    from os import path
-    here = path.abspath(path.dirname(__file__))
-    return(open(path.join(here, 'version.py')).read())
-
-
-exec(__get_version())
-
-
 # Included in setup.py
 __title__ = 'fonoapi'
 __summary__ = "Access Freshpixl's Fono Api to gain insight into mobile phones"
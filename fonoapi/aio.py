@@ -0,0 +1,196 @@
+"""aio.py - includes the AsyncFonoAPI class, an asyncio counterpart of FonoAPI
+built on aiohttp. asyncio and aiohttp are only imported once an AsyncFonoAPI
+object is used, so that "import fonoapi" does not pay for them.
+"""
+
+from .codec import get_codec
+from .fonoapi import Devices, _FonoAPIBase, _merge_results, _query_kwargs
+
+
+def _client_timeout(timeout):
+    """Convert a requests style timeout - None, a number of seconds, or a
+    (connect, read) tuple - into an aiohttp.ClientTimeout.
+    """
+    import aiohttp
+    if timeout is None:
+        return aiohttp.ClientTimeout(total=None)
+    if isinstance(timeout, (tuple, list)):
+        connect, read = timeout
+        return aiohttp.ClientTimeout(total=None, sock_connect=connect,
+                                     sock_read=read)
+    return aiohttp.ClientTimeout(total=timeout)
+
+
+################################################################################
+# AsyncFonoAPI - FonoAPI for asyncio applications
+################################################################################
+
+
+class AsyncFonoAPI(_FonoAPIBase):
+    """AsyncFonoAPI - asyncio version of FonoAPI. getdevice, getlatest and
+    getdevices are coroutines returning the same Devices objects and raising the
+    same exceptions as their FonoAPI counterparts. Requires aiohttp.
+
+        async with AsyncFonoAPI('TOKEN') as fon:
+            devices = await fon.getdevice('iPhone 7', brand='Apple')
+    """
+
+
+    def __init__(self, api_key, api_url='https://fonoapi.freshpixl.com/v1/',
+                 max_concurrency=10, keep_alive=True, timeout=None,
+                 json_codec=None):
+        """Initialize the AsyncFonoAPI object.
+
+        Parameters
+        ----------
+        api_key : string
+            The API token. Generate a new token at:
+            https://fonoapi.freshpixl.com/token/generate
+
+        api_url : string (optional)
+            URL of the API. The default should work.
+
+        max_concurrency : int (default is 10)
+            Maximum number of requests in flight at the same time. It bounds
+            both a semaphore around every request and the size of the
+            connection pool.
+
+        keep_alive : boolean (default is True)
+            If set to False, connections are closed after every request.
+
+        timeout : float or (float, float) tuple (optional)
+            Default timeout in seconds for every request, either a single value
+            or a (connect, read) tuple. None waits forever.
+
+        json_codec : string or codec object (optional)
+            See FonoAPI.
+
+        Returns
+        -------
+        self : AsyncFonoAPI object
+            Return self
+        """
+        assert max_concurrency >= 1, 'max_concurrency must be at least 1'
+        self.api_key = api_key
+        self.api_url = api_url
+        self.max_concurrency = max_concurrency
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.codec = get_codec(json_codec)
+        self._session = None
+        self._semaphore = None
+
+
+    @property
+    def session(self):
+        """The aiohttp.ClientSession used for every call to the API, created
+        on first use. Must be accessed from within a running event loop.
+        """
+        if self._session is None or self._session.closed:
+            import asyncio
+            try:
+                import aiohttp
+            except ImportError:
+                raise ImportError('AsyncFonoAPI requires aiohttp, install it '
+                                  'with: pip install fonoapi[async]')
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency,
+                                             force_close=not self.keep_alive)
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=_client_timeout(self.timeout))
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+
+    async def close(self):
+        """Close the underlying aiohttp session and its connections.
+        """
+        session, self._session = self._session, None
+        if session is not None:
+            await session.close()
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+    async def getdevice(self, device, position=None, brand=None,
+                        no_results_exception=False, verbose=True,
+                        timeout=None):
+        """Coroutine version of FonoAPI.getdevice, see its docstring.
+        """
+        url, postdata, headers = self.getdevice_request(device, position,
+                                                        brand)
+        result = await self.process_request(url, postdata, headers,
+                                            no_results_exception, timeout)
+        devices = Devices(result, device=device, position=position, brand=brand)
+        if verbose:
+            if devices.null:
+                print(('Could not retrieve device information for device'
+                       ' {} from the Fono API').format(device))
+        return devices
+
+
+    async def getlatest(self, brand, limit=100, no_results_exception=False,
+                        verbose=True, timeout=None):
+        """Coroutine version of FonoAPI.getlatest, see its docstring.
+        """
+        url, postdata, headers = self.getlatest_request(brand, limit)
+        result = await self.process_request(url, postdata, headers,
+                                            no_results_exception, timeout)
+        devices = Devices(result, brand=brand, limit=limit)
+        if verbose:
+            if devices.null:
+                print(('Could not retrieve brand information for brand'
+                       ' {} from the Fono API.').format(brand))
+        return devices
+
+
+    async def getdevices(self, queries, merge=False, return_exceptions=True,
+                         no_results_exception=False, verbose=False,
+                         timeout=None):
+        """Coroutine version of FonoAPI.getdevices: run getdevice for many
+        queries concurrently, at most max_concurrency at a time, and return
+        the results in input order. See FonoAPI.getdevices for the parameters.
+        """
+        import asyncio
+        queries = list(queries)
+
+        async def lookup(query):
+            kwargs = _query_kwargs(query)
+            kwargs.setdefault('no_results_exception', no_results_exception)
+            kwargs.setdefault('verbose', verbose)
+            kwargs.setdefault('timeout', timeout)
+            return await self.getdevice(**kwargs)
+
+        results = await asyncio.gather(
+            *[lookup(query) for query in queries],
+            return_exceptions=return_exceptions)
+        if not merge:
+            return results
+        return _merge_results(queries, results)
+
+
+    async def process_request(self, url, postdata, headers,
+                              no_results_exception=False, timeout=None):
+        """Uses aiohttp to call the Fono API.
+        """
+        session = self.session
+        kwargs = {}
+        if timeout is not None:
+            kwargs['timeout'] = _client_timeout(timeout)
+        async with self._semaphore:
+            async with session.post(url, data=self.codec.dumps(postdata),
+                                    headers=headers, **kwargs) as result:
+                status_code = result.status
+                try:
+                    result_json = self.codec.loads(await result.read())
+                except ValueError:
+                    if status_code == 200:
+                        raise
+                    result_json = (await result.text())[:200]
+        return self.process_result(status_code, result_json,
+                                   no_results_exception)
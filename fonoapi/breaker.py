@@ -0,0 +1,146 @@
+"""breaker.py - a circuit breaker, so that calls fail fast while the Fono API
+is down instead of each waiting for its socket to time out.
+"""
+
+import threading
+import time
+from collections import deque
+
+
+# States of a CircuitBreaker
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+
+################################################################################
+# CircuitBreaker
+################################################################################
+
+
+class CircuitBreaker(object):
+    """CircuitBreaker - tracks the outcome of the last calls to the API:
+
+    - closed: calls go through. Once at least min_calls of the last window
+      calls are recorded and the fraction of failures among them reaches
+      failure_rate, the breaker opens.
+    - open: calls are rejected (allow returns False) for reset_timeout
+      seconds, then the breaker becomes half-open.
+    - half-open: up to half_open_calls probe calls go through, the others are
+      rejected. A successful probe closes the breaker, a failed one opens it
+      again for another reset_timeout seconds.
+
+    Pass an object of this class as the breaker argument of FonoAPI. Safe to
+    share between threads.
+    """
+
+
+    def __init__(self, failure_rate=0.5, window=20, min_calls=10,
+                 reset_timeout=30.0, half_open_calls=1, clock=time.monotonic):
+        """Initialize the CircuitBreaker object.
+
+        Parameters
+        ----------
+        failure_rate : float (default is 0.5)
+            Fraction of failed calls, among the last window calls, that opens
+            the breaker.
+
+        window : int (default is 20)
+            Number of recent calls the failure rate is computed over.
+
+        min_calls : int (default is 10)
+            Minimum number of recorded calls before the breaker can open, so
+            that a couple of early errors do not open it.
+
+        reset_timeout : float (default is 30.0)
+            Seconds the breaker stays open before letting probes through.
+
+        half_open_calls : int (default is 1)
+            Maximum number of probe calls in flight while half-open.
+
+        clock : function (optional)
+            Returns the current time. Only useful for testing.
+
+        Returns
+        -------
+        self : CircuitBreaker object
+            Return self
+        """
+        assert 0 < failure_rate <= 1, 'failure_rate must be in (0, 1]'
+        assert 1 <= min_calls <= window, 'min_calls must be in [1, window]'
+        assert half_open_calls >= 1, 'half_open_calls must be at least 1'
+        self.failure_rate, self.min_calls = failure_rate, min_calls
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.clock = clock
+        self.opened = self.rejected = 0
+        self._state, self._opened_at, self._probes = CLOSED, None, 0
+        self._calls = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+
+    @property
+    def state(self):
+        """'closed', 'open' or 'half-open'.
+        """
+        with self._lock:
+            if (self._state == OPEN and
+                    self.clock() - self._opened_at >= self.reset_timeout):
+                return HALF_OPEN
+            return self._state
+
+
+    def _open(self):
+        self._state, self._opened_at, self._probes = OPEN, self.clock(), 0
+        self.opened += 1
+
+
+    def allow(self):
+        """Return whether a call may go through now. A call that is allowed
+        must report its outcome with record.
+        """
+        with self._lock:
+            if (self._state == OPEN and
+                    self.clock() - self._opened_at >= self.reset_timeout):
+                self._state = HALF_OPEN
+            if self._state == CLOSED:
+                return True
+            if (self._state == HALF_OPEN and
+                    self._probes < self.half_open_calls):
+                self._probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+
+    def record(self, success):
+        """Record the outcome of a call that was allowed.
+        """
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if success:
+                    self._state = CLOSED
+                    self._calls.clear()
+                else:
+                    self._open()
+                return
+            if self._state == OPEN:
+                # A call allowed before the breaker opened
+                return
+            self._calls.append(success)
+            failures = len(self._calls) - sum(self._calls)
+            if (len(self._calls) >= self.min_calls and
+                    failures >= self.failure_rate * len(self._calls)):
+                self._open()
+
+
+    def stats(self):
+        """Return the state, the failure rate over the window, and how many
+        times the breaker opened and how many calls it rejected, as a dict.
+        """
+        state = self.state
+        with self._lock:
+            calls = len(self._calls)
+            failures = calls - sum(self._calls)
+            return {'state': state, 'opened': self.opened,
+                    'rejected': self.rejected,
+                    'failure_rate': failures / float(calls) if calls else 0.0}
@@ -0,0 +1,334 @@
+"""cache.py - caches for the results of Fono API requests.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def cache_key(url, postdata):
+    """Build the cache key of an API request: the endpoint (the last part of
+    the url) and the postdata without the API token, serialized with sorted
+    keys so that equal requests always map to the same key.
+    """
+    endpoint = url.rstrip('/').rsplit('/', 1)[-1]
+    params = dict((k, v) for k, v in postdata.items() if k != 'token')
+    return json.dumps([endpoint, params], sort_keys=True)
+
+
+################################################################################
+# LRUCache - in-memory cache with LRU eviction and a per-entry TTL
+################################################################################
+
+
+class LRUCache(object):
+    """LRUCache - a thread-safe in-memory cache holding at most maxsize
+    entries. The least recently used entry is evicted when the cache is full,
+    and entries older than ttl seconds are treated as missing. Pass an object of
+    this class as the cache argument of FonoAPI to cache API results:
+
+        fon = FonoAPI('TOKEN', cache=LRUCache(maxsize=10000, ttl=3600))
+    """
+
+
+    def __init__(self, maxsize=1024, ttl=3600, max_stale=0,
+                 clock=time.monotonic):
+        """Initialize the LRUCache object.
+
+        Parameters
+        ----------
+        maxsize : int (default is 1024)
+            Maximum number of entries.
+
+        ttl : float (default is 3600)
+            Number of seconds an entry stays valid. None keeps entries until
+            they are evicted.
+
+        max_stale : float (default is 0)
+            Number of seconds expired entries are kept, to be served by
+            get(key, stale=True) when the API is unavailable (see
+            CircuitBreaker).
+
+        clock : function (optional)
+            Returns the current time in seconds. Only useful for testing.
+
+        Returns
+        -------
+        self : LRUCache object
+            Return self
+        """
+        assert maxsize >= 1, 'maxsize must be at least 1'
+        self.maxsize, self.ttl, self.clock = maxsize, ttl, clock
+        self.max_stale = max_stale
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get(self, key, stale=False):
+        """Return the value stored under key, or None if there is no valid
+        entry for it. If stale is True, entries expired less than max_stale
+        seconds ago are valid.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                now = self.clock()
+                if (expires is None or now < expires or
+                        stale and now < expires + self.max_stale):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                if now >= expires + self.max_stale:
+                    del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+
+    def set(self, key, value, ttl=None):
+        """Store value under key, evicting the least recently used entry if
+        the cache is full. ttl overrides the TTL of the cache for this entry.
+        """
+        if ttl is None:
+            ttl = self.ttl
+        expires = None if ttl is None else self.clock() + ttl
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+
+    def clear(self):
+        """Remove every entry. The counters are left untouched.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+    def stats(self):
+        """Return the hit, miss, eviction and expiration counters and the
+        current number of entries as a dict.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions,
+                    'expirations': self.expirations,
+                    'size': len(self._entries)}
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    def __str__(self):
+        string = '| LRUCache Object: cached Fono API results |'
+        string += '\n' + '-' * len(string)
+        for name, value in sorted(self.stats().items()):
+            string += '\n{:<11} : {}'.format(name.capitalize(), value)
+        return string
+
+
+    __repr__ = __str__
+
+
+################################################################################
+# SQLiteCache - on-disk cache shared across processes and restarts
+################################################################################
+
+
+class SQLiteCache(object):
+    """SQLiteCache - a cache of API results stored in an SQLite database, so
+    that it survives restarts and can be shared by many processes. The database
+    runs in WAL mode: any number of readers proceed concurrently with a single
+    writer. It has the same interface as LRUCache:
+
+        fon = FonoAPI('TOKEN', cache=SQLiteCache('fono.sqlite', ttl=86400))
+    """
+
+
+    _schema = '''
+        CREATE TABLE IF NOT EXISTS results (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires REAL
+        )
+    '''
+
+
+    def __init__(self, path, ttl=7 * 24 * 3600, max_entries=None,
+                 trim_every=100, timeout=30.0, max_stale=0):
+        """Initialize the SQLiteCache object, creating the database if needed.
+
+        Parameters
+        ----------
+        path : string
+            Path of the SQLite database file.
+
+        ttl : float (default is one week)
+            Number of seconds an entry stays valid. None keeps entries until
+            they are trimmed.
+
+        max_entries : int (optional)
+            Size cap. Once the cache holds more entries, the oldest ones are
+            deleted. The cap is enforced every trim_every writes (and by trim
+            and vacuum), so the cache may briefly exceed it.
+
+        trim_every : int (default is 100)
+            Number of writes between two automatic trims.
+
+        timeout : float (default is 30.0)
+            Number of seconds a writer waits for another writer to finish.
+
+        max_stale : float (default is 0)
+            Number of seconds expired entries are kept, see LRUCache.
+
+        Returns
+        -------
+        self : SQLiteCache object
+            Return self
+        """
+        self.path, self.ttl, self.max_entries = path, ttl, max_entries
+        self.trim_every, self.timeout = trim_every, timeout
+        self.max_stale = max_stale
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        self._writes = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connection().execute(self._schema)
+
+
+    def _connection(self):
+        """Return the connection of the current thread, opening it if needed.
+        Connections are never shared between threads or forked processes.
+        """
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            connection = sqlite3.connect(self.path, timeout=self.timeout,
+                                         isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection, self._local.pid = connection, pid
+        return self._local.connection
+
+
+    def _count(self, name, n=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+
+    def get(self, key, stale=False):
+        """Return the value stored under key, or None if there is no valid
+        entry for it. If stale is True, entries expired less than max_stale
+        seconds ago are valid.
+        """
+        row = self._connection().execute(
+            'SELECT value, expires FROM results WHERE key = ?',
+            (key,)).fetchone()
+        if row is None:
+            self._count('misses')
+            return None
+        value, expires = row
+        if expires is not None and time.time() >= expires + (
+                self.max_stale if stale else 0):
+            self._count('expirations')
+            self._count('misses')
+            return None
+        self._count('hits')
+        return json.loads(value)
+
+
+    def set(self, key, value, ttl=None):
+        """Store value, which must be JSON serializable, under key. ttl
+        overrides the TTL of the cache for this entry.
+        """
+        if ttl is None:
+            ttl = self.ttl
+        expires = None if ttl is None else time.time() + ttl
+        self._connection().execute(
+            'INSERT OR REPLACE INTO results (key, value, expires) '
+            'VALUES (?, ?, ?)', (key, json.dumps(value), expires))
+        with self._lock:
+            self._writes += 1
+            trim = self._writes % self.trim_every == 0
+        if trim and self.max_entries is not None:
+            self.trim()
+
+
+    def trim(self):
+        """Delete entries expired more than max_stale seconds ago, then the
+        oldest entries beyond max_entries. Returns the number of entries
+        deleted.
+        """
+        connection = self._connection()
+        deleted = connection.execute(
+            'DELETE FROM results WHERE expires <= ?',
+            (time.time() - self.max_stale,)).rowcount
+        if self.max_entries is not None:
+            evicted = connection.execute(
+                'DELETE FROM results WHERE rowid IN (SELECT rowid FROM results '
+                'ORDER BY rowid LIMIT max(0, (SELECT COUNT(*) FROM results) '
+                '- ?))', (self.max_entries,)).rowcount
+            self._count('evictions', evicted)
+            deleted += evicted
+        return deleted
+
+
+    def vacuum(self):
+        """Trim the cache and give the freed space back to the file system.
+        """
+        deleted = self.trim()
+        connection = self._connection()
+        connection.execute('VACUUM')
+        connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return deleted
+
+
+    def clear(self):
+        """Remove every entry. The counters are left untouched.
+        """
+        self._connection().execute('DELETE FROM results')
+
+
+    def close(self):
+        """Close the connection of the current thread.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = self._local.pid = None
+
+
+    def stats(self):
+        """Return the hit, miss, eviction and expiration counters of this
+        object and the current number of entries in the database as a dict.
+        """
+        with self._lock:
+            stats = {'hits': self.hits, 'misses': self.misses,
+                     'evictions': self.evictions,
+                     'expirations': self.expirations}
+        stats['size'] = len(self)
+        return stats
+
+
+    def __len__(self):
+        return self._connection().execute(
+            'SELECT COUNT(*) FROM results').fetchone()[0]
+
+
+    def __str__(self):
+        string = '| SQLiteCache Object: cached Fono API results |'
+        string += '\n' + '-' * len(string)
+        string += '\nPath        : {}'.format(self.path)
+        for name, value in sorted(self.stats().items()):
+            string += '\n{:<11} : {}'.format(name.capitalize(), value)
+        return string
+
+
+    __repr__ = __str__
@@ -0,0 +1,161 @@
+"""catalog.py - includes the DeviceCatalog class, a local, indexed copy of Fono
+API results that answers getdevice queries without calling the API.
+"""
+
+import threading
+from collections import defaultdict
+
+from .fonoapi import Devices, NoAPIResultsException
+
+
+def _ngrams(string, n):
+    """The set of substrings of length n of string.
+    """
+    return set(string[i:i + n] for i in range(len(string) - n + 1))
+
+
+################################################################################
+# DeviceCatalog
+################################################################################
+
+
+class DeviceCatalog(object):
+    """DeviceCatalog - holds devices returned by the Fono API and answers
+    getdevice queries locally, with the same semantics as the API: the device
+    name is matched case-insensitively anywhere in DeviceName, brand must match
+    Brand (ignoring case) and position picks one device out of the matches.
+    Device names are indexed by their character n-grams, so a query only
+    looks at the few devices sharing all of its n-grams.
+
+    Give a catalog to FonoAPI to look devices up locally first:
+
+        catalog = DeviceCatalog([fon.getlatest(b) for b in brands])
+        fon = FonoAPI('TOKEN', catalog=catalog)
+    """
+
+
+    def __init__(self, devices=(), n=3):
+        """Initialize the DeviceCatalog object.
+
+        Parameters
+        ----------
+        devices : iterable of Devices objects (optional)
+            Devices to add to the catalog, see add.
+
+        n : int (default is 3)
+            Length of the n-grams indexing device names. Queries shorter than
+            n fall back to a scan of the catalog (or of the brand).
+
+        Returns
+        -------
+        self : DeviceCatalog object
+            Return self
+        """
+        assert n >= 1, 'n must be at least 1'
+        self.n = n
+        self._devices, self._names, self._ids = [], [], {}
+        self._ngrams = defaultdict(set)
+        self._brands = defaultdict(set)
+        self._lock = threading.RLock()
+        for devices_ in devices:
+            self.add(devices_)
+
+
+    def add(self, devices):
+        """Add devices to the catalog. A device with the same Brand and
+        DeviceName as a device already in the catalog replaces it.
+
+        Parameters
+        ----------
+        devices : Devices object or list of dictionaries
+            Devices, as returned by the API.
+
+        Returns
+        -------
+        n : int
+            Number of devices that were not in the catalog yet.
+        """
+        if isinstance(devices, Devices):
+            devices = devices.list_of_dicts()
+        added = 0
+        with self._lock:
+            for device in devices:
+                name = device.get('DeviceName', '').lower()
+                brand = device.get('Brand', '').lower()
+                id_ = self._ids.get((brand, name))
+                if id_ is not None:
+                    self._devices[id_] = device
+                    continue
+                id_ = self._ids[(brand, name)] = len(self._devices)
+                self._devices.append(device)
+                self._names.append(name)
+                self._brands[brand].add(id_)
+                for ngram in _ngrams(name, self.n):
+                    self._ngrams[ngram].add(id_)
+                added += 1
+        return added
+
+
+    def search(self, device, brand=None):
+        """Return the list of devices (dictionaries) whose DeviceName contains
+        device, ignoring case, and whose Brand is brand if given, in the order
+        they were added.
+        """
+        query = device.lower()
+        with self._lock:
+            candidates = None
+            if brand:
+                candidates = self._brands.get(brand.lower(), set())
+            if len(query) >= self.n:
+                postings = [self._ngrams.get(ngram, set())
+                            for ngram in _ngrams(query, self.n)]
+                if candidates is not None:
+                    postings.append(candidates)
+                # Intersect from the smallest posting, brand included
+                postings.sort(key=len)
+                candidates = set(postings[0]).intersection(*postings[1:])
+            elif candidates is None:
+                candidates = range(len(self._devices))
+            return [self._devices[id_] for id_ in sorted(candidates)
+                    if query in self._names[id_]]
+
+
+    def getdevice(self, device, position=None, brand=None,
+                  no_results_exception=False):
+        """Answer a getdevice query from the catalog. See FonoAPI.getdevice
+        for the parameters.
+
+        Returns
+        -------
+        devices : Devices object
+            Matching devices, null if there are none
+        """
+        result = self.search(device, brand=brand)
+        if position is not None:
+            i = int(position)
+            result = result[i:i + 1] if i >= 0 else []
+        if not result and no_results_exception:
+            raise NoAPIResultsException('No results found in the catalog')
+        return Devices(result, device=device, position=position, brand=brand)
+
+
+    def devices(self):
+        """Return every device in the catalog as a Devices object.
+        """
+        with self._lock:
+            return Devices(list(self._devices))
+
+
+    def __len__(self):
+        return len(self._devices)
+
+
+    def __str__(self):
+        string = '| DeviceCatalog Object: local Fono API devices |'
+        string += '\n' + '-' * len(string)
+        string += '\nNumber of devices : {}'.format(len(self._devices))
+        string += '\nNumber of brands  : {}'.format(len(self._brands))
+        return string
+
+
+    __repr__ = __str__
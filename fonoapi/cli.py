@@ -0,0 +1,373 @@
+"""cli.py - the fonoapi console command, which enriches a CSV or JSONL file of
+device names with their Fono API attributes.
+
+    fonoapi devices.csv enriched.csv --token TOKEN --brand-column brand
+
+Input rows are streamed through FonoAPI.igetdevices, so memory stays bounded
+whatever the size of the input, and output rows are written in input order as
+soon as they are ready. A checkpoint file records how many rows were written;
+running the same command again after a crash resumes after the last
+checkpoint.
+"""
+
+from __future__ import print_function
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+
+from .cache import SQLiteCache
+from .fonoapi import Devices, FonoAPI, InvalidAPITokenException
+
+
+# Columns added to every output row
+STATUS_COLUMN, ERROR_COLUMN = 'fonoapi_status', 'fonoapi_error'
+
+
+def _format(path, format):
+    """The format of a file: format if given, otherwise guessed from the
+    extension of path.
+    """
+    if format:
+        return format
+    return 'jsonl' if path.lower().endswith(('.jsonl', '.json')) else 'csv'
+
+
+################################################################################
+# Input and output
+################################################################################
+
+
+def read_rows(f, format):
+    """Yield the rows of an input file as dictionaries. A JSONL line may also
+    be a plain string, the device name.
+    """
+    if format == 'csv':
+        for row in csv.DictReader(f):
+            yield row
+        return
+    for line in f:
+        line = line.strip()
+        if line:
+            row = json.loads(line)
+            yield row if isinstance(row, dict) else {'device': row}
+
+
+def count_rows(path, format):
+    """Number of rows of an input file, counting lines (so multi-line CSV
+    fields make it an overestimate). Only used for the ETA.
+    """
+    lines = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            lines += block.count(b'\n')
+    return max(0, lines - 1) if format == 'csv' else lines
+
+
+class _CSVWriter(object):
+
+    def __init__(self, f, columns, header):
+        self.writer = csv.DictWriter(f, columns, extrasaction='ignore')
+        if header:
+            self.writer.writeheader()
+
+    def write(self, row):
+        self.writer.writerow(row)
+
+
+class _JSONLWriter(object):
+
+    def __init__(self, f, columns, header):
+        self.f = f
+
+    def write(self, row):
+        self.f.write(json.dumps(row) + '\n')
+
+
+################################################################################
+# Checkpoints
+################################################################################
+
+
+def load_checkpoint(path):
+    """Return the checkpoint stored at path as a dict with the number of input
+    rows done and the size of the output file at that point, or None.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, rows, output_bytes):
+    """Atomically replace the checkpoint at path.
+    """
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump({'rows': rows, 'output_bytes': output_bytes}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+################################################################################
+# Progress
+################################################################################
+
+
+class Progress(object):
+    """Progress - prints the number of rows done, the throughput and the ETA
+    to a stream, at most every interval seconds.
+    """
+
+
+    def __init__(self, total=None, done=0, interval=1.0, stream=sys.stderr,
+                 clock=time.monotonic):
+        self.total, self.done, self.interval = total, done, interval
+        self.stream, self.clock = stream, clock
+        self.started = self._printed = clock()
+        self._started_at = done
+
+
+    def rate(self):
+        elapsed = self.clock() - self.started
+        return (self.done - self._started_at) / elapsed if elapsed else 0.0
+
+
+    def eta(self):
+        """Seconds left, or None if unknown.
+        """
+        rate = self.rate()
+        if self.total is None or not rate:
+            return None
+        return max(0.0, (self.total - self.done) / rate)
+
+
+    def line(self):
+        line = '{} rows'.format(self.done)
+        if self.total is not None:
+            line += ' of {}'.format(self.total)
+        line += ', {:.1f} rows/s'.format(self.rate())
+        eta = self.eta()
+        if eta is not None:
+            line += ', ETA {}'.format(time.strftime('%H:%M:%S',
+                                                    time.gmtime(eta)))
+        return line
+
+
+    def update(self, rows=1, force=False):
+        self.done += rows
+        now = self.clock()
+        if self.stream is not None and (force or
+                                        now - self._printed >= self.interval):
+            self._printed = now
+            self.stream.write('\r' + self.line())
+            self.stream.flush()
+
+
+################################################################################
+# Command
+################################################################################
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='fonoapi', description='Enrich a CSV or JSONL file of device '
+        'names with their attributes from the Fono API.')
+    parser.add_argument('input', help='CSV or JSONL file, - for stdin')
+    parser.add_argument('output', help='CSV or JSONL file to write')
+    parser.add_argument('--token', default=os.environ.get('FONOAPI_TOKEN'),
+                        help='API token (default: $FONOAPI_TOKEN)')
+    parser.add_argument('--api-url', default='https://fonoapi.freshpixl.com/v1/')
+    parser.add_argument('--input-format', choices=('csv', 'jsonl'),
+                        help='Default: guessed from the extension')
+    parser.add_argument('--output-format', choices=('csv', 'jsonl'),
+                        help='Default: guessed from the extension')
+    parser.add_argument('--device-column', default='device')
+    parser.add_argument('--brand-column')
+    parser.add_argument('--position-column')
+    parser.add_argument('--attributes', nargs='+',
+                        help='Device attributes written to a CSV output '
+                        '(default: all known attributes)')
+    parser.add_argument('--all-matches', action='store_true',
+                        help='Write one row per matching device instead of '
+                        'the first match only')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='Concurrent requests')
+    parser.add_argument('--rate-limit', type=float,
+                        help='Maximum requests per second')
+    parser.add_argument('--retry', type=int, default=3,
+                        help='Retries of failed requests')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--cache', help='SQLite file caching API results')
+    parser.add_argument('--checkpoint',
+                        help='Default: the output path + .checkpoint')
+    parser.add_argument('--checkpoint-every', type=int, default=1000,
+                        help='Rows between checkpoints')
+    parser.add_argument('--restart', action='store_true',
+                        help='Ignore an existing checkpoint and start over')
+    parser.add_argument('--quiet', action='store_true',
+                        help='Do not print progress')
+    args = parser.parse_args(argv)
+    if not args.token:
+        parser.error('an API token is required (--token or $FONOAPI_TOKEN)')
+    return args
+
+
+def _query(row, args):
+    """The getdevice query of an input row. Raises ValueError for a row that
+    cannot be looked up, which is then written as an error without a request.
+    """
+    device = (row.get(args.device_column) or '').strip()
+    if not device:
+        raise ValueError('No device name in column {!r}'.format(
+            args.device_column))
+    query = {'device': row[args.device_column]}
+    if args.brand_column and row.get(args.brand_column):
+        query['brand'] = row[args.brand_column]
+    if args.position_column and row.get(args.position_column) not in (None,
+                                                                       ''):
+        query['position'] = int(row[args.position_column])
+    return query
+
+
+def _output_rows(row, result, all_matches):
+    """The output rows of one input row and its result (a Devices object or
+    an exception).
+    """
+    if isinstance(result, Exception):
+        if isinstance(result, InvalidAPITokenException):
+            raise result
+        return [dict(row, **{STATUS_COLUMN: 'error',
+                             ERROR_COLUMN: repr(result)})]
+    devices = result.list_of_dicts()
+    if not devices:
+        return [dict(row, **{STATUS_COLUMN: 'no-results'})]
+    if not all_matches:
+        devices = devices[:1]
+    rows = []
+    for device in devices:
+        output = dict(device)
+        output.update(row)
+        output[STATUS_COLUMN] = 'ok'
+        rows.append(output)
+    return rows
+
+
+def run(args, stdin=sys.stdin, stderr=sys.stderr):
+    """Run the command with parsed arguments. Returns the exit status.
+    """
+    input_format = _format(args.input, args.input_format)
+    output_format = _format(args.output, args.output_format)
+    checkpoint_path = args.checkpoint or args.output + '.checkpoint'
+    checkpoint = None if args.restart else load_checkpoint(checkpoint_path)
+    if checkpoint and not os.path.exists(args.output):
+        # Nothing to resume without the output the checkpoint refers to
+        checkpoint = None
+    skip = checkpoint['rows'] if checkpoint else 0
+    progress = stderr if not args.quiet else None
+
+    if args.input == '-':
+        input_file, total = stdin, None
+    else:
+        input_file = open(args.input, newline='', encoding='utf-8')
+        total = count_rows(args.input, input_format)
+    if checkpoint:
+        # Drop the rows written after the last checkpoint, they are redone
+        output_file = open(args.output, 'r+', newline='', encoding='utf-8')
+        output_file.truncate(checkpoint['output_bytes'])
+        output_file.seek(0, os.SEEK_END)
+        if progress:
+            print('Resuming after {} rows'.format(skip), file=progress)
+    else:
+        output_file = open(args.output, 'w', newline='', encoding='utf-8')
+
+    fon = FonoAPI(args.token, api_url=args.api_url, pool_maxsize=args.workers,
+                  timeout=args.timeout, rate_limit=args.rate_limit,
+                  retry=args.retry or None,
+                  cache=SQLiteCache(args.cache) if args.cache else None)
+    try:
+        rows = itertools.islice(read_rows(input_file, input_format), skip,
+                                None)
+        columns = None
+        if output_format == 'csv':
+            # The CSV header needs the input columns: peek at the first row
+            first = next(rows, None)
+            if first is not None:
+                rows = itertools.chain([first], rows)
+            input_columns = list(first or ())
+            columns = input_columns + [
+                attribute for attribute in (args.attributes or
+                                            Devices._all_attributes)
+                if attribute not in input_columns]
+            columns += [STATUS_COLUMN, ERROR_COLUMN]
+        writer = (_CSVWriter if output_format == 'csv' else _JSONLWriter)(
+            output_file, columns, header=not checkpoint)
+        meter = Progress(total, done=skip, stream=progress)
+        # (row, error) pairs in input order: rows whose query could not be
+        # built carry the error and are not sent to the API
+        pending = deque()
+
+        def queries():
+            for row in rows:
+                try:
+                    query = _query(row, args)
+                except ValueError as error:
+                    pending.append((row, error))
+                    continue
+                pending.append((row, None))
+                yield query
+
+        def outcomes():
+            for result in fon.igetdevices(queries(),
+                                          max_workers=args.workers):
+                while pending[0][1] is not None:
+                    yield pending.popleft()
+                yield pending.popleft()[0], result
+            while pending:
+                yield pending.popleft()
+
+        done = skip
+        for row, result in outcomes():
+            for output in _output_rows(row, result, args.all_matches):
+                writer.write(output)
+            done += 1
+            meter.update()
+            if done % args.checkpoint_every == 0:
+                output_file.flush()
+                os.fsync(output_file.fileno())
+                save_checkpoint(checkpoint_path, done,
+                                os.fstat(output_file.fileno()).st_size)
+        output_file.flush()
+        os.fsync(output_file.fileno())
+        meter.update(0, force=True)
+        if progress:
+            progress.write('\n')
+    finally:
+        fon.close()
+        output_file.close()
+        if input_file is not stdin:
+            input_file.close()
+    # The run is complete: a checkpoint would make the next run skip rows
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return 0
+
+
+def main(argv=None):
+    """Entry point of the fonoapi console command.
+    """
+    args = parse_args(argv)
+    try:
+        return run(args)
+    except InvalidAPITokenException as exception:
+        print('fonoapi: {}'.format(exception), file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print('\nfonoapi: interrupted, run the same command again to resume '
+              'from the last checkpoint', file=sys.stderr)
+        return 130
@@ -0,0 +1,75 @@
+"""codec.py - the JSON encoder and decoder used for request bodies and API
+responses. orjson is used when it is installed (pip install fonoapi[fast]),
+the standard library json module otherwise.
+"""
+
+import json
+
+
+################################################################################
+# Codecs
+################################################################################
+
+
+class StdlibJSONCodec(object):
+    """StdlibJSONCodec - the json module of the standard library.
+    """
+
+    name = 'json'
+
+
+    def dumps(self, obj):
+        """Encode obj as UTF-8 JSON bytes.
+        """
+        return json.dumps(obj).encode('utf-8')
+
+
+    def loads(self, data):
+        """Decode JSON bytes or text. Raises ValueError if data is not JSON.
+        """
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        return json.loads(data)
+
+
+class OrjsonCodec(object):
+    """OrjsonCodec - orjson, which encodes and decodes several times faster
+    than the json module. Raises ImportError if orjson is not installed.
+    """
+
+    name = 'orjson'
+
+
+    def __init__(self):
+        import orjson
+        self.dumps, self.loads = orjson.dumps, orjson.loads
+
+
+CODECS = {'json': StdlibJSONCodec, 'orjson': OrjsonCodec}
+
+
+def get_codec(codec=None):
+    """Return a codec object.
+
+    Parameters
+    ----------
+    codec : string or object (optional)
+        'json' or 'orjson', or any object with dumps (returning bytes) and
+        loads (raising ValueError on invalid input) methods, returned as is.
+        None picks orjson if it is installed, and the json module otherwise.
+
+    Returns
+    -------
+    codec : object with dumps and loads methods
+    """
+    if codec is None:
+        try:
+            return OrjsonCodec()
+        except ImportError:
+            return StdlibJSONCodec()
+    if isinstance(codec, str):
+        if codec not in CODECS:
+            raise ValueError('Unknown JSON codec {}, use one of {}'.format(
+                codec, ', '.join(sorted(CODECS))))
+        return CODECS[codec]()
+    return codec
@@ -0,0 +1,297 @@
+"""columnar.py - a read-only binary catalog format that is memory-mapped
+instead of loaded, so that opening it takes milliseconds and every process
+reading it shares one copy in the page cache.
+
+File layout (sections aligned on 8 bytes):
+
+    magic         8 bytes, b'FONOCOL1'
+    header size   uint64, little-endian
+    header        JSON: version, byte order of the sections ('little' unless
+                  written otherwise), number of devices and strings,
+                  attributes, and the offset of every section
+    string index  uint64 * (strings + 1), offsets of the strings in the data
+    string data   the UTF-8 strings, concatenated
+    columns       one uint32 array per attribute, of one id per device: 0 if
+                  the device does not have the attribute, otherwise 1 + the
+                  position of its value in the string table
+
+Every distinct string is stored once, whichever attributes use it.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from functools import lru_cache
+
+from .compact import CompactDevices, DeviceTable
+from .fonoapi import Devices
+
+
+MAGIC = b'FONOCOL1'
+VERSION = 1
+
+
+def _align(offset):
+    return (offset + 7) // 8 * 8
+
+
+################################################################################
+# Writing
+################################################################################
+
+
+def write_columnar(devices, path, attributes=None, byteorder='little'):
+    """Write devices to a columnar file at path. The file is written next to
+    path and moved into place, so processes that have the previous version
+    open keep reading it safely. Every value must be a string, as the API
+    returns them: a file only holds strings, so other values would not read
+    back as they were written.
+
+    Parameters
+    ----------
+    devices : Devices object or iterable of dictionaries
+
+    path : string
+
+    attributes : list of strings (optional)
+        The schema, Devices._all_attributes by default. Attributes of the
+        devices that are not in the schema are appended to it.
+
+    byteorder : 'little' or 'big' (default is 'little')
+        Byte order of the sections, recorded in the header. Readers of the
+        other byte order swap the bytes when opening the file, at the cost
+        of copying it into memory.
+
+    Returns
+    -------
+    n : int
+        Number of devices written.
+    """
+    assert byteorder in ('little', 'big'), 'byteorder must be little or big'
+    if isinstance(devices, Devices):
+        devices = devices.devices
+    if not isinstance(devices, DeviceTable):
+        devices = DeviceTable(devices)
+    schema = list(Devices._all_attributes if attributes is None
+                  else attributes)
+    schema += [a for a in devices.attributes if a not in set(schema)]
+
+    # Merge the distinct values of every column into one string table, and
+    # translate the codes of every column into string ids
+    ids, strings, columns = {}, [], []
+    for attribute in schema:
+        encoded = devices.codes(attribute)
+        if encoded is None:
+            columns.append(array('I', bytes(4 * len(devices))))
+            continue
+        codes, values = encoded
+        translate = [0]
+        for value in values[1:]:
+            if not isinstance(value, str):
+                raise TypeError('Columnar files only hold strings, {} has the '
+                                'value {!r}'.format(attribute, value))
+            if value not in ids:
+                ids[value] = len(strings) + 1
+                strings.append(value)
+            translate.append(ids[value])
+        columns.append(array('I', [translate[code] for code in codes]))
+
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = array('Q', [0])
+    for string in encoded:
+        offsets.append(offsets[-1] + len(string))
+    header = {'version': VERSION, 'byteorder': byteorder,
+              'devices': len(devices), 'strings': len(strings),
+              'attributes': schema}
+    # The header holds the offsets of the sections, which depend on its size:
+    # reserve room for them with placeholder values of the final width
+    sizes = [len(offsets) * 8, offsets[-1], len(schema) * 4 * len(devices)]
+    header['sections'] = [0] * 3
+    start = len(MAGIC) + 8 + len(json.dumps(header)) + 3 * 20
+    for i, size in enumerate(sizes):
+        start = _align(start)
+        header['sections'][i] = start
+        start += size
+    raw = json.dumps(header).encode('utf-8')
+    raw += b' ' * (header['sections'][0] - len(MAGIC) - 8 - len(raw))
+
+    temporary = '{}.tmp{}'.format(path, os.getpid())
+    with open(temporary, 'wb') as f:
+        f.write(MAGIC + struct.pack('<Q', len(raw)) + raw)
+        for section, data in zip(header['sections'], [
+                [_bytes(offsets, byteorder)], [b''.join(encoded)],
+                [_bytes(column, byteorder) for column in columns]]):
+            f.write(b'\0' * (section - f.tell()))
+            for chunk in data:
+                f.write(chunk)
+    os.replace(temporary, path)
+    return len(devices)
+
+
+def _bytes(values, byteorder):
+    """The bytes of an array, in byteorder.
+    """
+    if sys.byteorder != byteorder:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _swapped(view, typecode):
+    """A copy of the memoryview of a section written in the other byte order,
+    as a native array.
+    """
+    values = array(typecode, view.tobytes())
+    values.byteswap()
+    return values
+
+
+################################################################################
+# ColumnarTable - a memory-mapped columnar file
+################################################################################
+
+
+class ColumnarTable(object):
+    """ColumnarTable - a columnar file, memory-mapped read-only. It has the
+    interface of DeviceTable (len, indexing, iteration, column and codes), so
+    that CompactDevices can use it, and decodes strings only when they are
+    read. Open one with open_columnar.
+    """
+
+
+    def __init__(self, path, string_cache=65536):
+        """Map the columnar file at path.
+
+        Parameters
+        ----------
+        path : string
+
+        string_cache : int (default is 65536)
+            Number of decoded strings kept for record access.
+
+        Returns
+        -------
+        self : ColumnarTable object
+            Return self
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError('{} is not a columnar device file'.format(path))
+        size, = struct.unpack_from('<Q', self._mmap, len(MAGIC))
+        start = len(MAGIC) + 8
+        header = json.loads(self._mmap[start:start + size].decode('utf-8'))
+        if header['version'] != VERSION:
+            self._mmap.close()
+            raise ValueError('Unsupported columnar file version {}'.format(
+                header['version']))
+        self.n, self.attributes = header['devices'], header['attributes']
+        self.n_strings = header['strings']
+        self._columns = dict((a, j) for j, a in enumerate(self.attributes))
+        index, data, columns = header['sections']
+        view = memoryview(self._mmap)
+        self._offsets = view[index:index + 8 * (self.n_strings + 1)].cast('Q')
+        self._codes = [view[columns + 4 * self.n * j:
+                            columns + 4 * self.n * (j + 1)].cast('I')
+                       for j in range(len(self.attributes))]
+        # Files written before the byte order was recorded are little-endian
+        if header.get('byteorder', 'little') != sys.byteorder:
+            self._offsets = _swapped(self._offsets, 'Q')
+            self._codes = [_swapped(codes, 'I') for codes in self._codes]
+        self._data = view[data:data + self._offsets[self.n_strings]]
+        self._values = None
+        self.string = lru_cache(maxsize=string_cache)(self._string)
+
+
+    def _string(self, id_):
+        """The string with id id_ (0 is None).
+        """
+        if not id_:
+            return None
+        start, stop = self._offsets[id_ - 1], self._offsets[id_]
+        return str(self._data[start:stop], 'utf-8')
+
+
+    def strings(self):
+        """Return the whole string table, decoded, as a list indexed by string
+        id (None first). Decoded once, on first call.
+        """
+        if self._values is None:
+            data = self._data.tobytes()
+            offsets = self._offsets
+            self._values = [None] + [
+                data[offsets[i]:offsets[i + 1]].decode('utf-8')
+                for i in range(self.n_strings)]
+        return self._values
+
+
+    def column(self, attribute):
+        """Return the values of attribute for every device, None where it is
+        missing.
+        """
+        j = self._columns.get(attribute)
+        if j is None:
+            return [None] * self.n
+        values = self.strings()
+        return [values[id_] for id_ in self._codes[j]]
+
+
+    def codes(self, attribute):
+        """Return the ids of attribute for every device (a memoryview of the
+        file, or an array for a file of the other byte order) and the string
+        table they index, see DeviceTable.codes.
+        """
+        j = self._columns.get(attribute)
+        if j is None:
+            return None
+        return self._codes[j], self.strings()
+
+
+    def __len__(self):
+        return self.n
+
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in range(*i.indices(self.n))]
+        if i < 0:
+            i += self.n
+        if not 0 <= i < self.n:
+            raise IndexError('ColumnarTable index out of range')
+        device = {}
+        for attribute, codes in zip(self.attributes, self._codes):
+            id_ = codes[i]
+            if id_:
+                device[attribute] = self.string(id_)
+        return device
+
+
+    def __iter__(self):
+        for i in range(self.n):
+            yield self[i]
+
+
+    def close(self):
+        """Unmap the file. Views handed out (codes) must not be used
+        afterwards.
+        """
+        for view in [self._offsets, self._data] + self._codes:
+            if isinstance(view, memoryview):
+                view.release()
+        self._mmap.close()
+
+
+def open_columnar(path, **kwargs):
+    """Open a columnar file as a CompactDevices object, without reading it:
+    pages are loaded (and shared with other processes) as they are used.
+    kwargs are stored as its input_parameters.
+
+        write_columnar(snapshot.devices(), 'catalog.col')
+        devices = open_columnar('catalog.col')  # in every worker
+    """
+    return CompactDevices(ColumnarTable(path), **kwargs)
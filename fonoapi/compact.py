@@ -0,0 +1,277 @@
+"""compact.py - column-oriented, dictionary-encoded storage for large numbers of
+devices, as an alternative to one Python dict per device.
+"""
+
+import sys
+from array import array
+
+from .fonoapi import Devices, category_dtype
+
+
+################################################################################
+# DeviceTable - devices stored as columns of codes into per-attribute values
+################################################################################
+
+
+class DeviceTable(object):
+    """DeviceTable - stores devices column by column. The schema (the list of
+    attributes) is shared by every device, each attribute keeps the list of
+    its distinct values, interned, and each device holds one 4-byte code per
+    attribute (0 when it does not have the attribute). Repeated values such as
+    'Yes', 'GSM / HSPA / LTE' or 'Li-Ion 3000 mAh battery' are stored once.
+
+    A DeviceTable behaves like a read-only list of dictionaries: len, indexing
+    and iteration build the dictionaries on the fly, with the attributes in
+    schema order.
+    """
+
+
+    def __init__(self, devices=()):
+        """Initialize the DeviceTable object.
+
+        Parameters
+        ----------
+        devices : iterable of dictionaries (optional)
+            Devices to append, see append.
+
+        Returns
+        -------
+        self : DeviceTable object
+            Return self
+        """
+        self.attributes, self._columns = [], {}
+        self._values, self._codes, self._ids = [], [], []
+        self.n = 0
+        for device in devices:
+            self.append(device)
+
+
+    def _column(self, attribute):
+        """Return the position of attribute in the schema, adding a column
+        (missing for every device so far) if it is new.
+        """
+        j = self._columns.get(attribute)
+        if j is None:
+            j = self._columns[attribute] = len(self.attributes)
+            self.attributes.append(attribute)
+            self._values.append([None])
+            self._ids.append({})
+            self._codes.append(array('I', bytes(4 * self.n)))
+        return j
+
+
+    def append(self, device):
+        """Append a device (a dictionary of attributes).
+        """
+        row = [0] * len(self.attributes)
+        for attribute, value in device.items():
+            j = self._column(attribute)
+            if j == len(row):
+                row.append(0)
+            ids = self._ids[j]
+            code = ids.get(value)
+            if code is None:
+                if isinstance(value, str):
+                    value = sys.intern(value)
+                code = ids[value] = len(self._values[j])
+                self._values[j].append(value)
+            row[j] = code
+        for codes, code in zip(self._codes, row):
+            codes.append(code)
+        self.n += 1
+
+
+    def column(self, attribute):
+        """Return the values of attribute for every device, None where it is
+        missing.
+        """
+        j = self._columns.get(attribute)
+        if j is None:
+            return [None] * self.n
+        values = self._values[j]
+        return [values[code] for code in self._codes[j]]
+
+
+    def codes(self, attribute):
+        """Return the codes of attribute (an array of unsigned ints, 0 where it
+        is missing) and its distinct values, indexed by code. None if no device
+        has the attribute.
+        """
+        j = self._columns.get(attribute)
+        if j is None:
+            return None
+        return self._codes[j], self._values[j]
+
+
+    def __len__(self):
+        return self.n
+
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in range(*i.indices(self.n))]
+        if i < 0:
+            i += self.n
+        if not 0 <= i < self.n:
+            raise IndexError('DeviceTable index out of range')
+        return dict((attribute, values[codes[i]])
+                    for attribute, values, codes in zip(
+                        self.attributes, self._values, self._codes)
+                    if codes[i])
+
+
+    def __iter__(self):
+        for i in range(self.n):
+            yield self[i]
+
+
+    def nbytes(self):
+        """Approximate memory used by the codes and the distinct values, in
+        bytes.
+        """
+        total = sum(codes.itemsize * len(codes) for codes in self._codes)
+        for values in self._values:
+            total += sys.getsizeof(values)
+            total += sum(sys.getsizeof(value) for value in values[1:])
+        return total
+
+
+################################################################################
+# CompactDevices - a Devices object backed by a DeviceTable
+################################################################################
+
+
+class CompactDevices(Devices):
+    """CompactDevices - a Devices object that keeps its devices in a
+    DeviceTable instead of a list of dictionaries, which takes several times
+    less memory for large numbers of devices. list_of_lists and dataframe are
+    built from the columns directly; list_of_dicts builds the dictionaries.
+    Create one with Devices.compact, or from a list of dictionaries:
+
+        catalog = CompactDevices(devices, brand='Apple')
+    """
+
+
+    def __init__(self, devices, **kwargs):
+        """Initialize the CompactDevices object.
+
+        Parameters
+        ----------
+        devices : list of dictionaries, or DeviceTable object
+            Or any table with the interface of DeviceTable, such as a
+            columnar.ColumnarTable.
+
+        kwargs : Dict (optional)
+            Stored as input_parameters, as with Devices.
+
+        Returns
+        -------
+        self : CompactDevices object
+            Return self
+        """
+        if not hasattr(devices, 'codes'):
+            devices = DeviceTable(devices)
+        self.not_null, self.null = len(devices) > 0, len(devices) == 0
+        self.input_parameters, self.devices = kwargs, devices
+        self._index = None
+
+
+    @property
+    def table(self):
+        return self.devices
+
+
+    def list_of_dicts(self):
+        """Return the devices as a list of new dictionaries, see
+        Devices.list_of_dicts.
+        """
+        return list(self.devices)
+
+
+    def list_of_lists(self, columns=None):
+        """See Devices.list_of_lists.
+        """
+        if self.null:
+            return [], []
+        if columns is None:
+            columns = self._all_attributes
+        return ([list(row) for row in zip(*[self.devices.column(column)
+                                            for column in columns])],
+                columns)
+
+
+    def categories(self, columns=None):
+        """See Devices.categories. Distinct values are counted on the codes.
+        """
+        import numpy as np
+        if columns is None:
+            columns = self._all_attributes
+        categories = {}
+        for column in columns:
+            encoded = self.devices.codes(column)
+            if encoded is None:
+                continue
+            codes, values = encoded
+            codes = np.frombuffer(codes, dtype=np.uintc)
+            present = [code for code in np.unique(codes).tolist()
+                       if values[code] is not None]
+            if present and len(present) <= self._categorical_ratio * (
+                    np.count_nonzero(codes)):
+                categories[column] = sorted(values[code] for code in present)
+        return categories
+
+
+    def dataframe(self, columns=None, categorical=False):
+        """See Devices.dataframe. Every column is gathered from the codes in a
+        single numpy operation. Columns sharing their values (as in a
+        ColumnarTable) share one lookup array, and categorical columns are
+        built from the codes without creating the values.
+        """
+        import numpy as np
+        import pandas as pd
+        if self.null:
+            return pd.DataFrame()
+        if columns is None:
+            columns = self._all_attributes
+        if categorical is True:
+            categorical = self.categories(columns)
+        categorical = categorical or {}
+        data, lookups = {}, {}
+        for column in columns:
+            encoded = self.devices.codes(column)
+            if encoded is None:
+                data[column] = np.full(len(self.devices), np.nan, dtype=object)
+                if column in categorical:
+                    data[column] = pd.Categorical(data[column], dtype=(
+                        category_dtype(categorical[column], [])))
+                continue
+            codes, values = encoded
+            codes = np.frombuffer(codes, dtype=np.uintc)
+            if column in categorical:
+                data[column] = _categorical(codes, values, categorical[column])
+                continue
+            lookup = lookups.get(id(values))
+            if lookup is None:
+                lookup = np.empty(len(values), dtype=object)
+                lookup[:] = values
+                lookup[0] = np.nan
+                lookup[lookup == None] = np.nan
+                lookups[id(values)] = lookup
+            data[column] = lookup[codes]
+        return pd.DataFrame(data, columns=columns)
+
+
+def _categorical(codes, values, categories):
+    """Return a pandas Categorical of the values of the codes, with the given
+    categories (see category_dtype), by translating only the codes present.
+    """
+    import numpy as np
+    import pandas as pd
+    present = [code for code in np.unique(codes).tolist()
+               if values[code] is not None]
+    dtype = category_dtype(categories, [values[code] for code in present])
+    positions = dict((value, i) for i, value in enumerate(dtype.categories))
+    translate = np.full(max(present, default=0) + 1, -1, dtype=np.intp)
+    for code in present:
+        translate[code] = positions[values[code]]
+    return pd.Categorical.from_codes(translate[codes], dtype=dtype)
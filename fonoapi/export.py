@@ -0,0 +1,151 @@
+"""export.py - writes devices to JSONL, Parquet and Arrow IPC files chunk by
+chunk, so that the peak memory does not depend on the number of devices.
+
+Parquet and Arrow need pyarrow (pip install fonoapi[arrow]).
+"""
+
+import itertools
+import json
+
+from .fonoapi import Devices
+
+
+def chunks(devices, chunksize):
+    """Yield lists of at most chunksize device dictionaries from a Devices
+    object or any iterable of dictionaries (such as a generator reading a
+    snapshot), without materializing more than one chunk at a time.
+    """
+    assert chunksize >= 1, 'chunksize must be at least 1'
+    if isinstance(devices, Devices):
+        devices = devices.devices
+    iterator = iter(devices)
+    while True:
+        chunk = list(itertools.islice(iterator, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _open(path_or_file, mode):
+    """Return a file object and whether the caller has to close it.
+    """
+    if hasattr(path_or_file, 'write'):
+        return path_or_file, False
+    if 'b' in mode:
+        return open(path_or_file, mode), True
+    return open(path_or_file, mode, encoding='utf-8'), True
+
+
+def write_jsonl(devices, path_or_file, chunksize=10000):
+    """Write devices as JSON lines, one device per line.
+
+    Parameters
+    ----------
+    devices : Devices object or iterable of dictionaries
+
+    path_or_file : string or file object
+        Where to write. A file object is left open.
+
+    chunksize : int (default is 10000)
+        Number of devices serialized per write.
+
+    Returns
+    -------
+    n : int
+        Number of devices written.
+    """
+    f, close = _open(path_or_file, 'w')
+    n = 0
+    try:
+        for chunk in chunks(devices, chunksize):
+            f.write(''.join(json.dumps(device) + '\n' for device in chunk))
+            n += len(chunk)
+    finally:
+        if close:
+            f.close()
+    return n
+
+
+################################################################################
+# Arrow and Parquet
+################################################################################
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError('Writing Parquet and Arrow files needs pyarrow: '
+                          'pip install fonoapi[arrow]')
+    return pyarrow
+
+
+def schema(columns=None):
+    """The Arrow schema of the exported devices: one nullable string column
+    per attribute, by default every attribute of Devices._all_attributes.
+    Every chunk uses the same schema, whatever attributes its devices have.
+    """
+    pa = _pyarrow()
+    columns = Devices._all_attributes if columns is None else columns
+    return pa.schema([pa.field(column, pa.string()) for column in columns])
+
+
+def record_batches(devices, columns=None, chunksize=10000):
+    """Yield pyarrow RecordBatches of at most chunksize devices, built column
+    by column straight from the dictionaries (missing attributes are null).
+    """
+    pa = _pyarrow()
+    schema_ = schema(columns)
+    for chunk in chunks(devices, chunksize):
+        yield pa.RecordBatch.from_arrays(
+            [pa.array([device.get(field.name) for device in chunk],
+                      type=pa.string()) for field in schema_],
+            schema=schema_)
+
+
+def write_parquet(devices, path, columns=None, chunksize=10000,
+                  compression='snappy'):
+    """Write devices to a Parquet file, one row group per chunk.
+
+    Parameters
+    ----------
+    devices : Devices object or iterable of dictionaries
+
+    path : string or file object
+
+    columns : list of strings (optional)
+        Attributes to write, all of Devices._all_attributes by default.
+
+    chunksize : int (default is 10000)
+        Number of devices per row group, which bounds the peak memory.
+
+    compression : string (default is 'snappy')
+        Parquet compression codec, or None.
+
+    Returns
+    -------
+    n : int
+        Number of devices written.
+    """
+    _pyarrow()
+    import pyarrow.parquet as pq
+    n = 0
+    with pq.ParquetWriter(path, schema(columns),
+                          compression=compression) as writer:
+        for batch in record_batches(devices, columns, chunksize):
+            writer.write_batch(batch)
+            n += batch.num_rows
+    return n
+
+
+def write_arrow(devices, path, columns=None, chunksize=10000):
+    """Write devices to an Arrow IPC file (also known as Feather v2), one
+    record batch per chunk. See write_parquet for the parameters.
+    """
+    pa = _pyarrow()
+    n = 0
+    with pa.ipc.new_file(path, schema(columns)) as writer:
+        for batch in record_batches(devices, columns, chunksize):
+            writer.write_batch(batch)
+            n += batch.num_rows
+    return n
@@ -2,10 +2,22 @@
 """
 
 from __future__ import print_function
-import json
-import numpy as np
-import pandas as pd
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import requests
+from requests.adapters import HTTPAdapter
+
+from .cache import cache_key
+from .codec import get_codec
+from .normalize import QueryNormalizer
+from .ratelimit import Retry, TokenBucket
+from .singleflight import SingleFlight
+
+# numpy and pandas (and the parsing module, which needs them) are imported by
+# the methods that use them, so that "import fonoapi" stays fast for code that
+# never builds a DataFrame
 
 
 ################################################################################
@@ -40,6 +52,13 @@ class NoAPIResultsException(Exception):
     pass
 
 
+class CircuitOpenException(Exception):
+    """The circuit breaker is open: the API failed too often recently, so the
+    request was not sent, and the cache had no result for it.
+    """
+    pass
+
+
 ################################################################################
 # Devices class - the FonoAPI class outputs objects of this class
 ################################################################################
@@ -127,6 +146,10 @@ class Devices(object):
         u'wlan'
     ]
 
+    # An attribute is categorical if it has at most this many distinct values
+    # per device having it
+    _categorical_ratio = 0.1
+
 
     def __init__(self, devices, **kwargs):
         """Initialize the Devices object.
@@ -160,6 +183,7 @@ class Devices(object):
         else:
             self.not_null, self.null = False, True
         self.input_parameters, self.devices = kwargs, devices
+        self._index = None
 
 
     def keys_union(self):
@@ -215,27 +239,279 @@ class Devices(object):
         return rows, columns
 
 
-    def dataframe(self, columns=None):
+    def dataframe(self, columns=None, categorical=False):
         """Constructs a Pandas DataFrame where columns correspond to attributes.
 
         Parameters
         ----------
         columns - list of strings
-            The specific attributes to include in each sublist. If a mobile
-            phone (represented as a sublist, aka a row) is missing a specific
-            attribute, there will be a value of None in the position in the
-            sublist corresponding to that specific attribute. If left blank, the
-            entire list of 69 possible attributes will be used as columns (see
-            them with the _all_attributes class attribute).
+            The specific attributes to include as columns. If a mobile phone
+            (represented as a row) is missing a specific attribute, there will
+            be a value of numpy.nan in the corresponding column. If left blank,
+            the entire list of 69 possible attributes will be used as columns
+            (see them with the _all_attributes class attribute).
+
+        categorical - bool or dict (default is False)
+            True makes the low-cardinality attributes (see categories)
+            categorical columns. A dict mapping attributes to their categories
+            makes those attributes categorical with exactly these categories,
+            in this order, so that frames of different batches built with the
+            same dict have the same dtypes and concatenate without
+            re-encoding. Values missing from the given categories are appended
+            to them, sorted, rather than lost.
+
+        Returns
+        -------
+        df - a Pandas DataFrame
+        """
+        import numpy as np
+        import pandas as pd
+        if self.null:
+            return pd.DataFrame(self.devices)
+        if columns is None:
+            columns = self._all_attributes
+        # Let pandas fill a 2-d array straight from the dictionaries (missing
+        # attributes become NaN), instead of building rows with list_of_lists
+        frame = pd.DataFrame(self.devices, columns=columns)
+        for column, dtype in zip(columns, frame.dtypes):
+            missing = frame[column].isna()
+            # Attributes missing for every device come out as floats, keep
+            # them as objects like the other (string) attributes
+            if dtype.kind == 'f' and missing.all():
+                frame[column] = frame[column].astype(object)
+            # The API does not send nulls, but turn any None into NaN like
+            # fillna used to - only object columns can hold None
+            elif dtype == object and missing.any():
+                frame[column] = np.where(missing, np.nan,
+                                         frame[column].values)
+        if categorical is True:
+            categorical = {}
+            for column in columns:
+                values = frame[column].dropna()
+                distinct = values.unique()
+                if 0 < len(distinct) <= self._categorical_ratio * len(values):
+                    categorical[column] = sorted(distinct)
+        for column, categories in (categorical or {}).items():
+            if column in frame:
+                frame[column] = frame[column].astype(category_dtype(
+                    categories, frame[column].dropna().unique()))
+        return frame
+
+
+    def categories(self, columns=None):
+        """Find the low-cardinality attributes, such as Brand, os, nfc or the
+        network bands: those with at most one distinct value per ten devices
+        having them.
+
+        Parameters
+        ----------
+        columns - list of strings
+            Attributes to consider, all of _all_attributes by default.
 
         Returns
         -------
+        categories - dict
+            Maps every low-cardinality attribute to its sorted distinct
+            values. Sorting makes the categories independent of the order of
+            the devices. Pass it as the categorical argument of dataframe or
+            iter_dataframes to encode batches identically.
+        """
+        if columns is None:
+            columns = self._all_attributes
+        categories = {}
+        for column in columns:
+            values = [device[column] for device in self.devices
+                      if device.get(column) is not None]
+            distinct = set(values)
+            if distinct and len(distinct) <= self._categorical_ratio * len(
+                    values):
+                categories[column] = sorted(distinct)
+        return categories
+
+
+    def iter_dataframes(self, chunksize=10000, columns=None,
+                        categorical=False):
+        """Yield the devices as DataFrames of at most chunksize rows, like
+        dataframe would build them, indexed by the position of the devices.
+        Only one chunk is held in memory at a time. Column dtypes are those
+        dataframe infers for each chunk, so they may differ between chunks,
+        except for categorical columns.
+
+        Parameters
+        ----------
+        chunksize : int (default is 10000)
+            Maximum number of rows per DataFrame.
+
+        columns - list of strings
+            See dataframe.
+
+        categorical - bool or dict (default is False)
+            See dataframe. True finds the categories over all the devices
+            first, so that every chunk has the same categorical dtypes.
+
+        Yields
+        ------
         df - a Pandas DataFrame
         """
+        from .export import chunks
+        if categorical is True:
+            categorical = self.categories(columns)
+        start = 0
+        for chunk in chunks(self, chunksize):
+            frame = Devices(chunk).dataframe(columns, categorical)
+            frame.index = range(start, start + len(chunk))
+            start += len(chunk)
+            yield frame
+
+
+    def typed_dataframe(self, keys=('Brand', 'DeviceName')):
+        """Constructs a Pandas DataFrame of numeric and date columns parsed
+        from the free text attributes, such as battery capacity, weight, screen
+        size, resolution, storage, price and announcement date. Parsing uses
+        precompiled patterns applied to whole columns at once.
+
+        Parameters
+        ----------
+        keys - list of strings
+            Raw attributes copied as-is at the front of the typed DataFrame,
+            to identify the devices.
+
+        Returns
+        -------
+        typed - a Pandas DataFrame
+            One row per device, see fonoapi.parsing.parse_specs for the
+            columns.
+
+        failures - a Pandas DataFrame
+            One row per attribute value that was present but could not be
+            parsed (for example an announced value of 'Not announced yet'),
+            with the columns attribute and value, indexed by device.
+        """
+        import pandas as pd
+        from .parsing import TYPED_ATTRIBUTES, parse_specs
+        columns = list(keys) + TYPED_ATTRIBUTES
         if self.null:
-            pd.DataFrame(self.devices)
-        rows, columns = self.list_of_lists(columns=columns)
-        return pd.DataFrame(rows, columns=columns).fillna(value=np.nan)
+            frame = pd.DataFrame(columns=columns, dtype=object)
+        else:
+            frame = self.dataframe(columns)
+        typed, failures = parse_specs(frame)
+        return pd.concat([frame[list(keys)], typed], axis=1), failures
+
+
+    def compact(self):
+        """Return a CompactDevices object holding the same devices in a
+        column-oriented table, which takes several times less memory than
+        the dictionaries. See fonoapi.compact.
+        """
+        from .compact import CompactDevices
+        return CompactDevices(self.devices, **self.input_parameters)
+
+
+    @property
+    def index(self):
+        """The DevicesIndex of the devices, created on first use. Its
+        attribute indices are built by the first query that needs them and
+        reused by later ones.
+        """
+        if self._index is None:
+            from .index import DevicesIndex
+            self._index = DevicesIndex(self.devices)
+        return self._index
+
+
+    def filter(self, **conditions):
+        """Return the devices meeting every condition, in their original
+        order, using the attribute indices (see the index attribute) instead
+        of scanning the devices:
+
+            devices.filter(os__contains='Android', announced_year__ge=2017,
+                           nfc='Yes')
+
+        Parameters
+        ----------
+        conditions : keyword arguments
+            attribute__lookup=value, the lookup being eq if omitted. Raw
+            attributes support eq, ne, in (a list of values) and contains (a
+            case-insensitive substring). The typed columns of typed_dataframe
+            (battery_mah, weight_g, screen_inches, storage_gb, ram_gb,
+            price_value, announced_year, announced_date...) support eq, ne,
+            in, lt, le, gt, ge and between (an inclusive (low, high) tuple).
+            Devices missing an attribute never meet a condition on it.
+
+        Returns
+        -------
+        devices : Devices object
+            Whose input_parameters are those of this object plus the
+            conditions under 'filter'.
+        """
+        positions = self.index.select(**conditions)
+        return Devices([self.devices[i] for i in positions],
+                       **dict(self.input_parameters, filter=conditions))
+
+
+    @classmethod
+    def merge(cls, *devices, key=('Brand', 'DeviceName'),
+              on_conflict='first'):
+        """Combine any number of Devices objects into one, keeping a single
+        device per key. Runs in linear time in the total number of devices,
+        using a dict keyed on the key attributes.
+
+            latest = Devices.merge(fon.getlatest('Apple'), fon.getdevice('7'))
+
+        Parameters
+        ----------
+        devices : Devices objects or lists of dictionaries
+            The devices to merge, in order. Null Devices are allowed.
+
+        key : tuple of strings (default is ('Brand', 'DeviceName'))
+            Attributes identifying a device. Devices missing one of them use
+            None for it.
+
+        on_conflict : string or function (default is 'first')
+            What to do when a device has the same key as a previous one:
+            'first' keeps the previous device, 'last' replaces it, 'update'
+            keeps a new dictionary with the attributes of both, the later
+            ones winning. A function is called as on_conflict(previous,
+            device) and returns the dictionary to keep. Merged devices stay at
+            the position of the first device with their key, and the input
+            dictionaries are never modified.
+
+        Returns
+        -------
+        devices : Devices object
+            Whose input_parameters has the input_parameters of every merged
+            Devices object under 'merged', in order, and the key under 'key'.
+        """
+        key = tuple(key)
+        if on_conflict == 'update':
+            def on_conflict(previous, device):
+                merged = dict(previous)
+                merged.update(device)
+                return merged
+        elif on_conflict == 'last':
+            on_conflict = lambda previous, device: device
+        elif on_conflict != 'first' and not callable(on_conflict):
+            raise ValueError("on_conflict must be 'first', 'last', 'update' "
+                             "or a function, not {!r}".format(on_conflict))
+        merged, index, provenance = [], {}, []
+        for devices_ in devices:
+            if isinstance(devices_, Devices):
+                provenance.append(devices_.input_parameters)
+                devices_ = devices_.devices
+            else:
+                provenance.append({})
+            for device in devices_:
+                if len(key) == 1:
+                    id_ = device.get(key[0])
+                else:
+                    id_ = tuple([device.get(attribute) for attribute in key])
+                i = index.get(id_)
+                if i is None:
+                    index[id_] = len(merged)
+                    merged.append(device)
+                elif on_conflict != 'first':
+                    merged[i] = on_conflict(merged[i], device)
+        return cls(merged, merged=provenance, key=key)
 
 
     def __str__(self):
@@ -249,12 +525,197 @@ class Devices(object):
     __repr__ = __str__
 
 
+def category_dtype(categories, observed):
+    """The pandas CategoricalDtype of the given categories, followed by the
+    observed values they are missing, sorted.
+    """
+    import pandas as pd
+    categories = list(categories)
+    known = set(categories)
+    return pd.CategoricalDtype(categories + sorted(
+        value for value in set(observed) if value not in known))
+
+
+################################################################################
+# Helper functions for bulk lookups
+################################################################################
+
+
+def _query_kwargs(query):
+    """Turn one bulk query into keyword arguments for FonoAPI.getdevice. A
+    query is either a device name, a (device, brand, position) tuple whose
+    trailing elements may be omitted, or a dict of getdevice arguments.
+    """
+    if isinstance(query, str):
+        return {'device': query}
+    if isinstance(query, dict):
+        return dict(query)
+    if isinstance(query, (tuple, list)) and 1 <= len(query) <= 3:
+        return dict(zip(('device', 'brand', 'position'), query))
+    raise ValueError('Invalid query: {!r}. Expected a device name, a (device, '
+                     'brand, position) tuple or a dict'.format(query))
+
+
+def _merge_results(queries, results):
+    """Combine the per-query results of a bulk lookup into a single Devices
+    object, recording the position of every query that raised an exception.
+    """
+    devices, errors = [], {}
+    for i, result in enumerate(results):
+        if isinstance(result, Exception):
+            errors[i] = result
+        else:
+            devices.extend(result.list_of_dicts())
+    return Devices(devices, queries=queries, errors=errors)
+
+
+################################################################################
+# _FonoAPIBase - what the synchronous and asynchronous clients have in common
+################################################################################
+
+
+class _FonoAPIBase(object):
+    """Builds requests to the Fono API and interprets its responses. Subclasses
+    implement the transport.
+    """
+
+    # QueryNormalizer applied to the parameters of every request, if any
+    normalizer = None
+
+
+    def getdevice_request(self, device, position=None, brand=None):
+        """Return the url, postdata and headers of a getdevice request. See
+        FonoAPI.getdevice for the parameters.
+        """
+        assert isinstance(device, str)
+        if brand:
+            assert isinstance(brand, str)
+        if self.normalizer is not None:
+            device = self.normalizer.device(device)
+            brand = self.normalizer.brand(brand)
+        url = self.api_url + 'getdevice'
+        postdata = {
+            'brand'    : brand,
+            'device'   : device,
+            'position' : position,
+            'token'    : self.api_key
+        }
+        headers = {
+            'content-type': 'application/json'
+        }
+        return url, postdata, headers
+
+
+    def getlatest_request(self, brand, limit=100):
+        """Return the url, postdata and headers of a getlatest request. See
+        FonoAPI.getlatest for the parameters.
+        """
+        assert isinstance(brand, str)
+        assert 1 <= limit <= 100, 'Limit must be between 1 and 100'
+        if self.normalizer is not None:
+            brand = self.normalizer.brand(brand)
+        url = self.api_url + 'getlatest'
+        postdata = {
+            'brand' : brand,
+            'limit' : limit,
+            'token' : self.api_key
+        }
+        headers = {
+            'content-type': 'application/json'
+        }
+        return url, postdata, headers
+
+
+    @staticmethod
+    def http_exception_message(status_code, result_json):
+        """Craft a short Exception message given an HTTP status code, error, and
+        message.
+        """
+        if isinstance(result_json, dict):
+            error = result_json.get('status')
+            message = result_json.get('message')
+        else:
+            error, message = None, result_json
+        return 'HTTP Exception: Status code: {}; Error: {}, Message: {}'.format(
+            status_code, error, message)
+
+
+    def process_result(self, status_code, result_json,
+                       no_results_exception=False):
+        """Interpret the status code and decoded json of an API response.
+        Returns the list of devices, or raises the appropriate exception.
+        """
+        invalid_token = ('Invalid or Blocked Token. Generate a Token at '
+                         'fonoapi.freshpixl.com')
+        no_results = 'No Matching Results Found.'
+
+        # If the HTTP status code is not 200 (OK), raise an Exception, unless
+        # the API told us what went wrong (handled below)
+        if status_code != 200:
+            if not (isinstance(result_json, dict) and
+                    result_json.get('message') in (invalid_token, no_results)):
+                raise StatusCodeErrorNon200Exception(
+                    self.http_exception_message(status_code, result_json))
+
+        # If the result json is a dictionary, some problem happened
+        if isinstance(result_json, dict):
+            result_message = result_json['message']
+            if result_message == invalid_token:
+                message = 'Your API token, {}, is not valid'.format(
+                    self.api_key)
+                raise InvalidAPITokenException(message)
+            elif result_message == no_results:
+                if no_results_exception:
+                    raise NoAPIResultsException('No results found in the API')
+                else:
+                    return []
+            else:
+                raise StatusCodeError200Exception(self.http_exception_message(
+                    status_code, result_json))
+
+        # If the result json is a list it means that we got results
+        elif isinstance(result_json, list):
+            if result_json == [[]]:
+                if no_results_exception:
+                    raise NoAPIResultsException('No results found in the API')
+                else:
+                    return []
+            return result_json
+
+        # If the result json isn't a list/dict :(
+        else:
+            raise Exception(
+                'Requets returned an object that is not a list or a dict')
+
+
+    def __str__(self):
+        name = type(self).__name__
+        string = '| {} Object: Use to connect to the FonoApi |'.format(name)
+        string += '\n' + '-' * len(string)
+        string += '\nAPI URL   : {}'.format(self.api_url)
+        string += '\nAPI Token : {}'.format(self.api_key)
+        return string
+
+
+    __repr__ = __str__
+
+
+def _wire_bytes(response):
+    """Number of bytes of the body of response as transferred, before any
+    gzip or deflate decompression.
+    """
+    try:
+        return response.raw.tell()
+    except AttributeError:
+        return len(response.content)
+
+
 ################################################################################
 # FonoAPI - the main class for this package
 ################################################################################
 
 
-class FonoAPI(object):
+class FonoAPI(_FonoAPIBase):
     """FonoApi - class for accessing Freshpixl's Fono API. The Fono API provides
     device attributes for mobile devices. Example attributes include model,
     brand, CPU info, GPU info, release date, and more. Learn more at
@@ -262,7 +723,12 @@ class FonoAPI(object):
     """
 
 
-    def __init__(self, api_key, api_url='https://fonoapi.freshpixl.com/v1/'):
+    def __init__(self, api_key, api_url='https://fonoapi.freshpixl.com/v1/',
+                 pool_connections=10, pool_maxsize=10, pool_block=False,
+                 keep_alive=True, timeout=None, cache=None, coalesce=True,
+                 rate_limit=None, retry=None, catalog=None, metrics=None,
+                 negative_ttl=None, normalize=False, json_codec=None,
+                 hedge_after=None, breaker=None):
         """Initialize the FonApi object.
 
         Parameters
@@ -274,6 +740,92 @@ class FonoAPI(object):
         api_url : string (optional)
             URL of the API. The default should work.
 
+        pool_connections : int (default is 10)
+            Number of per-host connection pools kept by the underlying
+            requests.Session.
+
+        pool_maxsize : int (default is 10)
+            Maximum number of connections kept alive in each pool. Set this to
+            at least the number of threads sharing the FonoAPI object.
+
+        pool_block : boolean (default is False)
+            If set to True, threads wait for a free connection once
+            pool_maxsize connections are in use instead of opening (and then
+            discarding) extra ones.
+
+        keep_alive : boolean (default is True)
+            If set to False, every request asks the server to close the
+            connection, which disables connection reuse.
+
+        timeout : float or (float, float) tuple (optional)
+            Default timeout in seconds for every request, either a single value
+            or a (connect, read) tuple. None waits forever. Can be overridden
+            per call with the timeout argument of getdevice and getlatest.
+
+        cache : LRUCache or SQLiteCache object (optional)
+            If given, non-empty API results are stored in the cache and
+            repeated requests are answered from it. Entries are keyed on the
+            endpoint and the request parameters, excluding the API token.
+
+        coalesce : boolean (default is True)
+            If set to True, threads making identical requests at the same time
+            share one call to the API. See the singleflight attribute for the
+            number of calls saved.
+
+        rate_limit : float or TokenBucket object (optional)
+            Maximum number of requests per second, shared by all the threads
+            using this object. A TokenBucket allows configuring bursts. None
+            does not throttle.
+
+        retry : int or Retry object (optional)
+            Retry policy for connection errors, timeouts and 429/5xx
+            responses, with exponential backoff, jitter and Retry-After
+            support. An int is the maximum number of retries with the default
+            Retry settings. None does not retry. A non-200 response that is not
+            retried raises StatusCodeErrorNon200Exception.
+
+        catalog : DeviceCatalog object (optional)
+            If given, getdevice answers from the catalog when it has matching
+            devices, and only calls the API when it does not.
+
+        metrics : Metrics object (optional)
+            If given, every getdevice and getlatest call is recorded: outcome,
+            latency, time spent throttled, in the network, backing off,
+            decoding JSON and building Devices, and bytes transferred. None
+            skips all instrumentation.
+
+        negative_ttl : float (optional)
+            If given along with a cache, requests without results are cached
+            too, for negative_ttl seconds (typically much shorter than the TTL
+            of results, as devices get added). None does not cache them.
+
+        normalize : boolean or QueryNormalizer object (default is False)
+            If set to True, device names and brands are rewritten into a
+            canonical form before every request (case, whitespace, quotes and
+            brand aliases, see fonoapi.normalize), so that equivalent queries
+            make the same request and share one cache entry. A QueryNormalizer
+            object allows custom brand aliases.
+
+        json_codec : string or codec object (optional)
+            JSON encoder and decoder of request and response bodies: 'json',
+            'orjson' or an object with dumps and loads methods, see
+            fonoapi.codec. None uses orjson if it is installed.
+
+        hedge_after : float (optional)
+            If given, a request that has not been answered after hedge_after
+            seconds is sent a second time, and whichever response arrives
+            first is used. Pick a delay around the p95 latency, so that only
+            the slowest requests are duplicated; the duplicates take a token
+            of the rate limiter and a connection of the pool. None does not
+            hedge.
+
+        breaker : CircuitBreaker object (optional)
+            If given, requests fail fast while the API keeps failing: when the
+            breaker is open, results are served from the cache, expired
+            entries included (see the max_stale argument of the caches), and
+            requests without a cached result raise CircuitOpenException. None
+            always calls the API.
+
         Returns
         -------
         self : FonoAPI object
@@ -281,10 +833,99 @@ class FonoAPI(object):
         """
         self.api_key = api_key
         self.api_url = api_url
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.cache = cache
+        self.singleflight = SingleFlight() if coalesce else None
+        if rate_limit is not None and not isinstance(rate_limit, TokenBucket):
+            rate_limit = TokenBucket(rate_limit)
+        self.rate_limiter = rate_limit
+        if retry is not None and not isinstance(retry, Retry):
+            retry = Retry(total=retry)
+        self.retry = retry
+        self.catalog = catalog
+        self.metrics = metrics
+        self.negative_ttl = negative_ttl
+        if normalize is True:
+            normalize = QueryNormalizer()
+        self.normalizer = normalize or None
+        self.codec = get_codec(json_codec)
+        self.hedge_after, self.hedges = hedge_after, 0
+        self.breaker = breaker
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._hedge_executor = None
+        self._hedge_running = 0
+
+
+    @property
+    def session(self):
+        """The pooled requests.Session used for every call to the API. It is
+        created on first use and shared by all threads using this object.
+        """
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+
+    def _create_session(self):
+        """Create a requests.Session whose adapters keep a pool of persistent
+        connections, so that consecutive calls skip the TCP/TLS handshake.
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                              pool_maxsize=self.pool_maxsize,
+                              pool_block=self.pool_block)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+
+    @property
+    def hedge_executor(self):
+        """The threads sending hedged requests, created on first use: one per
+        connection of the pool, so that no request waits for a connection
+        and the pool never opens connections it then has to discard.
+        """
+        if self._hedge_executor is None:
+            with self._session_lock:
+                if self._hedge_executor is None:
+                    self._hedge_executor = ThreadPoolExecutor(
+                        max_workers=self.pool_maxsize)
+        return self._hedge_executor
+
+
+    def close(self):
+        """Close the pooled connections and stop the hedging threads. The
+        object can still be used afterwards, a new session is created on the
+        next call.
+        """
+        with self._session_lock:
+            session, self._session = self._session, None
+            executor, self._hedge_executor = self._hedge_executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+        if session is not None:
+            session.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
 
     def getdevice(self, device, position=None, brand=None,
-                  no_results_exception=False, verbose=True):
+                  no_results_exception=False, verbose=True, timeout=None):
         """Given the name of a device (does not need to be an exact name),
         return device informaton from the Fono API in the form of a Phone
         object.
@@ -313,27 +954,27 @@ class FonoAPI(object):
             If set to True, when no results are returned by the API print out
             the name of the device that lead to no results.
 
+        timeout : float or (float, float) tuple (optional)
+            Timeout in seconds for this call. If left blank, the timeout the
+            FonoAPI object was initialized with is used.
+
         Returns
         -------
         devices : Devices object
             API results
         """
-        assert isinstance(device, str)
-        if brand:
-            assert isinstance(brand, str)
-        url = self.api_url + 'getdevice'
-        postdata = {
-            'brand'    : brand,
-            'device'   : device,
-            'position' : position,
-            'token'    : self.api_key
-        }
-        headers = {
-            'content-type': 'application/json'
-        }
-        result = self.process_request(url, postdata, headers,
-                                      no_results_exception)
-        devices = Devices(result, device=device, position=position, brand=brand)
+        url, postdata, headers = self.getdevice_request(device, position,
+                                                        brand)
+        if self.catalog is not None:
+            devices = self.catalog.getdevice(device, position, brand)
+            if devices.not_null:
+                if self.metrics is not None:
+                    self.metrics.finish(self.metrics.start(
+                        'getdevice', postdata, source='catalog'))
+                return devices
+        devices = self._devices('getdevice', url, postdata, headers,
+                                no_results_exception, timeout, device=device,
+                                position=position, brand=brand)
         if verbose:
             if devices.null:
                 print(('Could not retrieve device information for device'
@@ -342,7 +983,7 @@ class FonoAPI(object):
 
 
     def getlatest(self, brand, limit=100, no_results_exception=False,
-                  verbose=True):
+                  verbose=True, timeout=None):
         """Given the name of a device (does not need to be an exact name),
         return device informaton from the Fono API in the form of a Phone
         object.
@@ -365,25 +1006,19 @@ class FonoAPI(object):
             If set to True, when no results are returned by the API print out
             the name of the device that lead to no results.
 
+        timeout : float or (float, float) tuple (optional)
+            Timeout in seconds for this call. If left blank, the timeout the
+            FonoAPI object was initialized with is used.
+
         Returns
         -------
         devices : Devices object
             API results
         """
-        assert isinstance(brand, str)
-        assert 1 <= limit <= 100, 'Limit must be between 1 and 100'
-        url = self.api_url + 'getlatest'
-        postdata = {
-            'brand' : brand,
-            'limit' : limit,
-            'token' : self.api_key
-        }
-        headers = {
-            'content-type': 'application/json'
-        }
-        result = self.process_request(url, postdata, headers,
-                                      no_results_exception)
-        devices = Devices(result, brand=brand, limit=limit)
+        url, postdata, headers = self.getlatest_request(brand, limit)
+        devices = self._devices('getlatest', url, postdata, headers,
+                                no_results_exception, timeout, brand=brand,
+                                limit=limit)
         if verbose:
             if devices.null:
                 print(('Could not retrieve brand information for brand'
@@ -391,71 +1026,316 @@ class FonoAPI(object):
         return devices
 
 
-    @staticmethod
-    def http_exception_message(status_code, result_json):
-        """Craft a short Exception message given an HTTP status code, error, and
-        message.
-        """
-        error = result_json['status']
-        message = result_json['message']
-        return 'HTTP Exception: Status code: {}; Error: {}, Message: {}'.format(
-            status_code, error, message)
-
+    def igetdevices(self, queries, max_workers=8, max_in_flight=None,
+                    return_exceptions=True, no_results_exception=False,
+                    verbose=False, timeout=None):
+        """Run getdevice for many queries on a pool of threads, yielding the
+        results lazily and in the same order as the queries. Queries are
+        consumed as the results are yielded, so arbitrarily long iterables
+        are processed with bounded memory.
 
-    def process_request(self, url, postdata, headers,
-                        no_results_exception=False):
-        """Uses the requests library to call the Fono API.
+        Parameters
+        ----------
+        queries : iterable
+            Each element is either a device name, a (device, brand, position)
+            tuple (brand and position may be omitted), or a dict of keyword
+            arguments to getdevice.
+
+        max_workers : int (default is 8)
+            Number of threads issuing requests concurrently. Keep this at most
+            pool_maxsize so that every thread can reuse a pooled connection.
+
+        max_in_flight : int (optional)
+            Maximum number of queries submitted but not yet yielded. Defaults
+            to twice max_workers.
+
+        return_exceptions : boolean (default is True)
+            If set to True, an exception raised by one query is yielded in
+            place of its Devices object and the remaining queries carry on. If
+            False, the exception is raised.
+
+        no_results_exception, verbose, timeout
+            Passed on to getdevice. Note that verbose is False by default.
+
+        Yields
+        ------
+        devices : Devices object (or Exception)
+            API results for each query
         """
-        result = requests.post(
-            url, data=json.dumps(postdata), headers=headers)
-        invalid_token = ('Invalid or Blocked Token. Generate a Token at '
-                         'fonoapi.freshpixl.com')
-        no_results = 'No Matching Results Found.'
-        status_code = result.status_code
-        result_json = result.json()
-
-        # If the HTTP status code is not 200 (OK), raise an Exception
-        if status_code != 200:
-            StatusCodeErrorNon200Exception(self.http_exception_message(
-                status_code, result_json))
-
-        # If the result json is a dictionary, some problem happened
-        if isinstance(result_json, dict):
-            result_message = result_json['message']
-            if result_message == invalid_token:
-                message = 'Your API token, {}, is not valid'.format(
-                    self.api_key)
-                raise InvalidAPITokenException(message)
-            elif result_message == no_results:
-                if no_results_exception:
-                    raise NoAPIResultsException('No results found in the API')
-                else:
-                    return []
-            else:
-                raise StatusCodeError200Exception(self.http_exception_message(
-                    status_code, result_json))
-
-        # If the result json is a list it means that we got results
-        elif isinstance(result_json, list):
-            if result_json == [[]]:
-                if no_results_exception:
-                    raise NoAPIResultsException('No results found in the API')
-                else:
-                    return []
-            return result_json
+        assert max_workers >= 1, 'max_workers must be at least 1'
+        if max_in_flight is None:
+            max_in_flight = 2 * max_workers
+        assert max_in_flight >= 1, 'max_in_flight must be at least 1'
+
+        def lookup(query):
+            kwargs = _query_kwargs(query)
+            kwargs.setdefault('no_results_exception', no_results_exception)
+            kwargs.setdefault('verbose', verbose)
+            kwargs.setdefault('timeout', timeout)
+            return self.getdevice(**kwargs)
+
+        def result(future):
+            try:
+                return future.result()
+            except Exception as exception:
+                if not return_exceptions:
+                    raise
+                return exception
+
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            try:
+                for query in queries:
+                    if len(pending) >= max_in_flight:
+                        yield result(pending.popleft())
+                    pending.append(executor.submit(lookup, query))
+                while pending:
+                    yield result(pending.popleft())
+            finally:
+                for future in pending:
+                    future.cancel()
+
+
+    def getdevices(self, queries, max_workers=8, max_in_flight=None,
+                   merge=False, return_exceptions=True,
+                   no_results_exception=False, verbose=False, timeout=None):
+        """Run getdevice for many queries concurrently, see igetdevices.
 
-        # If the result json isn't a list/dict :(
-        else:
-            raise Exception(
-                'Requets returned an object that is not a list or a dict')
+        Parameters
+        ----------
+        merge : boolean (default is False)
+            If set to False, return a list with one Devices object (or
+            Exception, see return_exceptions) per query, in input order. If
+            True, return a single Devices object containing the devices of
+            every query, in input order. Its input_parameters are the list of
+            queries and a dict mapping the position of every failed query to
+            its exception.
 
+        See igetdevices for the remaining parameters.
 
-    def __str__(self):
-        string = '| FonoAPI Object: Use to connect to the FonoApi |'
-        string += '\n-------------------------------------------------'
-        string += '\nAPI URL   : {}'.format(self.api_url)
-        string += '\nAPI Token : {}'.format(self.api_key)
-        return string
+        Returns
+        -------
+        devices : list of Devices objects, or a Devices object
+            API results
+        """
+        queries = list(queries)
+        results = list(self.igetdevices(
+            queries, max_workers=max_workers, max_in_flight=max_in_flight,
+            return_exceptions=return_exceptions,
+            no_results_exception=no_results_exception, verbose=verbose,
+            timeout=timeout))
+        if not merge:
+            return results
+        return _merge_results(queries, results)
+
+
+    def _devices(self, endpoint, url, postdata, headers, no_results_exception,
+                 timeout, **parameters):
+        """Call process_request and wrap its result in a Devices object with
+        the given parameters, recording the call if the object has metrics.
+        """
+        if self.metrics is None:
+            result = self.process_request(url, postdata, headers,
+                                          no_results_exception, timeout)
+            return Devices(result, **parameters)
+        record = self.metrics.start(endpoint, postdata)
+        try:
+            result = self.process_request(url, postdata, headers,
+                                          no_results_exception, timeout,
+                                          record)
+            start = time.perf_counter()
+            devices = Devices(result, **parameters)
+            record.add_time('devices', time.perf_counter() - start)
+        except Exception as exception:
+            self.metrics.finish(record, exception)
+            raise
+        self.metrics.finish(record, empty=devices.null)
+        return devices
 
 
-    __repr__ = __str__
+    def process_request(self, url, postdata, headers,
+                        no_results_exception=False, timeout=None, record=None):
+        """Uses the requests library to call the Fono API. When the object has
+        a cache, cached results are returned without calling the API, and when
+        request coalescing is on, identical concurrent requests share a single
+        call to the API (made with the timeout of the first caller). Cached
+        empty results (see negative_ttl) count as results without matches.
+        While the circuit breaker is open, expired cached results are served
+        too. record is the RequestRecord of the call when metrics are on.
+        """
+        key = result = None
+        if self.cache is not None or self.singleflight is not None:
+            key = cache_key(url, postdata)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                if record is not None:
+                    record.source = 'cache'
+                result = list(cached)
+        try:
+            if result is None and self.singleflight is not None:
+                result = list(self.singleflight.do(
+                    key, self._request, url, postdata, headers, timeout, key,
+                    record))
+                if record is not None and record.source is None:
+                    record.source = 'coalesced'
+            elif result is None:
+                result = self._request(url, postdata, headers, timeout, key,
+                                       record)
+        except CircuitOpenException:
+            cached = None
+            if self.cache is not None:
+                cached = self.cache.get(key, stale=True)
+            if cached is None:
+                raise
+            if record is not None:
+                record.source = 'stale'
+            result = list(cached)
+        if not result and no_results_exception:
+            raise NoAPIResultsException('No results found in the API')
+        return result
+
+
+    def _request(self, url, postdata, headers, timeout=None, key=None,
+                 record=None):
+        """Post a request to the API unless the circuit breaker is open, and
+        store non-empty results in the cache under key. Empty results are
+        returned as an empty list. The time spent in every phase is added to
+        record, if given; the clock is only read when it is.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        # Encoded first: a call the breaker allows must record its outcome,
+        # or a half-open breaker would wait for its probe forever
+        data = self.codec.dumps(postdata)
+        if self.breaker is not None and not self.breaker.allow():
+            raise CircuitOpenException(
+                'The Fono API failed too often recently, the circuit breaker '
+                'is open')
+        if record is not None:
+            record.source = 'api'
+        if self.breaker is None:
+            response = self._post(url, data, headers, timeout, record)
+        else:
+            try:
+                response = self._post(url, data, headers, timeout, record)
+            except Exception:
+                self.breaker.record(False)
+                raise
+            self.breaker.record(response.status_code < 500 and
+                                response.status_code != 429)
+        if record is None:
+            return self._process_response(response, key)
+        start = time.perf_counter()
+        try:
+            return self._process_response(response, key)
+        finally:
+            record.add_time('decode', time.perf_counter() - start)
+
+
+    def _post(self, url, data, headers, timeout, record=None):
+        """Post data to url, throttled by the rate limiter and retried
+        according to the retry policy, and return the last response.
+        """
+        if record is not None:
+            clock = time.perf_counter
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                waited = self.rate_limiter.acquire()
+                if record is not None:
+                    record.add_time('throttle', waited)
+            if record is not None:
+                record.attempts += 1
+                record.bytes_sent += len(data)
+                start = clock()
+            try:
+                response = self._send(url, data, headers, timeout, record)
+            except (requests.ConnectionError, requests.Timeout):
+                if record is not None:
+                    record.add_time('network', clock() - start)
+                if self.retry is None or attempt >= self.retry.total:
+                    raise
+                delay = self.retry.delay(attempt)
+            else:
+                if record is not None:
+                    record.add_time('network', clock() - start)
+                    record.status_code = response.status_code
+                    record.bytes_received += _wire_bytes(response)
+                if (self.retry is None or attempt >= self.retry.total or
+                        not self.retry.is_retryable(response.status_code)):
+                    return response
+                delay = self.retry.delay(attempt, response)
+            attempt += 1
+            if record is not None:
+                record.add_time('backoff', delay)
+            self.retry.sleep(delay)
+
+
+    def _send(self, url, data, headers, timeout, record=None):
+        """Post data to url once, or, with hedge_after set, post it again if
+        it is not answered within hedge_after seconds of being sent, and
+        return the first response. Raises the exception of the first request
+        if both fail. The slower request is left to complete in the
+        background. No duplicate is sent while every hedging thread is busy:
+        the delay would come from the queue, not from the API.
+        """
+        if self.hedge_after is None:
+            return self.session.post(url, data=data, headers=headers,
+                                     timeout=timeout)
+        session, executor = self.session, self.hedge_executor
+        started = threading.Event()
+
+        def post():
+            with self._session_lock:
+                self._hedge_running += 1
+            started.set()
+            try:
+                return session.post(url, data=data, headers=headers,
+                                    timeout=timeout)
+            finally:
+                with self._session_lock:
+                    self._hedge_running -= 1
+
+        futures = [executor.submit(post)]
+        # The timer starts when the request is sent, not while it is queued
+        started.wait()
+        if (not wait(futures, timeout=self.hedge_after).done and
+                self._hedge_running < self.pool_maxsize):
+            if self.rate_limiter is not None:
+                waited = self.rate_limiter.acquire()
+                if record is not None:
+                    record.add_time('throttle', waited)
+            futures.append(executor.submit(post))
+            with self._session_lock:
+                self.hedges += 1
+            if record is not None:
+                record.hedges += 1
+                record.bytes_sent += len(data)
+        pending = futures
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+        return futures[0].result()
+
+
+    def _process_response(self, response, key=None):
+        """Decode the JSON of response into a list of devices, and store it
+        in the cache under key if it is not empty, or for negative_ttl
+        seconds if it is.
+        """
+        try:
+            result_json = self.codec.loads(response.content)
+        except ValueError:
+            if response.status_code == 200:
+                raise
+            result_json = response.text[:200]
+        result = self.process_result(response.status_code, result_json)
+        if self.cache is not None:
+            if result:
+                self.cache.set(key, list(result))
+            elif self.negative_ttl:
+                self.cache.set(key, [], ttl=self.negative_ttl)
+        return result
@@ -0,0 +1,213 @@
+"""index.py - attribute indices answering filter queries over Devices without
+scanning the device dictionaries again.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .parsing import TYPED_COLUMNS, parse_specs
+
+
+# Lookups on raw (string) attributes, and on typed numeric columns
+CATEGORICAL_LOOKUPS = ('eq', 'ne', 'in', 'contains')
+NUMERIC_LOOKUPS = ('eq', 'ne', 'in', 'lt', 'le', 'gt', 'ge', 'between')
+
+
+def _split(condition):
+    """Split a filter keyword into an attribute and a lookup, eq by default:
+    'os__contains' -> ('os', 'contains'). Raises ValueError for an unknown
+    lookup, which would otherwise silently match nothing.
+    """
+    if '__' in condition:
+        attribute, lookup = condition.rsplit('__', 1)
+        if lookup not in NUMERIC_LOOKUPS and lookup not in CATEGORICAL_LOOKUPS:
+            raise ValueError(
+                'Unknown lookup {} in {}. Expected one of {}'.format(
+                    lookup, condition, ', '.join(sorted(
+                        set(NUMERIC_LOOKUPS + CATEGORICAL_LOOKUPS)))))
+        return attribute, lookup
+    return condition, 'eq'
+
+
+def _check_value(condition, lookup, value):
+    """The in and between lookups take a list, tuple or set (between a pair):
+    a string would be iterated character by character.
+    """
+    if lookup in ('in', 'between') and not isinstance(value,
+                                                      (list, tuple, set)):
+        raise ValueError('Lookup {} of {} expects a list, tuple or set, got '
+                         '{!r}'.format(lookup, condition, value))
+    if lookup == 'between' and len(value) != 2:
+        raise ValueError('Lookup between of {} expects a (low, high) pair, '
+                         'got {!r}'.format(condition, value))
+
+
+def _as_number(value):
+    """Numbers, and strings of numbers such as '2017', compare as floats,
+    dates (anything else pd.Timestamp accepts) as nanoseconds since the
+    epoch, like announced_date.
+    """
+    if isinstance(value, (int, float, np.number)):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float(pd.Timestamp(value).value)
+
+
+################################################################################
+# DevicesIndex
+################################################################################
+
+
+class DevicesIndex(object):
+    """DevicesIndex - lazily built indices over a list of devices:
+
+    - an inverted index (value -> positions) per raw attribute, answering
+      eq, ne, in and contains (case-insensitive substring) lookups;
+    - a sorted array per typed column of parsing.parse_specs (battery_mah,
+      announced_year, ...), answering comparisons with binary searches.
+
+    An index is built the first time a query needs it and reused by every
+    later query. Use it through Devices.filter; the device list must not be
+    modified once indexed.
+    """
+
+
+    def __init__(self, devices):
+        self.devices, self.n = devices, len(devices)
+        self._inverted, self._lowered, self._sorted = {}, {}, {}
+        self._parsed = {}
+        self._lock = threading.Lock()
+
+
+    def inverted(self, attribute):
+        """Return the inverted index of attribute: a dict mapping every value
+        to the sorted array of positions of the devices having it.
+        """
+        with self._lock:
+            if attribute not in self._inverted:
+                if attribute in TYPED_COLUMNS:
+                    values = self._typed(attribute)
+                else:
+                    values = self._raw(attribute)
+                postings = {}
+                for i, value in enumerate(values):
+                    if isinstance(value, str):
+                        postings.setdefault(value, []).append(i)
+                self._inverted[attribute] = dict(
+                    (value, np.array(ids, dtype=np.intp))
+                    for value, ids in postings.items())
+                self._lowered[attribute] = [
+                    (value.lower(), value)
+                    for value in self._inverted[attribute]]
+            return self._inverted[attribute]
+
+
+    def sorted(self, column):
+        """Return (values, positions) for the typed column: the non-missing
+        values in ascending order, as floats, and the positions of their
+        devices.
+        """
+        with self._lock:
+            if column not in self._sorted:
+                values = self._typed(column)
+                if np.issubdtype(values.dtype, np.datetime64):
+                    missing = np.isnat(values)
+                    values = values.astype('datetime64[ns]').astype(
+                        'int64').astype(float)
+                else:
+                    values = values.astype(float)
+                    missing = np.isnan(values)
+                positions = np.flatnonzero(~missing)
+                positions = positions[np.argsort(values[positions],
+                                                 kind='stable')]
+                self._sorted[column] = values[positions], positions
+            return self._sorted[column]
+
+
+    def _raw(self, attribute):
+        """Return the values of attribute for every device, None where it is
+        missing, reading a column of a DeviceTable directly.
+        """
+        if hasattr(self.devices, 'column'):
+            return self.devices.column(attribute)
+        return [device.get(attribute) for device in self.devices]
+
+
+    def _typed(self, column):
+        """Return the typed column as an array, parsing the attribute it comes
+        from (once for all of its columns).
+        """
+        attribute = TYPED_COLUMNS[column]
+        if attribute not in self._parsed:
+            frame = pd.DataFrame({attribute: self._raw(attribute)})
+            self._parsed[attribute], _ = parse_specs(frame)
+        return self._parsed[attribute][column].values
+
+
+    def _categorical(self, attribute, lookup, value):
+        index = self.inverted(attribute)
+        if lookup == 'eq':
+            values = [value]
+        elif lookup == 'in':
+            values = value
+        elif lookup == 'contains':
+            value = value.lower()
+            values = [original
+                      for lowered, original in self._lowered[attribute]
+                      if value in lowered]
+        elif lookup == 'ne':
+            values = [other for other in index if other != value]
+        else:
+            raise ValueError('Lookup {} does not apply to the text attribute '
+                             '{}'.format(lookup, attribute))
+        postings = [index[v] for v in values if v in index]
+        return np.concatenate(postings) if postings else np.array([], np.intp)
+
+
+    def _numeric(self, column, lookup, value):
+        values, positions = self.sorted(column)
+        if lookup == 'in':
+            postings = [self._numeric(column, 'eq', v) for v in value]
+            return np.concatenate(postings) if postings else positions[:0]
+        if lookup == 'ne':
+            return np.setdiff1d(positions, self._numeric(column, 'eq', value))
+        if lookup == 'contains':
+            raise ValueError('Lookup contains does not apply to the numeric '
+                             'column {}'.format(column))
+        if lookup == 'between':
+            low, high = map(_as_number, value)
+        else:
+            low = high = _as_number(value)
+        start, stop = 0, len(values)
+        if lookup in ('eq', 'ge', 'between'):
+            start = np.searchsorted(values, low, 'left')
+        elif lookup == 'gt':
+            start = np.searchsorted(values, low, 'right')
+        if lookup in ('eq', 'le', 'between'):
+            stop = np.searchsorted(values, high, 'right')
+        elif lookup == 'lt':
+            stop = np.searchsorted(values, high, 'left')
+        return positions[start:stop]
+
+
+    def select(self, **conditions):
+        """Return the sorted array of the positions of the devices meeting
+        every condition. See Devices.filter.
+        """
+        mask = np.ones(self.n, dtype=bool)
+        for condition, value in conditions.items():
+            attribute, lookup = _split(condition)
+            _check_value(condition, lookup, value)
+            if (attribute in TYPED_COLUMNS and
+                    attribute != 'price_currency'):
+                positions = self._numeric(attribute, lookup, value)
+            else:
+                positions = self._categorical(attribute, lookup, value)
+            matched = np.zeros(self.n, dtype=bool)
+            matched[positions] = True
+            mask &= matched
+        return np.flatnonzero(mask)
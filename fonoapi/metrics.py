@@ -0,0 +1,353 @@
+"""metrics.py - instrumentation of the calls a FonoAPI object makes: request
+records, hooks, and counters and latency histograms that can be scraped.
+"""
+
+import bisect
+import threading
+import time
+
+from .fonoapi import (
+    CircuitOpenException,
+    InvalidAPITokenException,
+    NoAPIResultsException,
+    StatusCodeErrorNon200Exception
+)
+
+
+# Upper bounds in seconds of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Outcomes of a request
+OUTCOMES = ('ok', 'no-results', 'invalid-token', 'http-error', 'circuit-open',
+            'error')
+
+# Phases timed within a request, in the order they happen
+PHASES = ('throttle', 'network', 'backoff', 'decode', 'devices')
+
+
+def outcome(exception=None, empty=False):
+    """The outcome of a request, given the exception it raised (if any) and
+    whether its result was empty.
+    """
+    if exception is None:
+        return 'no-results' if empty else 'ok'
+    if isinstance(exception, NoAPIResultsException):
+        return 'no-results'
+    if isinstance(exception, InvalidAPITokenException):
+        return 'invalid-token'
+    if isinstance(exception, StatusCodeErrorNon200Exception):
+        return 'http-error'
+    if isinstance(exception, CircuitOpenException):
+        return 'circuit-open'
+    return 'error'
+
+
+################################################################################
+# RequestRecord - what happened during one getdevice/getlatest call
+################################################################################
+
+
+class RequestRecord(object):
+    """RequestRecord - filled in by FonoAPI as a call progresses, then passed
+    to the after hooks.
+
+    Attributes
+    ----------
+    endpoint : string
+        'getdevice' or 'getlatest'.
+    parameters : dict
+        The request parameters, without the API token.
+    source : string
+        Where the result came from: 'api', 'cache', 'catalog', 'coalesced'
+        (another thread made the identical request at the same time) or
+        'stale' (an expired cache entry, served while the circuit breaker is
+        open).
+    outcome : string
+        One of OUTCOMES, set when the call is over.
+    status_code : int
+        HTTP status code of the last response, None if there was none.
+    attempts : int
+        Number of HTTP requests made, retries included.
+    hedges : int
+        Number of duplicate requests sent by hedging.
+    bytes_sent, bytes_received : int
+        Size of the request and response bodies, as transferred (that is
+        compressed, if the server compressed the response).
+    timings : dict
+        Seconds spent in each of PHASES, plus 'total'.
+    error : Exception
+        The exception the call raised, None if it succeeded.
+    """
+
+    __slots__ = ('endpoint', 'parameters', 'source', 'outcome', 'status_code',
+                 'attempts', 'hedges', 'bytes_sent', 'bytes_received',
+                 'timings', 'error', 'started')
+
+
+    def __init__(self, endpoint, parameters=None, source=None):
+        self.endpoint, self.source = endpoint, source
+        self.parameters = dict((k, v) for k, v in (parameters or {}).items()
+                               if k != 'token')
+        self.outcome = self.status_code = self.error = None
+        self.attempts = self.hedges = 0
+        self.bytes_sent = self.bytes_received = 0
+        self.timings = {}
+        self.started = time.perf_counter()
+
+
+    def add_time(self, phase, seconds):
+        self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+
+
+    def __repr__(self):
+        return ('RequestRecord({}, {}, source={}, outcome={}, '
+                'total={:.4f}s)').format(self.endpoint, self.parameters,
+                                         self.source, self.outcome,
+                                         self.timings.get('total', 0.0))
+
+
+################################################################################
+# Histogram - counts of observations in fixed buckets
+################################################################################
+
+
+class Histogram(object):
+    """Histogram - counts observations in buckets with fixed upper bounds, and
+    keeps their count and sum. Not thread-safe on its own: Metrics updates
+    its histograms under its lock.
+    """
+
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count, self.sum = 0, 0.0
+
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+    def quantile(self, q):
+        """Estimate the q-th quantile (0 <= q <= 1) by linear interpolation
+        within its bucket. Values above the last bound are reported as the
+        last bound. Returns None if nothing was observed.
+        """
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+    def snapshot(self):
+        """Return the count, the sum, the p50/p90/p99 estimates and the
+        cumulative bucket counts as (upper bound, count) pairs, the last upper
+        bound being float('inf').
+        """
+        cumulative, total = [], 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return {'count': self.count, 'sum': self.sum,
+                'p50': self.quantile(0.5), 'p90': self.quantile(0.9),
+                'p99': self.quantile(0.99), 'buckets': cumulative}
+
+
+################################################################################
+# Metrics - aggregates request records, and calls hooks
+################################################################################
+
+
+class Metrics(object):
+    """Metrics - pass an object of this class as the metrics argument of
+    FonoAPI to count its calls per endpoint and outcome, and to record their
+    latency, the time spent in each phase and the bytes transferred:
+
+        metrics = Metrics()
+        fon = FonoAPI('TOKEN', metrics=metrics)
+        ...
+        metrics.snapshot()       # nested dictionaries
+        metrics.prometheus()     # Prometheus text exposition format
+
+    Hooks registered with add_hook are called with the RequestRecord of every
+    call, before it starts and after it is over. Exceptions raised by hooks
+    propagate to the caller. Thread-safe.
+    """
+
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """Initialize the Metrics object.
+
+        Parameters
+        ----------
+        buckets : tuple of floats (optional)
+            Upper bounds in seconds of the latency histogram buckets.
+
+        Returns
+        -------
+        self : Metrics object
+            Return self
+        """
+        self.buckets = tuple(buckets)
+        self._before, self._after = [], []
+        self._lock = threading.Lock()
+        self.reset()
+
+
+    def add_hook(self, before=None, after=None):
+        """Register functions called with the RequestRecord of every call:
+        before when the call starts (only endpoint, parameters and source are
+        set), after once it is over.
+        """
+        if before is not None:
+            self._before.append(before)
+        if after is not None:
+            self._after.append(after)
+
+
+    def reset(self):
+        """Forget everything recorded so far. Hooks are kept.
+        """
+        with self._lock:
+            self._requests = {}
+            self._sources = {}
+            self._latency = {}
+            self._phases = {}
+            self._totals = {}
+
+
+    def start(self, endpoint, parameters=None, source=None):
+        """Create the RequestRecord of a call and run the before hooks.
+        """
+        record = RequestRecord(endpoint, parameters, source)
+        for hook in self._before:
+            hook(record)
+        return record
+
+
+    def finish(self, record, exception=None, empty=False):
+        """Complete record with the outcome of the call, aggregate it and run
+        the after hooks.
+        """
+        record.timings['total'] = time.perf_counter() - record.started
+        record.outcome = outcome(exception, empty)
+        record.error = exception
+        if record.source is None:
+            record.source = 'api'
+        endpoint = record.endpoint
+        with self._lock:
+            key = (endpoint, record.outcome)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            key = (endpoint, record.source)
+            self._sources[key] = self._sources.get(key, 0) + 1
+            key = (endpoint, record.outcome)
+            if key not in self._latency:
+                self._latency[key] = Histogram(self.buckets)
+            self._latency[key].observe(record.timings['total'])
+            for phase in PHASES:
+                if phase in record.timings:
+                    key = (endpoint, phase)
+                    if key not in self._phases:
+                        self._phases[key] = Histogram(self.buckets)
+                    self._phases[key].observe(record.timings[phase])
+            totals = self._totals.setdefault(
+                endpoint, {'attempts': 0, 'retries': 0, 'hedges': 0,
+                           'bytes_sent': 0, 'bytes_received': 0})
+            totals['attempts'] += record.attempts
+            totals['hedges'] += record.hedges
+            totals['retries'] += max(0, record.attempts - 1)
+            totals['bytes_sent'] += record.bytes_sent
+            totals['bytes_received'] += record.bytes_received
+        for hook in self._after:
+            hook(record)
+        return record
+
+
+    def snapshot(self):
+        """Return everything recorded so far as nested dictionaries keyed by
+        endpoint:
+
+            {'getdevice': {'requests': {'ok': 10, 'no-results': 2},
+                           'sources': {'api': 9, 'cache': 3},
+                           'latency': {'ok': <histogram>, ...},
+                           'phases': {'network': <histogram>, ...},
+                           'attempts': 12, 'retries': 0, 'hedges': 1,
+                           'bytes_sent': 640, 'bytes_received': 51200}}
+
+        where histograms are described in Histogram.snapshot.
+        """
+        with self._lock:
+            result = {}
+
+            def section(endpoint):
+                return result.setdefault(endpoint, {
+                    'requests': {}, 'sources': {}, 'latency': {},
+                    'phases': {}})
+
+            for (endpoint, name), count in self._requests.items():
+                section(endpoint)['requests'][name] = count
+            for (endpoint, name), count in self._sources.items():
+                section(endpoint)['sources'][name] = count
+            for (endpoint, name), histogram in self._latency.items():
+                section(endpoint)['latency'][name] = histogram.snapshot()
+            for (endpoint, name), histogram in self._phases.items():
+                section(endpoint)['phases'][name] = histogram.snapshot()
+            for endpoint, totals in self._totals.items():
+                section(endpoint).update(totals)
+            return result
+
+
+    def prometheus(self, prefix='fonoapi'):
+        """Return the metrics in the Prometheus text exposition format.
+        """
+        snapshot = self.snapshot()
+        lines = []
+
+        def histogram(name, labels, data):
+            for bound, count in data['buckets']:
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('{}_bucket{{{},le="{}"}} {}'.format(
+                    name, labels, le, count))
+            lines.append('{}_sum{{{}}} {!r}'.format(name, labels, data['sum']))
+            lines.append('{}_count{{{}}} {}'.format(name, labels,
+                                                     data['count']))
+
+        lines.append('# TYPE {}_requests_total counter'.format(prefix))
+        for endpoint, data in sorted(snapshot.items()):
+            for name, count in sorted(data['requests'].items()):
+                lines.append('{}_requests_total{{endpoint="{}",outcome="{}"}} '
+                             '{}'.format(prefix, endpoint, name, count))
+        lines.append('# TYPE {}_results_total counter'.format(prefix))
+        for endpoint, data in sorted(snapshot.items()):
+            for name, count in sorted(data['sources'].items()):
+                lines.append('{}_results_total{{endpoint="{}",source="{}"}} '
+                             '{}'.format(prefix, endpoint, name, count))
+        for total in ('attempts', 'retries', 'hedges', 'bytes_sent',
+                      'bytes_received'):
+            lines.append('# TYPE {}_{}_total counter'.format(prefix, total))
+            for endpoint, data in sorted(snapshot.items()):
+                lines.append('{}_{}_total{{endpoint="{}"}} {}'.format(
+                    prefix, total, endpoint, data.get(total, 0)))
+        name = '{}_request_seconds'.format(prefix)
+        lines.append('# TYPE {} histogram'.format(name))
+        for endpoint, data in sorted(snapshot.items()):
+            for name_, histogram_ in sorted(data['latency'].items()):
+                histogram(name, 'endpoint="{}",outcome="{}"'.format(
+                    endpoint, name_), histogram_)
+        name = '{}_phase_seconds'.format(prefix)
+        lines.append('# TYPE {} histogram'.format(name))
+        for endpoint, data in sorted(snapshot.items()):
+            for name_, histogram_ in sorted(data['phases'].items()):
+                histogram(name, 'endpoint="{}",phase="{}"'.format(
+                    endpoint, name_), histogram_)
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,104 @@
+"""normalize.py - canonical forms of getdevice/getlatest parameters, so that
+equivalent queries make the same request and share one cache entry.
+"""
+
+import re
+import unicodedata
+
+
+# Alternative spellings of brands, lowercased, mapped to the brand name the
+# API uses (lowercased too, the API ignores the case of brands)
+BRAND_ALIASES = {
+    'alcatel onetouch': 'alcatel',
+    'alcatel one touch': 'alcatel',
+    'apple inc': 'apple',
+    'blackberry limited': 'blackberry',
+    'hewlett packard': 'hp',
+    'htc corporation': 'htc',
+    'huawei technologies': 'huawei',
+    'lg electronics': 'lg',
+    'motorola mobility': 'motorola',
+    'nokia corporation': 'nokia',
+    'oneplus technology': 'oneplus',
+    'one plus': 'oneplus',
+    'samsung electronics': 'samsung',
+    'sony mobile': 'sony',
+    'xiaomi inc': 'xiaomi',
+}
+
+_SPACES = re.compile(r'\s+')
+
+# Punctuation at either end of a name, which never helps a substring match:
+# quotes, commas, periods, semicolons, colons, exclamation and question marks
+_EDGES = re.compile(r'^[\s"\'`,.;:!?]+|[\s"\'`,.;:!?]+$')
+
+
+################################################################################
+# QueryNormalizer
+################################################################################
+
+
+class QueryNormalizer(object):
+    """QueryNormalizer - rewrites device names and brands into a canonical
+    form. The API matches both case-insensitively, and device names as a
+    substring, so a normalized query returns the same devices as the original:
+
+    - Unicode is NFKC-normalized, so that full-width characters and
+      compatibility forms become plain ones, and typographic quotes and
+      dashes become ASCII.
+    - Letters are lowercased.
+    - Whitespace is collapsed to single spaces.
+    - Quotes, commas, periods and the like are stripped from both ends.
+      Punctuation inside names (as in 'Galaxy S8+' or 'Moto G (5S)') is kept,
+      because removing it would change the matches.
+    - Brands are looked up in an alias table, e.g. 'Samsung Electronics' ->
+      'samsung'.
+
+    Pass normalize=True (or a QueryNormalizer object) to FonoAPI to normalize
+    every request.
+    """
+
+    # Typographic quotes and dashes that NFKC leaves alone
+    _TRANSLATE = dict((ord(char), replacement) for char, replacement in [
+        (u'\u2018', u"'"), (u'\u2019', u"'"), (u'\u201c', u'"'),
+        (u'\u201d', u'"'), (u'\u2010', u'-'), (u'\u2011', u'-'),
+        (u'\u2012', u'-'), (u'\u2013', u'-'), (u'\u2014', u'-')])
+
+
+    def __init__(self, aliases=None):
+        """Initialize the QueryNormalizer object.
+
+        Parameters
+        ----------
+        aliases : dict (optional)
+            Extra brand aliases, added to BRAND_ALIASES. Keys are normalized
+            the same way as brands before lookup.
+
+        Returns
+        -------
+        self : QueryNormalizer object
+            Return self
+        """
+        self.aliases = {}
+        for alias, brand in list(BRAND_ALIASES.items()) + list(
+                (aliases or {}).items()):
+            self.aliases[self.text(alias)] = self.text(brand)
+
+
+    def text(self, value):
+        """The normalized form of a free text value.
+        """
+        value = unicodedata.normalize('NFKC', value).translate(self._TRANSLATE)
+        value = _EDGES.sub('', value.lower())
+        return _SPACES.sub(' ', value)
+
+
+    def device(self, device):
+        return self.text(device)
+
+
+    def brand(self, brand):
+        if not brand:
+            return brand
+        brand = self.text(brand)
+        return self.aliases.get(brand, brand)
@@ -0,0 +1,166 @@
+"""parsing.py - turns the free text attributes returned by the Fono API into
+numeric and date columns.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+
+_NUMBER = r'(\d+(?:\.\d+)?)'
+
+_MONTHS = {
+    'january': 1, 'february': 2, 'march': 3, 'april': 4, 'may': 5, 'june': 6,
+    'july': 7, 'august': 8, 'september': 9, 'october': 10, 'november': 11,
+    'december': 12
+}
+
+_GIGABYTES = {'MB': 1.0 / 1024, 'GB': 1.0, 'TB': 1024.0}
+
+
+################################################################################
+# Precompiled patterns - attribute, pattern, names of the captured columns
+################################################################################
+
+
+_NUMERIC_FIELDS = [
+    ('battery_c', re.compile(r'(\d+)\s*mAh', re.I), ['battery_mah']),
+    ('weight', re.compile(_NUMBER + r'\s*g\b'), ['weight_g']),
+    ('dimensions',
+     re.compile(r'\s*x\s*'.join([_NUMBER] * 3) + r'\s*mm'),
+     ['height_mm', 'width_mm', 'depth_mm']),
+    ('size', re.compile(_NUMBER + r'\s*inch', re.I), ['screen_inches']),
+    ('resolution', re.compile(r'(\d+)\s*x\s*(\d+)\s*pixels'),
+     ['pixel_width', 'pixel_height']),
+]
+
+_STORAGE = re.compile(_NUMBER + r'\s*(MB|GB|TB)')
+_RAM = re.compile(_NUMBER + r'\s*(MB|GB|TB)\s*RAM')
+_PRICE = re.compile(r'([\d,]+(?:\.\d+)?)\s*([A-Z]{3})\b')
+_ANNOUNCED = re.compile(r'(\d{4})(?:,\s*([A-Za-z]+))?')
+
+# The attributes parse_specs reads
+TYPED_ATTRIBUTES = ([field[0] for field in _NUMERIC_FIELDS] +
+                    ['internal', 'price', 'announced'])
+
+# The attribute every typed column is parsed from
+TYPED_COLUMNS = dict(
+    [(name, field[0]) for field in _NUMERIC_FIELDS for name in field[2]] +
+    [('storage_gb', 'internal'), ('ram_gb', 'internal'),
+     ('price_value', 'price'), ('price_currency', 'price'),
+     ('announced_year', 'announced'), ('announced_month', 'announced'),
+     ('announced_date', 'announced')])
+
+
+################################################################################
+# Parsers - each takes a column of raw strings and returns its typed columns
+# and a boolean Series flagging values that could not be parsed
+################################################################################
+
+
+def _failed(raw, parsed):
+    """A raw value failed to parse if it is present but nothing was
+    extracted from it.
+    """
+    return raw.notnull() & parsed.isnull()
+
+
+def _parse_numeric(raw, pattern, names):
+    extracted = raw.str.extract(pattern, expand=True)
+    extracted.columns = names
+    # astype(float): to_numeric gives int64 when every value parses
+    extracted = extracted.apply(pd.to_numeric, errors='coerce').astype(float)
+    return extracted, _failed(raw, extracted.iloc[:, 0])
+
+
+def _parse_internal(raw):
+    storage = raw.str.extract(_STORAGE, expand=True)
+    ram = raw.str.extract(_RAM, expand=True)
+    typed = pd.DataFrame({
+        'storage_gb': (pd.to_numeric(storage[0], errors='coerce') *
+                       storage[1].map(_GIGABYTES).astype(float)),
+        'ram_gb': (pd.to_numeric(ram[0], errors='coerce') *
+                   ram[1].map(_GIGABYTES).astype(float)),
+    }, index=raw.index, columns=['storage_gb', 'ram_gb'])
+    return typed, _failed(raw, typed['storage_gb'])
+
+
+def _parse_price(raw):
+    price = raw.str.extract(_PRICE, expand=True)
+    typed = pd.DataFrame({
+        'price_value': pd.to_numeric(
+            price[0].str.replace(',', '', regex=False),
+            errors='coerce').astype(float),
+        'price_currency': price[1],
+    }, index=raw.index, columns=['price_value', 'price_currency'])
+    return typed, _failed(raw, typed['price_value'])
+
+
+def _parse_announced(raw):
+    announced = raw.str.extract(_ANNOUNCED, expand=True)
+    year = pd.to_numeric(announced[0], errors='coerce').astype(float)
+    month = announced[1].str.lower().map(_MONTHS).astype(float)
+    date = pd.to_datetime(pd.DataFrame({
+        'year': year, 'month': month.fillna(1), 'day': 1}), errors='coerce')
+    typed = pd.DataFrame({
+        'announced_year': year, 'announced_month': month,
+        'announced_date': date,
+    }, index=raw.index, columns=['announced_year', 'announced_month',
+                                 'announced_date'])
+    return typed, _failed(raw, year)
+
+
+def _as_strings(column):
+    """Object Series of the raw values, NaN where missing, so that the .str
+    accessor works whatever dtype pandas inferred.
+    """
+    return column.astype(object).where(column.notnull(), np.nan)
+
+
+def parse_specs(frame):
+    """Parse the free text attributes of a DataFrame produced by
+    Devices.dataframe into typed columns. Attributes missing from frame are
+    skipped.
+
+    Parameters
+    ----------
+    frame - a Pandas DataFrame
+        Raw attributes, one row per device.
+
+    Returns
+    -------
+    typed - a Pandas DataFrame
+        With the same index as frame and the columns battery_mah, weight_g,
+        height_mm, width_mm, depth_mm, screen_inches, pixel_width,
+        pixel_height, storage_gb, ram_gb, price_value, price_currency,
+        announced_year, announced_month and announced_date (float, except for
+        the currency and the date).
+
+    failures - a Pandas DataFrame
+        One row per value that was present but could not be parsed, with the
+        columns attribute and value, indexed like frame.
+    """
+    parsers = [(attribute, lambda raw, p=pattern, n=names:
+                _parse_numeric(raw, p, n))
+               for attribute, pattern, names in _NUMERIC_FIELDS]
+    parsers += [('internal', _parse_internal), ('price', _parse_price),
+                ('announced', _parse_announced)]
+    typed, failures = [], []
+    for attribute, parser in parsers:
+        if attribute not in frame:
+            continue
+        raw = _as_strings(frame[attribute])
+        columns, failed = parser(raw)
+        typed.append(columns)
+        if failed.any():
+            failures.append(pd.DataFrame({
+                'attribute': attribute, 'value': raw[failed]},
+                columns=['attribute', 'value']))
+    typed = (pd.concat(typed, axis=1) if typed
+             else pd.DataFrame(index=frame.index))
+    if failures:
+        failures = pd.concat(failures)
+    else:
+        failures = pd.DataFrame(columns=['attribute', 'value'])
+    return typed, failures
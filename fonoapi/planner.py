@@ -0,0 +1,278 @@
+"""planner.py - plans bulk lookups, answering groups of getdevice queries for
+the same brand from one getlatest pull instead of one request per query.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .catalog import DeviceCatalog
+from .fonoapi import NoAPIResultsException, _merge_results, _query_kwargs
+
+
+def _parse_query(query):
+    """The getdevice keyword arguments of query, or the ValueError it raises
+    if it is malformed, so that one bad query does not fail the whole batch.
+    """
+    try:
+        return _query_kwargs(query)
+    except ValueError as error:
+        return error
+
+
+################################################################################
+# Plan and PlanReport
+################################################################################
+
+
+class Plan(object):
+    """Plan - how a batch of queries is going to be answered.
+
+    Attributes
+    ----------
+    queries : list of dicts (or ValueErrors)
+        The getdevice keyword arguments of every query, or the ValueError
+        raised by a malformed query, which is neither pulled nor called.
+    pulls : OrderedDict
+        Maps every brand pulled with getlatest to the positions of its
+        queries.
+    calls : list of ints
+        Positions of the queries sent to getdevice directly.
+    estimated_requests : float
+        Expected number of HTTP requests, fallbacks included.
+    """
+
+
+    def __init__(self, queries, pulls, calls, estimated_requests):
+        self.queries, self.pulls, self.calls = queries, pulls, calls
+        self.estimated_requests = estimated_requests
+
+
+    def __str__(self):
+        return ('Plan: {} queries, {} brand pulls covering {} queries, {} '
+                'getdevice calls, ~{:.1f} requests').format(
+                    len(self.queries), len(self.pulls),
+                    sum(len(group) for group in self.pulls.values()),
+                    len(self.calls), self.estimated_requests)
+
+
+    __repr__ = __str__
+
+
+class PlanReport(object):
+    """PlanReport - what running a plan did.
+    """
+
+
+    def __init__(self, queries=0, brand_pulls=0, failed_pulls=0,
+                 answered_locally=0, device_calls=0):
+        self.queries, self.brand_pulls = queries, brand_pulls
+        self.failed_pulls = failed_pulls
+        self.answered_locally, self.device_calls = answered_locally, device_calls
+
+
+    @property
+    def requests(self):
+        """Number of HTTP requests made (before retries).
+        """
+        return self.brand_pulls + self.device_calls
+
+
+    @property
+    def requests_saved(self):
+        """Number of requests saved compared to one getdevice per query.
+        """
+        return self.queries - self.requests
+
+
+    def __str__(self):
+        return ('{} queries: {} answered locally from {} brand pulls ({} '
+                'failed), {} getdevice calls, {} requests saved').format(
+                    self.queries, self.answered_locally, self.brand_pulls,
+                    self.failed_pulls, self.device_calls, self.requests_saved)
+
+
+    __repr__ = __str__
+
+
+################################################################################
+# BatchPlanner
+################################################################################
+
+
+class BatchPlanner(object):
+    """BatchPlanner - answers a batch of getdevice queries with as few
+    requests as it can. Queries are grouped by brand, and a brand is pulled
+    with one getlatest call when the cost model expects it to be cheaper than
+    a getdevice call per query. The names of the group are then matched
+    locally against the pulled devices, with the semantics of getdevice, and
+    the queries without a local match fall back to getdevice. Queries without
+    a brand always use getdevice.
+
+    getlatest only returns the latest limit devices of a brand. A pull that
+    returns fewer devices than limit holds the whole brand, so its local
+    answers are exact, empty ones included. A truncated pull answers nothing:
+    a local match among the latest devices may not be what the API ranks
+    first among all of them, so every query of its group falls back to
+    getdevice, and the brand is less likely to be pulled next time.
+
+        planner = BatchPlanner(fon)
+        results, report = planner.run(queries)
+        print(report)
+    """
+
+
+    def __init__(self, fon, limit=100, pull_cost=2.0, hit_rate=0.5,
+                 max_workers=8):
+        """Initialize the BatchPlanner object.
+
+        Parameters
+        ----------
+        fon : FonoAPI object
+            Client making the requests.
+
+        limit : int (default is 100)
+            limit argument of the getlatest pulls.
+
+        pull_cost : float (default is 2.0)
+            Cost of a getlatest pull, counted in getdevice calls. A pull
+            transfers many more devices than a getdevice call, so it costs
+            more than one.
+
+        hit_rate : float (default is 0.5)
+            Expected fraction of the queries of a brand that a pull answers,
+            until the planner has pulled that brand. It then uses the
+            observed fraction instead (a moving average over runs).
+
+        max_workers : int (default is 8)
+            Number of concurrent requests.
+
+        Returns
+        -------
+        self : BatchPlanner object
+            Return self
+        """
+        assert 0 < hit_rate <= 1, 'hit_rate must be in (0, 1]'
+        self.fon, self.limit, self.pull_cost = fon, limit, pull_cost
+        self.hit_rate, self.max_workers = hit_rate, max_workers
+        self.hit_rates = {}
+
+
+    def expected_hit_rate(self, brand):
+        return self.hit_rates.get(brand.lower(), self.hit_rate)
+
+
+    def plan(self, queries):
+        """Decide which brands to pull. Pulling a brand with n queries costs
+        pull_cost plus the getdevice calls of the queries it misses,
+        n * (1 - hit rate), instead of n getdevice calls, so it is chosen when
+        n * hit rate > pull_cost.
+
+        Returns
+        -------
+        plan : Plan object
+        """
+        queries = [_parse_query(query) for query in queries]
+        groups = OrderedDict()
+        for i, query in enumerate(queries):
+            if isinstance(query, ValueError):
+                continue
+            brand = query.get('brand')
+            if brand:
+                groups.setdefault(brand.lower(), []).append(i)
+        pulls, pulled, estimate = OrderedDict(), set(), 0.0
+        for brand, group in groups.items():
+            hit_rate = self.expected_hit_rate(brand)
+            if len(group) * hit_rate > self.pull_cost:
+                pulls[brand] = group
+                pulled.update(group)
+                estimate += self.pull_cost + len(group) * (1 - hit_rate)
+        calls = [i for i, query in enumerate(queries)
+                 if i not in pulled and not isinstance(query, ValueError)]
+        return Plan(queries, pulls, calls, estimate + len(calls))
+
+
+    def _pull(self, brand):
+        return self.fon.getlatest(brand, limit=self.limit, verbose=False)
+
+
+    def _lookup(self, query):
+        query = dict(query)
+        query.setdefault('verbose', False)
+        return self.fon.getdevice(**query)
+
+
+    def _results(self, executor, queries):
+        """Yield getdevice results (or exceptions) for queries, in order.
+        """
+        futures = [executor.submit(self._lookup, query) for query in queries]
+        for future in futures:
+            try:
+                yield future.result()
+            except Exception as exception:
+                yield exception
+
+
+    def _answer_locally(self, devices, group, queries, results):
+        """Answer the queries of group from the complete pull of their brand,
+        with the semantics of getdevice.
+        """
+        catalog = DeviceCatalog([devices])
+        for i in group:
+            query = queries[i]
+            local = catalog.getdevice(query['device'], query.get('position'),
+                                      query['brand'])
+            if local.null and query.get('no_results_exception'):
+                local = NoAPIResultsException('No results found in the API')
+            results[i] = local
+
+
+    def run(self, queries, merge=False):
+        """Plan and answer queries (see FonoAPI.igetdevices for their
+        format).
+
+        Returns
+        -------
+        results : list of Devices objects (or Exceptions), or a Devices object
+            One per query, in input order, as FonoAPI.getdevices returns them,
+            merged into a single Devices object if merge is True.
+
+        report : PlanReport object
+            Number of pulls, local answers and getdevice calls.
+        """
+        queries = list(queries)
+        plan = self.plan(queries)
+        results = [query if isinstance(query, ValueError) else None
+                   for query in plan.queries]
+        report = PlanReport(queries=len(queries))
+        calls = list(plan.calls)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pulls = [(brand, group, executor.submit(
+                self._pull, plan.queries[group[0]]['brand']))
+                     for brand, group in plan.pulls.items()]
+            for brand, group, future in pulls:
+                report.brand_pulls += 1
+                try:
+                    devices = future.result()
+                except Exception:
+                    report.failed_pulls += 1
+                    calls.extend(group)
+                    continue
+                if len(devices.list_of_dicts()) >= self.limit:
+                    # Truncated: the local answers could differ from the API
+                    calls.extend(group)
+                    answered = 0
+                else:
+                    self._answer_locally(devices, group, plan.queries,
+                                         results)
+                    answered = len(group)
+                report.answered_locally += answered
+                previous = self.hit_rates.get(brand, answered / len(group))
+                self.hit_rates[brand] = (previous + answered / len(group)) / 2
+            calls.sort()
+            report.device_calls = len(calls)
+            for i, result in zip(calls, self._results(
+                    executor, [plan.queries[i] for i in calls])):
+                results[i] = result
+        if merge:
+            results = _merge_results(queries, results)
+        return results, report
@@ -0,0 +1,181 @@
+"""ratelimit.py - client-side throttling and retries for calls to the Fono API.
+"""
+
+import random
+import threading
+import time
+from email.utils import mktime_tz, parsedate_tz
+
+
+################################################################################
+# TokenBucket - a rate limiter shared by all threads using a FonoAPI object
+################################################################################
+
+
+class TokenBucket(object):
+    """TokenBucket - allows rate calls per second on average, with bursts of
+    up to burst calls. acquire blocks until a token is available. Safe to share
+    between threads.
+    """
+
+
+    def __init__(self, rate, burst=None, clock=time.monotonic,
+                 sleep=time.sleep):
+        """Initialize the TokenBucket object.
+
+        Parameters
+        ----------
+        rate : float
+            Number of tokens added to the bucket per second.
+
+        burst : int (optional)
+            Capacity of the bucket. Defaults to max(1, rate). The bucket starts
+            full.
+
+        clock, sleep : functions (optional)
+            Return the current time, and sleep for a number of seconds. Only
+            useful for testing.
+
+        Returns
+        -------
+        self : TokenBucket object
+            Return self
+        """
+        assert rate > 0, 'rate must be positive'
+        if burst is None:
+            burst = max(1, rate)
+        assert burst >= 1, 'burst must be at least 1'
+        self.rate, self.burst = float(rate), float(burst)
+        self.clock, self.sleep = clock, sleep
+        self.waited = 0.0
+        self._tokens, self._updated = self.burst, clock()
+        self._lock = threading.Lock()
+
+
+    def _reserve(self, tokens):
+        """Take tokens from the bucket, possibly going into debt, and return
+        how long the caller has to wait before the tokens are really there.
+        Reserving under the lock and sleeping outside of it keeps the callers
+        in first come, first served order.
+        """
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens +
+                               (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.waited += wait
+            return wait
+
+
+    def acquire(self, tokens=1):
+        """Block until tokens tokens are available, and take them. Returns
+        the number of seconds spent waiting.
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+
+################################################################################
+# Retry - which failed calls to retry, and how long to wait in between
+################################################################################
+
+
+class Retry(object):
+    """Retry - retry policy for calls to the API. Connection errors, timeouts
+    and responses with a status code in status_forcelist (by default 429 and
+    the 5xx gateway errors) are retried up to total times, waiting an
+    exponentially growing, jittered delay in between. When the response has a
+    Retry-After header, the wait is at least that long.
+    """
+
+
+    def __init__(self, total=3, backoff_factor=0.5, max_backoff=60.0,
+                 jitter=True, status_forcelist=(429, 500, 502, 503, 504),
+                 respect_retry_after=True, sleep=time.sleep):
+        """Initialize the Retry object.
+
+        Parameters
+        ----------
+        total : int (default is 3)
+            Maximum number of retries, so a call is attempted at most total + 1
+            times.
+
+        backoff_factor : float (default is 0.5)
+            The n-th retry (counting from 0) waits up to backoff_factor * 2**n
+            seconds.
+
+        max_backoff : float (default is 60.0)
+            Upper bound of the wait between two attempts, Retry-After
+            included.
+
+        jitter : boolean (default is True)
+            If set to True, the wait is drawn uniformly between 0 and the
+            exponential backoff ("full jitter"), which spreads out the retries
+            of many threads hitting the same error.
+
+        status_forcelist : tuple of ints
+            HTTP status codes that are retried.
+
+        respect_retry_after : boolean (default is True)
+            If set to True, honor the Retry-After header of retried responses.
+
+        sleep : function (optional)
+            Sleeps for a number of seconds. Only useful for testing.
+
+        Returns
+        -------
+        self : Retry object
+            Return self
+        """
+        assert total >= 0, 'total must be at least 0'
+        self.total, self.backoff_factor = total, backoff_factor
+        self.max_backoff, self.jitter = max_backoff, jitter
+        self.status_forcelist = frozenset(status_forcelist)
+        self.respect_retry_after, self.sleep = respect_retry_after, sleep
+
+
+    def is_retryable(self, status_code):
+        return status_code in self.status_forcelist
+
+
+    def backoff(self, attempt):
+        """Number of seconds to wait before retry number attempt (counting
+        from 0).
+        """
+        backoff = min(self.max_backoff, self.backoff_factor * 2 ** attempt)
+        if self.jitter:
+            backoff = random.uniform(0, backoff)
+        return backoff
+
+
+    def delay(self, attempt, response=None):
+        """Number of seconds to wait before retry number attempt, taking the
+        Retry-After header of response into account.
+        """
+        delay = self.backoff(attempt)
+        if response is not None and self.respect_retry_after:
+            retry_after = self.retry_after(response)
+            if retry_after is not None:
+                delay = min(self.max_backoff, max(delay, retry_after))
+        return delay
+
+
+    @staticmethod
+    def retry_after(response):
+        """Parse the Retry-After header of response - either a number of
+        seconds or an HTTP date - into a number of seconds, or None.
+        """
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            date = parsedate_tz(value)
+            if date is None:
+                return None
+            return max(0.0, mktime_tz(date) - time.time())
@@ -0,0 +1,71 @@
+"""singleflight.py - coalesces identical concurrent calls into one.
+"""
+
+import threading
+
+
+class _Call(object):
+    """A call in flight, and its outcome once it is done.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = self.exception = None
+
+
+################################################################################
+# SingleFlight
+################################################################################
+
+
+class SingleFlight(object):
+    """SingleFlight - makes sure that only one call per key is executing at a
+    time. Threads calling do with a key that is already in flight wait for that
+    call and receive its result (or its exception) instead of making their own.
+    """
+
+
+    def __init__(self):
+        self.executed = self.deduplicated = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+
+    def do(self, key, function, *args, **kwargs):
+        """Call function(*args, **kwargs), unless a call with the same key is
+        already in flight, in which case wait for it and return its result or
+        raise its exception.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.deduplicated += 1
+        if not leader:
+            call.done.wait()
+            if call.exception is not None:
+                raise call.exception
+            return call.result
+        try:
+            call.result = function(*args, **kwargs)
+        except BaseException as exception:
+            call.exception = exception
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+    def stats(self):
+        """Return the number of calls executed, the number of calls that
+        joined a call in flight instead, and the number of calls in flight.
+        """
+        with self._lock:
+            return {'executed': self.executed,
+                    'deduplicated': self.deduplicated,
+                    'in_flight': len(self._calls)}
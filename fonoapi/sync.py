@@ -0,0 +1,291 @@
+"""sync.py - keeps a local snapshot of the Fono API devices up to date by
+crawling brands with getlatest.
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .fonoapi import Devices
+
+
+def fingerprint(device):
+    """A digest of every attribute of a device, which changes whenever any
+    attribute changes.
+    """
+    data = json.dumps(device, sort_keys=True).encode('utf-8')
+    return hashlib.sha1(data).hexdigest()
+
+
+################################################################################
+# Snapshot - devices stored in SQLite along with their fingerprints
+################################################################################
+
+
+class Snapshot(object):
+    """Snapshot - an SQLite database of devices keyed by (Brand, DeviceName),
+    which also records the progress of sync runs so that an interrupted run
+    can be resumed.
+    """
+
+    _schema = '''
+        CREATE TABLE IF NOT EXISTS devices (
+            brand TEXT NOT NULL,
+            name TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            data TEXT NOT NULL,
+            updated REAL NOT NULL,
+            PRIMARY KEY (brand, name)
+        );
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id INTEGER PRIMARY KEY,
+            started REAL NOT NULL,
+            finished REAL
+        );
+        CREATE TABLE IF NOT EXISTS run_brands (
+            run_id INTEGER NOT NULL,
+            brand TEXT NOT NULL,
+            completed REAL NOT NULL,
+            PRIMARY KEY (run_id, brand)
+        );
+    '''
+
+
+    def __init__(self, path):
+        """Open (or create) the snapshot stored at path.
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path, isolation_level=None,
+                                          check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(self._schema)
+
+
+    def fingerprints(self, brand):
+        """Return a dict mapping the DeviceName of every device of brand to
+        its fingerprint.
+        """
+        return dict(self.connection.execute(
+            'SELECT name, fingerprint FROM devices WHERE brand = ?', (brand,)))
+
+
+    def update(self, devices):
+        """Write the devices (a list of dictionaries) that are new or whose
+        attributes changed, in a single transaction.
+
+        Returns
+        -------
+        counts : (int, int, int) tuple
+            Number of new, changed and unchanged devices.
+        """
+        known, rows = {}, []
+        new = changed = 0
+        for device in devices:
+            brand = device.get('Brand', '')
+            if brand not in known:
+                known[brand] = self.fingerprints(brand)
+            digest = fingerprint(device)
+            previous = known[brand].get(device.get('DeviceName', ''))
+            if previous == digest:
+                continue
+            new += previous is None
+            changed += previous is not None
+            rows.append((brand, device.get('DeviceName', ''), digest,
+                         json.dumps(device), time.time()))
+        with self.connection:
+            self.connection.execute('BEGIN')
+            self.connection.executemany(
+                'INSERT INTO devices VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (brand, name) DO UPDATE SET '
+                'fingerprint = excluded.fingerprint, data = excluded.data, '
+                'updated = excluded.updated', rows)
+        return new, changed, len(devices) - new - changed
+
+
+    def devices(self, brand=None):
+        """Return the devices in the snapshot, optionally only those of one
+        brand, as a Devices object.
+        """
+        if brand is None:
+            rows = self.connection.execute(
+                'SELECT data FROM devices ORDER BY brand, rowid')
+        else:
+            rows = self.connection.execute(
+                'SELECT data FROM devices WHERE brand = ? ORDER BY rowid',
+                (brand,))
+        return Devices([json.loads(data) for data, in rows])
+
+
+    def start_run(self, resume=True):
+        """Return the id of the last unfinished run if resume is True and
+        there is one, otherwise of a new run.
+        """
+        if resume:
+            row = self.connection.execute(
+                'SELECT run_id FROM runs WHERE finished IS NULL '
+                'ORDER BY run_id DESC LIMIT 1').fetchone()
+            if row is not None:
+                return row[0]
+        return self.connection.execute(
+            'INSERT INTO runs (started) VALUES (?)', (time.time(),)).lastrowid
+
+
+    def completed_brands(self, run_id):
+        return set(brand for brand, in self.connection.execute(
+            'SELECT brand FROM run_brands WHERE run_id = ?', (run_id,)))
+
+
+    def complete_brand(self, run_id, brand):
+        self.connection.execute('INSERT OR REPLACE INTO run_brands VALUES '
+                                '(?, ?, ?)', (run_id, brand, time.time()))
+
+
+    def finish_run(self, run_id):
+        self.connection.execute('UPDATE runs SET finished = ? WHERE run_id = ?',
+                                (time.time(), run_id))
+
+
+    def close(self):
+        self.connection.close()
+
+
+    def __len__(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM devices').fetchone()[0]
+
+
+################################################################################
+# BrandReport - the outcome of syncing one brand
+################################################################################
+
+
+class BrandReport(object):
+    """BrandReport - what syncing one brand did, and how long it took.
+    """
+
+
+    def __init__(self, brand, devices=0, new=0, changed=0, unchanged=0,
+                 fetch_seconds=0.0, write_seconds=0.0, error=None,
+                 skipped=False):
+        self.brand, self.devices = brand, devices
+        self.new, self.changed, self.unchanged = new, changed, unchanged
+        self.fetch_seconds, self.write_seconds = fetch_seconds, write_seconds
+        self.error, self.skipped = error, skipped
+
+
+    @property
+    def seconds(self):
+        return self.fetch_seconds + self.write_seconds
+
+
+    @property
+    def throughput(self):
+        """Devices synced per second.
+        """
+        return self.devices / self.seconds if self.seconds else 0.0
+
+
+    def __str__(self):
+        if self.skipped:
+            return '{}: already synced in this run'.format(self.brand)
+        if self.error is not None:
+            return '{}: failed ({!r})'.format(self.brand, self.error)
+        return ('{}: {} devices ({} new, {} changed) in {:.2f}s '
+                '({:.2f}s fetching), {:.1f} devices/s').format(
+                    self.brand, self.devices, self.new, self.changed,
+                    self.seconds, self.fetch_seconds, self.throughput)
+
+
+    __repr__ = __str__
+
+
+################################################################################
+# CatalogSync - crawls brands concurrently into a Snapshot
+################################################################################
+
+
+class CatalogSync(object):
+    """CatalogSync - pulls the latest devices of every brand in a list with
+    getlatest, on a pool of threads, and writes the new and changed devices to
+    a Snapshot. Every brand is marked as done once written, so running again
+    after an interruption only crawls the brands that are left.
+
+        sync = CatalogSync(fon, Snapshot('catalog.sqlite'), brands)
+        for report in sync.run():
+            print(report)
+    """
+
+
+    def __init__(self, fon, snapshot, brands, limit=100, max_workers=4):
+        """Initialize the CatalogSync object.
+
+        Parameters
+        ----------
+        fon : FonoAPI object
+            Client used to call getlatest.
+
+        snapshot : Snapshot object
+            Where devices are written.
+
+        brands : list of strings
+            Brands to crawl.
+
+        limit : int (default is 100)
+            limit argument of getlatest.
+
+        max_workers : int (default is 4)
+            Number of brands fetched concurrently. Writes to the snapshot are
+            done by the calling thread, one brand at a time.
+
+        Returns
+        -------
+        self : CatalogSync object
+            Return self
+        """
+        self.fon, self.snapshot = fon, snapshot
+        self.brands, self.limit = list(brands), limit
+        self.max_workers = max_workers
+
+
+    def _fetch(self, brand):
+        start = time.perf_counter()
+        devices = self.fon.getlatest(brand, limit=self.limit, verbose=False)
+        return devices.list_of_dicts(), time.perf_counter() - start
+
+
+    def run(self, resume=True):
+        """Sync every brand. With resume set to True, an unfinished previous
+        run is continued: brands it already synced are skipped. Brands whose
+        fetch fails are reported and left for the next run.
+
+        Returns
+        -------
+        reports : list of BrandReport objects
+            One per brand, in the order of the brands list.
+        """
+        run_id = self.snapshot.start_run(resume=resume)
+        done = self.snapshot.completed_brands(run_id)
+        reports = dict((brand, BrandReport(brand, skipped=True))
+                       for brand in self.brands if brand in done)
+        pending = [brand for brand in self.brands if brand not in done]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = dict((executor.submit(self._fetch, brand), brand)
+                           for brand in pending)
+            for future in as_completed(futures):
+                brand = futures[future]
+                try:
+                    devices, fetch_seconds = future.result()
+                except Exception as exception:
+                    reports[brand] = BrandReport(brand, error=exception)
+                    continue
+                start = time.perf_counter()
+                new, changed, unchanged = self.snapshot.update(devices)
+                self.snapshot.complete_brand(run_id, brand)
+                reports[brand] = BrandReport(
+                    brand, len(devices), new, changed, unchanged,
+                    fetch_seconds, time.perf_counter() - start)
+        if all(reports[brand].error is None for brand in self.brands):
+            self.snapshot.finish_run(run_id)
+        return [reports[brand] for brand in self.brands]
@@ -0,0 +1,336 @@
+"""testing.py - a local stub of the Fono API, used by the tests so that they can
+run without network access or a real API token.
+"""
+
+import gzip
+import json
+import random
+import threading
+import time
+import zlib
+from collections import deque
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+INVALID_TOKEN = ('Invalid or Blocked Token. Generate a Token at '
+                 'fonoapi.freshpixl.com')
+NO_RESULTS = 'No Matching Results Found.'
+
+
+################################################################################
+# Request handler
+################################################################################
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Answers getdevice/getlatest POST requests from the devices the server
+    was created with.
+    """
+
+    # HTTP/1.1 so that clients can keep connections alive
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately: without TCP_NODELAY, Nagle's
+    # algorithm and delayed ACKs add 40ms to every keep-alive response
+    disable_nagle_algorithm = True
+
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.count('connections')
+
+
+    def log_message(self, format, *args):
+        pass
+
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        self.server.count('requests')
+        self.server.wait()
+        fault = self.server.next_fault()
+        if fault is not None:
+            return self.respond(*fault)
+        endpoint = self.path.rstrip('/').rsplit('/', 1)[-1]
+        try:
+            postdata = json.loads(body.decode('utf-8'))
+        except ValueError:
+            return self.respond(400, {'status': 'error',
+                                      'message': 'Malformed request'})
+        if postdata.get('token') != self.server.token:
+            return self.respond(200, {'status': 'error',
+                                      'message': INVALID_TOKEN})
+        if endpoint == 'getdevice':
+            result = self.server.getdevice(postdata)
+        elif endpoint == 'getlatest':
+            result = self.server.getlatest(postdata)
+        else:
+            return self.respond(404, {'status': 'error',
+                                      'message': 'Unknown endpoint'})
+        if not result:
+            if self.server.empty_result == 'list':
+                return self.respond(200, [[]])
+            return self.respond(200, {'status': 'error',
+                                      'message': NO_RESULTS})
+        return self.respond(200, result)
+
+
+    def respond(self, status_code, payload, headers=None):
+        if isinstance(payload, str):
+            body, content_type = payload.encode('utf-8'), 'text/html'
+        else:
+            body = json.dumps(payload).encode('utf-8')
+            content_type = 'application/json'
+        encoding = self.server.content_encoding(
+            self.headers.get('Accept-Encoding', ''))
+        if encoding == 'gzip':
+            body = gzip.compress(body, compresslevel=6)
+        elif encoding == 'deflate':
+            body = zlib.compress(body, 6)
+        # Counted before the body is sent, so that a client reading the stats
+        # once it has its response sees its bytes
+        self.server.count('bytes_sent', len(body))
+        self.send_response(status_code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if encoding is not None:
+            self.send_header('Content-Encoding', encoding)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+################################################################################
+# StubFonoAPIServer - a threaded HTTP server emulating the Fono API
+################################################################################
+
+
+class StubFonoAPIServer(ThreadingMixIn, HTTPServer):
+    """StubFonoAPIServer - a local HTTP server that emulates the getdevice and
+    getlatest endpoints of the Fono API. Use it as a context manager, and point
+    a FonoAPI object at its api_url attribute:
+
+        with StubFonoAPIServer(devices, token='ABC') as server:
+            fon = FonoAPI('ABC', api_url=server.api_url)
+    """
+
+    daemon_threads = True
+
+
+    def __init__(self, devices, token='ABC', host='127.0.0.1', port=0,
+                 latency=0.0, jitter=0.0, error_rate=0.0,
+                 empty_result='message', seed=None, compress=False):
+        """Initialize the server. It does not serve requests until start is
+        called (or the object is used as a context manager).
+
+        Parameters
+        ----------
+        devices : list of dictionaries
+            The devices known to the stub, in the same format as the API
+            results.
+
+        token : string (default is 'ABC')
+            The only API token accepted by the stub.
+
+        host, port : string, int (optional)
+            Address to bind to. The default port of 0 picks a free port.
+
+        latency, jitter : float (default is 0.0)
+            Every response is delayed by latency seconds plus a random delay
+            of up to jitter seconds.
+
+        error_rate : float (default is 0.0)
+            Fraction of the requests answered with a 500 error dict.
+
+        empty_result : 'message' or 'list' (default is 'message')
+            How requests without results are answered: with the API's "No
+            Matching Results Found." error dict, or with [[]].
+
+        seed : int (optional)
+            Seed of the random delays and errors.
+
+        compress : boolean (default is False)
+            If set to True, response bodies are compressed with gzip or
+            deflate when the request's Accept-Encoding allows it.
+        """
+        assert empty_result in ('message', 'list')
+        HTTPServer.__init__(self, (host, port), _StubHandler)
+        self.devices, self.token = list(devices), token
+        self.latency, self.jitter, self.error_rate = latency, jitter, error_rate
+        self.empty_result, self.compress = empty_result, compress
+        self._random = random.Random(seed)
+        self.stats = {'connections': 0, 'requests': 0, 'bytes_sent': 0}
+        self._stats_lock = threading.Lock()
+        self._faults, self._stalls = deque(), deque()
+        self._thread = None
+
+
+    @property
+    def api_url(self):
+        host, port = self.server_address[:2]
+        return 'http://{}:{}/v1/'.format(host, port)
+
+
+    def count(self, name, n=1):
+        with self._stats_lock:
+            self.stats[name] += n
+
+
+    def content_encoding(self, accept_encoding):
+        """The encoding of the responses to a request accepting
+        accept_encoding: gzip or deflate if compress is set and the client
+        accepts them, in this order of preference, None otherwise.
+        """
+        if not self.compress:
+            return None
+        accepted = [part.split(';')[0].strip().lower()
+                    for part in accept_encoding.split(',')]
+        for encoding in ('gzip', 'deflate'):
+            if encoding in accepted:
+                return encoding
+        return None
+
+
+    def inject(self, status_code, payload=None, headers=None, times=1):
+        """Answer the next times requests with status_code, payload (a json
+        serializable object, or a string sent as html) and extra headers,
+        whatever the request.
+        """
+        if payload is None:
+            payload = {'status': 'error', 'message': 'Injected fault'}
+        with self._stats_lock:
+            self._faults.extend([(status_code, payload, headers)] * times)
+
+
+    def stall(self, seconds, times=1):
+        """Delay the answers to the next times requests by seconds on top of
+        the latency, to emulate occasional slow responses.
+        """
+        with self._stats_lock:
+            self._stalls.extend([seconds] * times)
+
+
+    def next_fault(self):
+        with self._stats_lock:
+            if self._faults:
+                return self._faults.popleft()
+            if self.error_rate and self._random.random() < self.error_rate:
+                return 500, {'status': 'error',
+                             'message': 'Internal Server Error'}, None
+        return None
+
+
+    def wait(self):
+        """Sleep for the configured latency, plus any stall.
+        """
+        delay = self.latency
+        with self._stats_lock:
+            if self._stalls:
+                delay += self._stalls.popleft()
+            if self.jitter:
+                delay += self._random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+
+    def getdevice(self, postdata):
+        device = (postdata.get('device') or '').lower()
+        brand = (postdata.get('brand') or '').lower()
+        result = [d for d in self.devices
+                  if device in d.get('DeviceName', '').lower() and
+                  (not brand or brand == d.get('Brand', '').lower())]
+        position = postdata.get('position')
+        if position is not None:
+            position = int(position)
+            result = result[position:position + 1] if position >= 0 else []
+        return result
+
+
+    def getlatest(self, postdata):
+        brand = (postdata.get('brand') or '').lower()
+        result = [d for d in self.devices
+                  if brand == d.get('Brand', '').lower()]
+        return result[:int(postdata.get('limit') or 100)]
+
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        kwargs={'poll_interval': 0.05})
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+################################################################################
+# Synthetic devices, for benchmarks
+################################################################################
+
+
+_BRANDS = [u'Apple', u'Samsung', u'LG', u'Huawei', u'Nokia', u'Sony',
+           u'Motorola', u'HTC', u'Xiaomi', u'Lenovo']
+
+_VALUES = {
+    u'technology': [u'GSM', u'GSM / HSPA', u'GSM / HSPA / LTE'],
+    u'gprs': [u'Yes', u'No'], u'edge': [u'Yes', u'No'],
+    u'nfc': [u'Yes', u'No'], u'sim': [u'Mini-SIM', u'Micro-SIM', u'Nano-SIM'],
+    u'status': [u'Available. Released 2017, May', u'Discontinued'],
+    u'os': [u'Android 7.0 (Nougat)', u'Android 6.0 (Marshmallow)',
+            u'iOS 11', u'Windows Phone 8.1'],
+    u'battery_c': [u'Li-Ion {} mAh battery'.format(mah)
+                   for mah in range(1500, 4500, 250)],
+    u'weight': [u'{} g'.format(grams) for grams in range(110, 220, 10)],
+    u'size': [u'{} inches'.format(inches / 10.0) for inches in range(40, 70)],
+    u'resolution': [u'720 x 1280 pixels', u'1080 x 1920 pixels',
+                    u'1440 x 2560 pixels'],
+    u'internal': [u'{} GB, {} GB RAM'.format(gb, ram)
+                  for gb in (8, 16, 32, 64, 128) for ram in (1, 2, 3, 4)],
+    u'price': [u'About {} EUR'.format(eur) for eur in range(100, 900, 50)],
+    u'announced': [u'{}, {}'.format(year, month) for year in range(2010, 2018)
+                   for month in (u'January', u'May', u'September')],
+}
+
+
+def synthetic_devices(n, seed=0):
+    """Return n fake devices with realistic looking attributes. Each device has
+    Brand, DeviceName, the attributes of _VALUES, and about half of the other
+    attributes of Devices._all_attributes. Values are drawn from small pools of
+    shared strings, so that millions of devices fit in memory.
+    """
+    from .fonoapi import Devices
+    rng = random.Random(seed)
+    others = [attribute for attribute in Devices._all_attributes
+              if attribute not in _VALUES and
+              attribute not in (u'Brand', u'DeviceName')]
+    filler = dict((attribute, [u'{} {}'.format(attribute, i)
+                               for i in range(10)])
+                  for attribute in others)
+    devices = []
+    for i in range(n):
+        brand = _BRANDS[i % len(_BRANDS)]
+        device = {u'Brand': brand,
+                  u'DeviceName': u'{} Model {}'.format(brand, i)}
+        for attribute, values in _VALUES.items():
+            device[attribute] = values[rng.randrange(len(values))]
+        for attribute in others:
+            if rng.random() < 0.5:
+                device[attribute] = filler[attribute][rng.randrange(10)]
+        devices.append(device)
+    return devices
@@ -44,7 +44,11 @@ setup(
     author=__author__,
     author_email=__email__,
     packages=['fonoapi'],
+    python_requires='>=3.6',
     install_requires=install_requires,
+    extras_require={'async': ['aiohttp>=3.3'], 'arrow': ['pyarrow>=1.0'],
+                    'fast': ['orjson>=3.0']},
+    entry_points={'console_scripts': ['fonoapi = fonoapi.cli:main']},
     download_url='{}/archive/v{}.tar.gz'.format(
         __uri__, __version__),
     keywords=['api', 'mobile', 'phone', 'FonoApi']
@@ -19,3 +19,34 @@ def pytest_generate_tests(metafunc):
     option_value = metafunc.config.option.apitoken
     if 'apitoken' in metafunc.fixturenames and option_value is not None:
         metafunc.parametrize('apitoken', [option_value])
+
+
+################################################################################
+# A local stub of the Fono API, for tests that should not need the network
+################################################################################
+
+
+STUB_DEVICES = [
+    {u'Brand': u'Apple', u'DeviceName': u'Apple iPhone 7 Plus',
+     u'announced': u'2016, September', u'nfc': u'Yes',
+     u'battery_c': u'Non-removable Li-Ion 2900 mAh battery (11.1 Wh)'},
+    {u'Brand': u'Apple', u'DeviceName': u'Apple iPhone 7',
+     u'announced': u'2016, September', u'nfc': u'Yes',
+     u'battery_c': u'Non-removable Li-Ion 1960 mAh battery (7.45 Wh)'},
+    {u'Brand': u'Prestigio', u'DeviceName': u'Prestigio MultiPhone 7500',
+     u'announced': u'2013, April'},
+    {u'Brand': u'LG', u'DeviceName': u'LG Stylo 3 Plus',
+     u'announced': u'2017, May', u'nfc': u'Yes',
+     u'battery_c': u'Li-Ion 3080 mAh battery'},
+    {u'Brand': u'Huawei', u'DeviceName': u'Huawei Honor 9',
+     u'announced': u'2017, June', u'nfc': u'No'},
+    {u'Brand': u'Huawei', u'DeviceName': u'Huawei Honor 9 Lite',
+     u'announced': u'2017, December'},
+]
+
+
+@pytest.fixture
+def stub_server():
+    from fonoapi.testing import StubFonoAPIServer
+    with StubFonoAPIServer(STUB_DEVICES, token='ABC') as server:
+        yield server
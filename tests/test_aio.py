@@ -0,0 +1,58 @@
+"""test_aio.py - tests of the AsyncFonoAPI client against a local stub server.
+"""
+
+import asyncio
+
+import fonoapi
+import pytest
+
+pytest.importorskip('aiohttp')
+
+
+def run(coroutine):
+    return asyncio.new_event_loop().run_until_complete(coroutine)
+
+
+def test_getdevice_and_getlatest(stub_server):
+    async def main():
+        async with fonoapi.AsyncFonoAPI('ABC', api_url=stub_server.api_url,
+                                        timeout=5) as fon:
+            device = await fon.getdevice('iPhone 7', brand='Apple', position=1)
+            latest = await fon.getlatest('Huawei', limit=1)
+            missing = await fon.getdevice('madeupcellphone', verbose=False)
+        return device, latest, missing
+
+    device, latest, missing = run(main())
+    assert device.list_of_lists(['DeviceName'])[0] == [['Apple iPhone 7']]
+    assert latest.list_of_dicts()[0]['DeviceName'] == 'Huawei Honor 9'
+    assert missing.null
+
+
+def test_exceptions_match_fonoapi(stub_server):
+    async def main(token, **kwargs):
+        async with fonoapi.AsyncFonoAPI(token,
+                                        api_url=stub_server.api_url) as fon:
+            return await fon.getlatest('madeupbrand', **kwargs)
+
+    with pytest.raises(fonoapi.InvalidAPITokenException):
+        run(main('XYZ'))
+    with pytest.raises(fonoapi.NoAPIResultsException):
+        run(main('ABC', no_results_exception=True))
+    stub_server.inject(502, '<html><body>Bad Gateway</body></html>')
+    with pytest.raises(fonoapi.StatusCodeErrorNon200Exception):
+        run(main('ABC'))
+
+
+def test_getdevices_bounded_concurrency(stub_server):
+    async def main():
+        async with fonoapi.AsyncFonoAPI('ABC', api_url=stub_server.api_url,
+                                        max_concurrency=2) as fon:
+            results = await fon.getdevices(['Honor 9', 'Stylo', 7] * 10)
+            merged = await fon.getdevices(['Honor 9', 'Stylo'], merge=True)
+        return results, merged
+
+    results, merged = run(main())
+    assert [len(r.list_of_dicts()) for r in results[:2]] == [2, 1]
+    assert isinstance(results[2], ValueError)
+    assert len(merged.list_of_dicts()) == 3
+    assert stub_server.stats['connections'] <= 2
@@ -0,0 +1,145 @@
+"""test_breaker.py - tests of the circuit breaker and of hedged requests.
+"""
+
+import json
+import time
+
+import pytest
+
+import fonoapi
+from fonoapi import CircuitBreaker, LRUCache
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+################################################################################
+# CircuitBreaker
+################################################################################
+
+
+def test_breaker_opens_and_recovers():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_rate=0.5, window=4, min_calls=3,
+                             reset_timeout=10, clock=clock)
+    for success in (False, True):
+        assert breaker.allow()
+        breaker.record(success)
+    assert breaker.state == 'closed'
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == 'open'
+    assert not breaker.allow() and breaker.stats()['rejected'] == 1
+
+    # Half-open: a single probe, which reopens the breaker if it fails
+    clock.now = 10
+    assert breaker.state == 'half-open'
+    assert breaker.allow() and not breaker.allow()
+    breaker.record(False)
+    assert breaker.state == 'open' and breaker.stats()['opened'] == 2
+    clock.now = 20
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.stats() == {'state': 'closed', 'opened': 2,
+                               'rejected': 2, 'failure_rate': 0.0}
+
+
+def test_breaker_serves_stale_results(stub_server):
+    clock = FakeClock()
+    cache = LRUCache(ttl=60, max_stale=3600, clock=clock)
+    breaker = CircuitBreaker(window=2, min_calls=2, reset_timeout=30,
+                             clock=clock)
+    metrics = fonoapi.Metrics()
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url, cache=cache,
+                         breaker=breaker, metrics=metrics) as fon:
+        fresh = fon.getdevice('iPhone 7').list_of_dicts()
+        clock.now = 120
+        stub_server.inject(503)
+        with pytest.raises(fonoapi.StatusCodeErrorNon200Exception):
+            fon.getdevice('iPhone 7')
+        assert breaker.state == 'open'
+
+        # Open: expired results are served, other requests fail fast
+        requests = stub_server.stats['requests']
+        assert fon.getdevice('iPhone 7').list_of_dicts() == fresh
+        with pytest.raises(fonoapi.CircuitOpenException):
+            fon.getdevice('Honor 9')
+        assert stub_server.stats['requests'] == requests
+        assert cache.get('missing', stale=True) is None
+
+        clock.now = 150
+        assert fon.getdevice('Honor 9').not_null
+        assert breaker.state == 'closed'
+    getdevice = metrics.snapshot()['getdevice']
+    assert getdevice['sources']['stale'] == 1
+    assert getdevice['requests']['circuit-open'] == 1
+
+
+class StrictCodec(object):
+    """Refuses integers beyond 64 bits, like orjson.
+    """
+
+    def dumps(self, obj):
+        if any(isinstance(v, int) and v >= 2 ** 64 for v in obj.values()):
+            raise TypeError('Integer exceeds 64-bit range')
+        return json.dumps(obj).encode('utf-8')
+
+    loads = staticmethod(json.loads)
+
+
+def test_unencodable_query_does_not_take_the_probe(stub_server):
+    clock = FakeClock()
+    breaker = CircuitBreaker(window=2, min_calls=2, reset_timeout=30,
+                             clock=clock)
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url, breaker=breaker,
+                         json_codec=StrictCodec()) as fon:
+        stub_server.inject(503, times=2)
+        for _ in range(2):
+            with pytest.raises(fonoapi.StatusCodeErrorNon200Exception):
+                fon.getdevice('iPhone 7')
+        clock.now = 30
+        with pytest.raises(TypeError):
+            fon.getdevice('iPhone 7', position=2 ** 70)
+        assert fon.getdevice('iPhone 7').not_null
+    assert breaker.state == 'closed'
+
+
+################################################################################
+# Hedged requests
+################################################################################
+
+
+def test_hedged_request_beats_slow_response(stub_server):
+    metrics = fonoapi.Metrics()
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url, hedge_after=0.05,
+                         metrics=metrics) as fon:
+        assert fon.getdevice('iPhone 7').not_null
+        assert fon.hedges == 0
+        stub_server.stall(2.0)
+        start = time.perf_counter()
+        assert fon.getdevice('Honor 9').not_null
+        assert time.perf_counter() - start < 1.0
+        assert fon.hedges == 1
+    assert stub_server.stats['requests'] == 3
+    assert metrics.snapshot()['getdevice']['hedges'] == 1
+
+
+def test_queued_requests_are_not_hedged(stub_server):
+    # 3 workers share the 2 hedging threads, and every request takes 0.4 s.
+    # The third request is queued until 0.4 s and answered at 0.8 s: hedged
+    # 0.6 s after it was queued it would be duplicated, 0.6 s after it was
+    # sent it is not
+    stub_server.stall(0.4, times=3)
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url, pool_maxsize=2,
+                         hedge_after=0.6, coalesce=False) as fon:
+        results = fon.getdevices(['iPhone 7', 'Honor 9', 'Stylo'],
+                                 max_workers=3)
+        assert all(not isinstance(r, Exception) for r in results)
+        assert fon.hedges == 0
+    assert stub_server.stats['requests'] == 3
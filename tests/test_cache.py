@@ -0,0 +1,189 @@
+"""test_cache.py - tests of the caches of API results.
+"""
+
+import threading
+
+import fonoapi
+import pytest
+from fonoapi.cache import LRUCache, SQLiteCache, cache_key
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+################################################################################
+# LRUCache
+################################################################################
+
+
+def test_cache_key_ignores_token():
+    url = 'https://fonoapi.freshpixl.com/v1/getdevice'
+    key1 = cache_key(url, {'device': 'A8', 'brand': None, 'token': 'ABC'})
+    key2 = cache_key(url, {'token': 'XYZ', 'brand': None, 'device': 'A8'})
+    assert key1 == key2
+    assert key1 != cache_key(url.replace('device', 'latest'),
+                             {'device': 'A8', 'brand': None})
+
+
+def test_lru_eviction_and_ttl():
+    clock = FakeClock()
+    cache = LRUCache(maxsize=2, ttl=10, clock=clock)
+    cache.set('a', [1])
+    cache.set('b', [2])
+    assert cache.get('a') == [1]
+    cache.set('c', [3])
+    assert cache.get('b') is None
+    clock.now = 11
+    assert cache.get('a') is None
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'evictions': 1,
+                             'expirations': 1, 'size': 1}
+
+
+def test_lru_stale_entries():
+    clock = FakeClock()
+    cache = LRUCache(ttl=10, max_stale=100, clock=clock)
+    cache.set('a', [1])
+    clock.now = 50
+    assert cache.get('a') is None
+    assert cache.get('a', stale=True) == [1]
+    clock.now = 110
+    assert cache.get('a', stale=True) is None and len(cache) == 0
+
+
+def test_lru_thread_safety():
+    cache = LRUCache(maxsize=50)
+
+    def worker(offset):
+        for i in range(2000):
+            cache.set((offset + i) % 100, i)
+            cache.get(i % 100)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.stats()
+    assert stats['size'] == 50
+    assert stats['hits'] + stats['misses'] == 8 * 2000
+
+
+def test_fonoapi_uses_cache(stub_server):
+    cache = LRUCache()
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url,
+                         cache=cache) as fon:
+        first = fon.getdevice('iPhone 7', brand='Apple')
+        second = fon.getdevice('iPhone 7', brand='Apple')
+        fon.getdevice('madeupcellphone', verbose=False)
+        fon.getdevice('madeupcellphone', verbose=False)
+    assert first.list_of_dicts() == second.list_of_dicts()
+    assert stub_server.stats['requests'] == 3
+    assert cache.stats()['hits'] == 1
+
+
+def test_negative_caching_has_its_own_ttl(stub_server):
+    clock = FakeClock()
+    cache = LRUCache(ttl=3600, clock=clock)
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url, cache=cache,
+                         negative_ttl=60) as fon:
+        assert fon.getdevice('madeupcellphone', verbose=False).null
+        assert fon.getdevice('madeupcellphone', verbose=False).null
+        with pytest.raises(fonoapi.NoAPIResultsException):
+            fon.getdevice('madeupcellphone', no_results_exception=True)
+        assert stub_server.stats['requests'] == 1
+        fon.getdevice('iPhone 7', verbose=False)
+        clock.now = 61
+        fon.getdevice('madeupcellphone', verbose=False)
+        fon.getdevice('iPhone 7', verbose=False)
+    assert stub_server.stats['requests'] == 3
+
+
+def test_normalized_queries_share_cache_entries(stub_server):
+    cache = LRUCache()
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url, cache=cache,
+                         normalize=True) as fon:
+        first = fon.getdevice('iPhone 7', brand='Apple Inc')
+        for device, brand in [('  iphone   7 ', 'APPLE'),
+                              (u'\u201ciPhone 7\u201d,', ' apple ')]:
+            devices = fon.getdevice(device, brand=brand)
+            assert devices.list_of_dicts() == first.list_of_dicts()
+            assert devices.input_parameters['device'] == device
+        assert len(fon.getlatest('Huawei Technologies').list_of_dicts()) == 2
+        fon.getlatest('huawei')
+    assert stub_server.stats['requests'] == 2
+    assert cache.stats()['hits'] == 3
+
+
+################################################################################
+# SQLiteCache
+################################################################################
+
+
+def test_sqlite_cache_roundtrip_and_ttl(tmpdir):
+    cache = SQLiteCache(str(tmpdir.join('cache.sqlite')), ttl=60)
+    cache.set('a', [{'DeviceName': 'LG V30'}])
+    cache.set('b', [{'DeviceName': 'LG G6'}], ttl=-1)
+    assert cache.get('a') == [{'DeviceName': 'LG V30'}]
+    assert cache.get('b') is None
+    assert cache.get('c') is None
+    assert cache.trim() == 1
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'evictions': 0,
+                             'expirations': 1, 'size': 1}
+
+
+def test_sqlite_cache_size_cap(tmpdir):
+    cache = SQLiteCache(str(tmpdir.join('cache.sqlite')), max_entries=10,
+                        trim_every=5)
+    for i in range(25):
+        cache.set(str(i), [i])
+    assert len(cache) == 10
+    assert cache.get('24') == [24]
+    assert cache.get('14') is None
+    cache.vacuum()
+    assert len(cache) == 10
+
+
+def test_sqlite_cache_stale_entries(tmpdir):
+    cache = SQLiteCache(str(tmpdir.join('cache.sqlite')), max_stale=3600)
+    cache.set('a', [1], ttl=-60)
+    cache.set('b', [2], ttl=-7200)
+    assert cache.get('a') is None and cache.get('a', stale=True) == [1]
+    assert cache.get('b', stale=True) is None
+    assert cache.trim() == 1 and len(cache) == 1
+
+
+def test_sqlite_cache_threads(tmpdir):
+    cache = SQLiteCache(str(tmpdir.join('cache.sqlite')))
+
+    def worker(n):
+        for i in range(50):
+            cache.set('{}-{}'.format(n, i), [i])
+            assert cache.get('{}-{}'.format(n, i)) == [i]
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(cache) == 200
+
+
+def test_sqlite_cache_warm_restart(stub_server, tmpdir):
+    path = str(tmpdir.join('cache.sqlite'))
+    queries = ['iPhone 7', 'Honor 9', 'Stylo']
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url,
+                         cache=SQLiteCache(path)) as fon:
+        cold = fon.getdevices(queries)
+    requests_made = stub_server.stats['requests']
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url,
+                         cache=SQLiteCache(path)) as fon:
+        warm = fon.getdevices(queries)
+    assert stub_server.stats['requests'] == requests_made == 3
+    assert [d.list_of_dicts() for d in cold] == \
+        [d.list_of_dicts() for d in warm]
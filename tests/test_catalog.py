@@ -0,0 +1,63 @@
+"""test_catalog.py - tests of the local device catalog.
+"""
+
+import fonoapi
+import pytest
+from fonoapi import DeviceCatalog, Devices
+
+from .conftest import STUB_DEVICES
+
+
+def names(devices):
+    return [device['DeviceName'] for device in devices.list_of_dicts()]
+
+
+def test_catalog_matches_api_semantics(stub_server):
+    catalog = DeviceCatalog([Devices(STUB_DEVICES)])
+    queries = [('iPhone 7', None, None), ('iphone 7', 'apple', None),
+               ('Honor 9', None, 1), ('Honor 9', None, 5), ('LG', None, None),
+               ('9', None, None), ('madeupcellphone', None, None)]
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url) as fon:
+        for device, brand, position in queries:
+            expected = fon.getdevice(device, position, brand, verbose=False)
+            local = catalog.getdevice(device, position, brand)
+            assert names(local) == names(expected)
+            assert local.input_parameters == expected.input_parameters
+
+
+def test_catalog_search_by_hand():
+    catalog = DeviceCatalog([Devices(STUB_DEVICES)])
+    assert names(catalog.getdevice('plus')) == ['Apple iPhone 7 Plus',
+                                                'LG Stylo 3 Plus']
+    assert names(catalog.getdevice('Plus', brand='lg')) == ['LG Stylo 3 Plus']
+    assert names(catalog.getdevice('phone 7')) == [
+        'Apple iPhone 7 Plus', 'Apple iPhone 7', 'Prestigio MultiPhone 7500']
+    assert names(catalog.getdevice('phone 7', brand='Apple', position=1)) == [
+        'Apple iPhone 7']
+    assert names(catalog.getdevice('honor 9 l')) == ['Huawei Honor 9 Lite']
+    assert names(catalog.getdevice('9', brand='Huawei')) == [
+        'Huawei Honor 9', 'Huawei Honor 9 Lite']
+    assert names(catalog.getdevice('Honor', brand='Apple')) == []
+
+
+def test_catalog_upserts_and_raises():
+    catalog = DeviceCatalog(n=2)
+    assert catalog.add(Devices(STUB_DEVICES)) == len(STUB_DEVICES)
+    updated = dict(STUB_DEVICES[0], nfc=u'No')
+    assert catalog.add([updated]) == 0
+    assert len(catalog) == len(STUB_DEVICES)
+    assert catalog.getdevice('7 Plus').list_of_dicts() == [updated]
+    with pytest.raises(fonoapi.NoAPIResultsException):
+        catalog.getdevice('madeupcellphone', no_results_exception=True)
+
+
+def test_fonoapi_consults_catalog_first(stub_server):
+    catalog = DeviceCatalog([Devices(STUB_DEVICES[:2])])
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url,
+                         catalog=catalog) as fon:
+        assert names(fon.getdevice('iPhone', brand='Apple')) == \
+            ['Apple iPhone 7 Plus', 'Apple iPhone 7']
+        assert stub_server.stats['requests'] == 0
+        assert names(fon.getdevice('Honor 9')) == \
+            ['Huawei Honor 9', 'Huawei Honor 9 Lite']
+        assert stub_server.stats['requests'] == 1
@@ -0,0 +1,97 @@
+"""test_cli.py - tests of the fonoapi console command against a local stub
+server.
+"""
+
+import json
+import os
+
+import pytest
+from fonoapi import cli
+
+
+INPUT = 'device,brand\niPhone 7,Apple\nHonor 9,\nmadeup,\nStylo,LG\n'
+
+
+def run(stub_server, tmpdir, *arguments):
+    arguments = [str(tmpdir.join('in.csv'))] + list(arguments) + [
+        '--token', 'ABC', '--api-url', stub_server.api_url, '--quiet']
+    return cli.main(arguments)
+
+
+def test_enriches_csv_in_input_order(stub_server, tmpdir):
+    tmpdir.join('in.csv').write(INPUT)
+    output = tmpdir.join('out.csv')
+    assert run(stub_server, tmpdir, str(output), '--brand-column', 'brand',
+               '--attributes', 'DeviceName', 'nfc') == 0
+    assert output.read().splitlines() == [
+        'device,brand,DeviceName,nfc,fonoapi_status,fonoapi_error',
+        'iPhone 7,Apple,Apple iPhone 7 Plus,Yes,ok,',
+        'Honor 9,,Huawei Honor 9,No,ok,',
+        'madeup,,,,no-results,',
+        'Stylo,LG,LG Stylo 3 Plus,Yes,ok,']
+    assert not os.path.exists(str(output) + '.checkpoint')
+
+
+def test_jsonl_all_matches(stub_server, tmpdir):
+    tmpdir.join('in.csv').write(INPUT)
+    output = tmpdir.join('out.jsonl')
+    assert run(stub_server, tmpdir, str(output), '--all-matches') == 0
+    rows = [json.loads(line) for line in output.read().splitlines()]
+    assert [row['device'] for row in rows] == ['iPhone 7', 'iPhone 7',
+                                              'iPhone 7', 'Honor 9',
+                                              'Honor 9', 'madeup', 'Stylo']
+
+
+def test_resumes_from_checkpoint(stub_server, tmpdir):
+    tmpdir.join('in.csv').write(INPUT)
+    expected = tmpdir.join('expected.csv')
+    run(stub_server, tmpdir, str(expected))
+    # A crash after the checkpoint of the first two rows, with a partially
+    # written third row
+    lines = expected.read().splitlines(True)
+    output = tmpdir.join('out.csv')
+    output.write(''.join(lines[:3]) + 'madeup,,')
+    cli.save_checkpoint(str(output) + '.checkpoint', 2,
+                        len(''.join(lines[:3]).encode('utf-8')))
+    requests = stub_server.stats['requests']
+    assert run(stub_server, tmpdir, str(output)) == 0
+    assert output.read() == expected.read()
+    assert stub_server.stats['requests'] - requests == 2
+    # A checkpoint without its output file starts over
+    cli.save_checkpoint(str(output) + '.checkpoint', 2, 100)
+    output.remove()
+    assert run(stub_server, tmpdir, str(output)) == 0
+    assert output.read() == expected.read()
+
+
+def test_invalid_token_aborts(stub_server, tmpdir, capsys):
+    tmpdir.join('in.csv').write(INPUT)
+    assert cli.main([str(tmpdir.join('in.csv')), str(tmpdir.join('o.csv')),
+                     '--token', 'XYZ', '--api-url', stub_server.api_url,
+                     '--quiet']) == 1
+    assert 'not valid' in capsys.readouterr().err
+
+
+def test_progress_eta():
+    now = [0.0]
+    progress = cli.Progress(total=100, done=20, stream=None,
+                            clock=lambda: now[0])
+    now[0] = 10.0
+    progress.update(40)
+    assert progress.rate() == 4.0 and progress.eta() == 10.0
+    assert progress.line() == '60 rows of 100, 4.0 rows/s, ETA 00:00:10'
+    with pytest.raises(SystemExit):
+        cli.parse_args(['in.csv', 'out.csv', '--token', ''])
+
+
+def test_invalid_position_is_an_error_row(stub_server, tmpdir):
+    tmpdir.join('in.csv').write('device,pos\niPhone 7,x\nHonor 9,\n,1\n')
+    output = tmpdir.join('out.jsonl')
+    assert run(stub_server, tmpdir, str(output), '--position-column',
+               'pos') == 0
+    rows = [json.loads(line) for line in output.read().splitlines()]
+    assert [(row['device'], row['fonoapi_status']) for row in rows] == [
+        ('iPhone 7', 'error'), ('Honor 9', 'ok'), ('', 'error')]
+    assert 'ValueError' in rows[0]['fonoapi_error']
+    assert 'No device name' in rows[2]['fonoapi_error']
+    assert stub_server.stats['requests'] == 1
@@ -0,0 +1,250 @@
+"""test_client.py - tests of the FonoAPI client against a local stub server.
+"""
+
+import threading
+
+import fonoapi
+import pytest
+
+
+################################################################################
+# Connection pooling
+################################################################################
+
+
+def test_connections_are_reused(stub_server):
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url) as fon:
+        for _ in range(5):
+            assert fon.getdevice('iPhone 7', brand='Apple').not_null
+    assert stub_server.stats['requests'] == 5
+    assert stub_server.stats['connections'] == 1
+
+
+def test_keep_alive_disabled(stub_server):
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url,
+                         keep_alive=False) as fon:
+        for _ in range(3):
+            fon.getlatest('Huawei')
+    assert stub_server.stats['connections'] == 3
+
+
+def test_session_shared_across_threads(stub_server):
+    fon = fonoapi.FonoAPI('ABC', api_url=stub_server.api_url, pool_maxsize=4,
+                          pool_block=True)
+    sessions, results = [], []
+
+    def worker():
+        sessions.append(fon.session)
+        results.append(fon.getdevice('Honor 9', verbose=False))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    fon.close()
+    assert len(set(map(id, sessions))) == 1
+    assert all(len(devices.list_of_dicts()) == 2 for devices in results)
+    assert stub_server.stats['connections'] <= 4
+
+
+def test_close_and_reopen(stub_server):
+    fon = fonoapi.FonoAPI('ABC', api_url=stub_server.api_url, timeout=5)
+    first = fon.session
+    fon.close()
+    assert fon.session is not first
+    assert fon.getlatest('LG', timeout=(1, 5)).not_null
+    fon.close()
+
+
+def test_invalid_token_against_stub(stub_server):
+    with pytest.raises(fonoapi.InvalidAPITokenException):
+        with fonoapi.FonoAPI('XYZ', api_url=stub_server.api_url) as fon:
+            fon.getdevice('iPhone 7')
+
+
+################################################################################
+# Bulk lookups
+################################################################################
+
+
+def test_getdevices_keeps_input_order(stub_server):
+    queries = ['Honor 9', ('iPhone 7', 'Apple', 1), {'device': 'Stylo'},
+               ('MultiPhone',)] * 5
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url) as fon:
+        results = fon.getdevices(queries, max_workers=4, max_in_flight=3)
+    names = [[d['DeviceName'] for d in r.list_of_dicts()] for r in results]
+    assert names == [
+        ['Huawei Honor 9', 'Huawei Honor 9 Lite'],
+        ['Apple iPhone 7'],
+        ['LG Stylo 3 Plus'],
+        ['Prestigio MultiPhone 7500']] * 5
+
+
+def test_getdevices_captures_errors(stub_server):
+    queries = ['Honor 9', 'madeupcellphone', 42, 'iPhone 7']
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url) as fon:
+        results = fon.getdevices(queries, no_results_exception=True)
+        merged = fon.getdevices(queries, merge=True)
+        with pytest.raises(fonoapi.NoAPIResultsException):
+            fon.getdevices(queries, no_results_exception=True,
+                           return_exceptions=False)
+    assert isinstance(results[1], fonoapi.NoAPIResultsException)
+    assert isinstance(results[2], ValueError)
+    assert results[3].not_null
+    assert len(merged.list_of_dicts()) == 5
+    assert list(merged.input_parameters['errors']) == [2]
+
+
+def test_igetdevices_is_lazy(stub_server):
+    def queries():
+        for i in range(1000):
+            yield 'Honor 9'
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url) as fon:
+        results = fon.igetdevices(queries(), max_workers=2, max_in_flight=2)
+        for _ in range(3):
+            next(results)
+        results.close()
+    assert stub_server.stats['requests'] <= 5
+
+
+################################################################################
+# Request coalescing
+################################################################################
+
+
+class SlowStub(object):
+    """Wraps FonoAPI._request so that calls stay in flight until released.
+    """
+
+    def __init__(self, fon):
+        self.request, self.release = fon._request, threading.Event()
+        self.calls = 0
+
+    def __call__(self, *args):
+        self.calls += 1
+        self.release.wait(5)
+        return self.request(*args)
+
+
+def test_identical_concurrent_requests_are_coalesced(stub_server):
+    fon = fonoapi.FonoAPI('ABC', api_url=stub_server.api_url)
+    fon._request = slow = SlowStub(fon)
+    results = []
+
+    def worker(no_results_exception):
+        try:
+            results.append(fon.getdevice(
+                'madeupcellphone', verbose=False,
+                no_results_exception=no_results_exception))
+        except fonoapi.NoAPIResultsException as exception:
+            results.append(exception)
+
+    threads = [threading.Thread(target=worker, args=(i % 2 == 0,))
+               for i in range(6)]
+    for thread in threads:
+        thread.start()
+    while fon.singleflight.stats()['deduplicated'] < 5:
+        threading.Event().wait(0.01)
+    slow.release.set()
+    for thread in threads:
+        thread.join()
+    fon.close()
+    assert slow.calls == 1
+    assert stub_server.stats['requests'] == 1
+    assert fon.singleflight.stats() == {'executed': 1, 'deduplicated': 5,
+                                        'in_flight': 0}
+    assert sum(isinstance(r, fonoapi.NoAPIResultsException)
+               for r in results) == 3
+
+
+def test_coalesced_callers_share_exceptions(stub_server):
+    fon = fonoapi.FonoAPI('XYZ', api_url=stub_server.api_url)
+    fon._request = slow = SlowStub(fon)
+    errors = []
+
+    def worker():
+        try:
+            fon.getlatest('LG')
+        except fonoapi.InvalidAPITokenException as exception:
+            errors.append(exception)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    while fon.singleflight.stats()['deduplicated'] < 3:
+        threading.Event().wait(0.01)
+    slow.release.set()
+    for thread in threads:
+        thread.join()
+    fon.close()
+    assert len(errors) == 4 and len(set(map(id, errors))) == 1
+    assert stub_server.stats['requests'] == 1
+
+
+################################################################################
+# Stub server options
+################################################################################
+
+
+def test_stub_empty_result_list_and_error_rate():
+    from fonoapi.testing import StubFonoAPIServer, synthetic_devices
+    devices = synthetic_devices(20)
+    assert len(set(d['DeviceName'] for d in devices)) == 20
+    with StubFonoAPIServer(devices, empty_result='list', error_rate=1.0,
+                           seed=0) as server:
+        with fonoapi.FonoAPI('ABC', api_url=server.api_url) as fon:
+            with pytest.raises(fonoapi.StatusCodeErrorNon200Exception):
+                fon.getdevice('Model 1')
+            server.error_rate = 0.0
+            assert fon.getdevice('madeupcellphone').null
+            assert fon.getdevice('Model 1', position=0).not_null
+
+
+################################################################################
+# JSON codecs and compression
+################################################################################
+
+
+def test_json_codecs(stub_server):
+    from fonoapi.codec import OrjsonCodec, StdlibJSONCodec, get_codec
+    assert isinstance(get_codec('json'), StdlibJSONCodec)
+    with pytest.raises(ValueError):
+        get_codec('yaml')
+    codecs = [get_codec('json'), get_codec(None)]
+    try:
+        codecs.append(OrjsonCodec())
+    except ImportError:
+        pass
+    results = []
+    for codec in codecs:
+        assert codec.loads(codec.dumps({'a': [1, u'é']})) == {
+            'a': [1, u'é']}
+        with pytest.raises(ValueError):
+            codec.loads(b'<html>')
+        with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url,
+                             json_codec=codec) as fon:
+            results.append(fon.getdevice('iPhone 7').list_of_dicts())
+    assert results[0] and all(result == results[0] for result in results)
+
+
+def test_compressed_responses():
+    from fonoapi.testing import StubFonoAPIServer, synthetic_devices
+    for compress in (False, True):
+        with StubFonoAPIServer(synthetic_devices(100),
+                               compress=compress) as server:
+            metrics = fonoapi.Metrics()
+            with fonoapi.FonoAPI('ABC', api_url=server.api_url,
+                                 metrics=metrics) as fon:
+                devices = fon.getlatest('Samsung', limit=100)
+            assert len(devices.devices) == 10
+            received = metrics.snapshot()['getlatest']['bytes_received']
+            assert received == server.stats['bytes_sent']
+            if compress:
+                assert received * 3 < uncompressed
+            uncompressed = received
+    server = StubFonoAPIServer([], compress=True)
+    assert server.content_encoding('deflate, gzip;q=0.5') == 'gzip'
+    assert server.content_encoding('br, deflate') == 'deflate'
+    assert server.content_encoding('identity') is None
+    server.server_close()
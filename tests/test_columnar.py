@@ -0,0 +1,83 @@
+"""test_columnar.py - tests of the memory-mapped columnar device files.
+"""
+
+import pandas as pd
+import pytest
+
+from fonoapi import CompactDevices, Devices
+from fonoapi.columnar import ColumnarTable, open_columnar, write_columnar
+from fonoapi.testing import synthetic_devices
+
+from .conftest import STUB_DEVICES
+
+
+def test_columnar_round_trips_devices(tmpdir):
+    path = str(tmpdir.join('catalog.col'))
+    devices = Devices(synthetic_devices(300) + [{'Brand': 'X', 'extra': 'y'}])
+    assert write_columnar(devices, path) == 301
+    columnar = open_columnar(path, source='test')
+    assert isinstance(columnar, CompactDevices) and columnar.not_null
+    assert columnar.input_parameters == {'source': 'test'}
+    assert columnar.list_of_dicts() == devices.list_of_dicts()
+    # The schema is every known attribute, then the unknown ones
+    table = columnar.table
+    assert table.attributes == Devices._all_attributes + ['extra']
+    assert table[-1] == {'Brand': 'X', 'extra': 'y'}
+    assert table[5:7] == devices.devices[5:7]
+    with pytest.raises(IndexError):
+        table[301]
+    assert columnar.list_of_lists() == devices.list_of_lists()
+    pd.testing.assert_frame_equal(columnar.dataframe(), devices.dataframe())
+    pd.testing.assert_frame_equal(columnar.dataframe(['os', 'nope']),
+                                  devices.dataframe(['os', 'nope']))
+    assert (columnar.filter(nfc='Yes', battery_mah__ge=3000).list_of_dicts()
+            == devices.filter(nfc='Yes', battery_mah__ge=3000).list_of_dicts())
+    table.close()
+
+
+def test_columnar_strings_are_shared(tmpdir):
+    path = str(tmpdir.join('catalog.col'))
+    write_columnar([{'a': 'Yes', 'b': 'Yes'}, {'a': 'No'}], path,
+                   attributes=['a', 'b'])
+    table = ColumnarTable(path)
+    assert table.strings() == [None, 'Yes', 'No']
+    assert table.column('b') == ['Yes', None]
+    assert list(table) == [{'a': 'Yes', 'b': 'Yes'}, {'a': 'No'}]
+    table.close()
+
+
+def test_columnar_replaced_while_open(tmpdir):
+    path = str(tmpdir.join('catalog.col'))
+    write_columnar(STUB_DEVICES, path)
+    old = ColumnarTable(path)
+    write_columnar(STUB_DEVICES[:1], path)
+    new = ColumnarTable(path)
+    assert list(old) == STUB_DEVICES and list(new) == STUB_DEVICES[:1]
+    old.close()
+    new.close()
+
+
+def test_columnar_errors_and_empty(tmpdir):
+    path = str(tmpdir.join('catalog.col'))
+    write_columnar([], path)
+    empty = open_columnar(path)
+    assert empty.null and empty.dataframe().empty
+    garbage = tmpdir.join('garbage.col')
+    garbage.write('not a catalog at all')
+    with pytest.raises(ValueError):
+        ColumnarTable(str(garbage))
+
+
+def test_columnar_byte_order_and_types(tmpdir):
+    path = str(tmpdir.join('catalog.col'))
+    devices = synthetic_devices(50)
+    for byteorder in ('little', 'big'):
+        write_columnar(devices, path, byteorder=byteorder)
+        table = ColumnarTable(path)
+        assert list(table) == devices
+        assert open_columnar(path).dataframe().equals(
+            Devices(devices).dataframe())
+        table.close()
+    # Only strings round-trip, anything else is rejected
+    with pytest.raises(TypeError):
+        write_columnar([{'Brand': 'X', 'n': 5}], path)
@@ -0,0 +1,52 @@
+"""test_compact.py - tests of the column-oriented device storage.
+"""
+
+import pandas as pd
+import pytest
+
+from fonoapi import CompactDevices, Devices, DeviceTable
+from fonoapi.testing import synthetic_devices
+
+from .conftest import STUB_DEVICES
+
+
+def test_table_round_trips_devices():
+    table = DeviceTable(STUB_DEVICES)
+    assert len(table) == len(STUB_DEVICES)
+    assert list(table) == STUB_DEVICES
+    assert table[-1] == STUB_DEVICES[-1] and table[1:3] == STUB_DEVICES[1:3]
+    with pytest.raises(IndexError):
+        table[len(STUB_DEVICES)]
+    # Attributes first seen on a later device are missing for earlier ones
+    table.append({'Brand': 'Nokia', 'keyboard': 'QWERTY'})
+    assert table[0].get('keyboard') is None
+    assert table[-1] == {'Brand': 'Nokia', 'keyboard': 'QWERTY'}
+    assert table.column('keyboard')[-2:] == [None, 'QWERTY']
+    codes, values = table.codes('Brand')
+    assert values[codes[0]] == 'Apple' and values.count('Apple') == 1
+
+
+def test_compact_devices_match_devices():
+    devices = Devices(synthetic_devices(500), brand='X')
+    compact = devices.compact()
+    assert isinstance(compact, CompactDevices) and compact.not_null
+    assert compact.input_parameters == {'brand': 'X'}
+    assert compact.list_of_dicts() == devices.list_of_dicts()
+    assert compact.list_of_lists() == devices.list_of_lists()
+    assert (compact.list_of_lists(['Brand', 'nope']) ==
+            devices.list_of_lists(['Brand', 'nope']))
+    pd.testing.assert_frame_equal(compact.dataframe(), devices.dataframe())
+    pd.testing.assert_frame_equal(compact.dataframe(['os', 'nope']),
+                                  devices.dataframe(['os', 'nope']))
+    assert (compact.filter(nfc='Yes', battery_mah__ge=3000).list_of_dicts() ==
+            devices.filter(nfc='Yes', battery_mah__ge=3000).list_of_dicts())
+    assert (Devices.merge(compact, devices).list_of_dicts() ==
+            devices.list_of_dicts())
+
+
+def test_null_compact_devices():
+    compact = CompactDevices([])
+    assert compact.null
+    assert compact.list_of_dicts() == [] and compact.list_of_lists() == ([],
+                                                                         [])
+    assert compact.dataframe().empty
@@ -0,0 +1,200 @@
+"""test_devices.py - tests of the Devices class that do not need the API.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fonoapi import Devices
+
+
+DEVICES = [
+    {u'Brand': u'Apple', u'DeviceName': u'Apple iPhone 7',
+     u'announced': u'2016, September', u'nfc': u'Yes'},
+    {u'Brand': u'LG', u'DeviceName': u'LG Stylo 3 Plus',
+     u'announced': u'2017, May', u'gpu': None},
+    {u'Brand': u'Huawei', u'DeviceName': u'Huawei Honor 9'},
+]
+
+
+def rowwise_dataframe(devices, columns=None):
+    """How Devices.dataframe used to build its DataFrame.
+    """
+    rows, columns = devices.list_of_lists(columns=columns)
+    return pd.DataFrame(rows, columns=columns).fillna(value=np.nan)
+
+
+################################################################################
+# dataframe
+################################################################################
+
+
+def test_dataframe_matches_rowwise_construction():
+    devices = Devices(DEVICES)
+    for columns in (None, ['DeviceName', 'nfc', 'gpu', 'announced']):
+        frame = devices.dataframe(columns)
+        assert frame.equals(rowwise_dataframe(devices, columns))
+        assert list(frame.columns) == list(columns or Devices._all_attributes)
+    assert devices.dataframe(['gpu'])['gpu'].isnull().all()
+    # Numeric attributes keep their dtype, only all-missing columns are
+    # objects
+    devices = Devices([{'DeviceName': 'a', 'n': 5, 'x': 1.5},
+                       {'DeviceName': 'b', 'n': 2, 'x': None}])
+    columns = ['DeviceName', 'n', 'x', 'gpu']
+    frame = devices.dataframe(columns)
+    assert frame.equals(rowwise_dataframe(devices, columns))
+    assert [frame[c].dtype.kind for c in columns[1:]] == ['i', 'f', 'O']
+
+
+def test_dataframe_of_null_devices():
+    assert Devices([]).dataframe().empty
+
+
+def test_categorical_dataframe():
+    devices = Devices([{'Brand': 'LG', 'nfc': 'No', 'DeviceName': str(i)}
+                       for i in range(20)] +
+                      [{'Brand': 'Apple', 'nfc': 'Yes'}])
+    categories = devices.categories(['Brand', 'nfc', 'DeviceName', 'gpu'])
+    assert categories == {'Brand': ['Apple', 'LG'], 'nfc': ['No', 'Yes']}
+    columns = ['Brand', 'nfc', 'DeviceName']
+    frame = devices.dataframe(columns, categorical=True)
+    assert list(frame['Brand'].cat.categories) == ['Apple', 'LG']
+    assert frame['DeviceName'].dtype != 'category'
+    pd.testing.assert_frame_equal(frame.astype(object),
+                                  devices.dataframe(columns).astype(object))
+    # Explicit categories keep their order, unknown values are appended
+    frame = devices.dataframe(columns, categorical={'Brand': ['Sony', 'LG'],
+                                                    'gpu': ['Adreno']})
+    assert list(frame['Brand'].cat.categories) == ['Sony', 'LG', 'Apple']
+    assert frame['nfc'].dtype != 'category' and 'gpu' not in frame
+    compact = devices.compact()
+    assert compact.categories() == devices.categories()
+    for categorical in (True, {'Brand': ['Sony', 'LG'], 'gpu': ['Adreno']}):
+        pd.testing.assert_frame_equal(
+            compact.dataframe(columns + ['gpu'], categorical=categorical),
+            devices.dataframe(columns + ['gpu'], categorical=categorical))
+
+
+################################################################################
+# typed_dataframe
+################################################################################
+
+
+def test_typed_dataframe_parses_specs():
+    devices = Devices([
+        {u'Brand': u'LG', u'DeviceName': u'LG Stylo 3 Plus',
+         u'battery_c': u'Li-Ion 3080 mAh battery',
+         u'weight': u'150 g (5.29 oz)',
+         u'dimensions': u'155.7 x 79.8 x 7.4 mm (6.13 x 3.14 x 0.29 in)',
+         u'size': u'5.7 inches, 89.6 cm2 (~72.1% screen-to-body ratio)',
+         u'resolution': u'1080 x 1920 pixels, 16:9 ratio (~386 ppi density)',
+         u'internal': u'32 GB, 2 GB RAM',
+         u'price': u'About 260 EUR',
+         u'announced': u'2017, May'},
+        {u'Brand': u'Nokia', u'DeviceName': u'Nokia 3310',
+         u'internal': u'16 MB', u'announced': u'Not announced yet',
+         u'weight': u'-'},
+    ])
+    typed, failures = devices.typed_dataframe()
+    lg = typed.iloc[0]
+    assert lg['DeviceName'] == 'LG Stylo 3 Plus'
+    assert (lg['battery_mah'], lg['weight_g'], lg['screen_inches']) == \
+        (3080, 150, 5.7)
+    assert (lg['height_mm'], lg['width_mm'], lg['depth_mm']) == \
+        (155.7, 79.8, 7.4)
+    assert (lg['pixel_width'], lg['pixel_height']) == (1080, 1920)
+    assert (lg['storage_gb'], lg['ram_gb']) == (32, 2)
+    assert (lg['price_value'], lg['price_currency']) == (260, 'EUR')
+    assert lg['announced_date'] == pd.Timestamp(2017, 5, 1)
+    assert typed.iloc[1]['storage_gb'] == 16 / 1024.0
+    assert np.isnan(typed.iloc[1]['battery_mah'])
+    assert sorted(failures['attribute']) == ['announced', 'weight']
+    assert list(failures.index) == [1, 1]
+    # Numeric columns stay float even when every value parses as an integer
+    typed, _ = Devices(devices.list_of_dicts()[:1]).typed_dataframe()
+    columns = ['battery_mah', 'pixel_width', 'price_value', 'announced_year']
+    assert (typed[columns].dtypes == float).all()
+
+
+def test_typed_dataframe_of_null_devices():
+    typed, failures = Devices([]).typed_dataframe()
+    assert typed.empty and failures.empty
+    assert 'battery_mah' in typed
+
+
+def test_merge_deduplicates_on_brand_and_name():
+    first = Devices([{'Brand': 'Apple', 'DeviceName': 'iPhone 7', 'os': 'iOS'},
+                     {'Brand': 'LG', 'DeviceName': 'G6'}], brand='Apple')
+    second = Devices([{'Brand': 'Apple', 'DeviceName': 'iPhone 7',
+                       'nfc': 'Yes', 'os': 'iOS 11'},
+                      {'Brand': 'LG', 'DeviceName': 'Stylo 3'}],
+                     device='iPhone 7')
+    merged = Devices.merge(first, Devices([]), second)
+    assert [d['DeviceName'] for d in merged.devices] == ['iPhone 7', 'G6',
+                                                         'Stylo 3']
+    assert merged.devices[0] is first.devices[0]
+    assert merged.input_parameters == {
+        'merged': [{'brand': 'Apple'}, {}, {'device': 'iPhone 7'}],
+        'key': ('Brand', 'DeviceName')}
+
+    assert Devices.merge(first, second,
+                         on_conflict='last').devices[0]['os'] == 'iOS 11'
+    updated = Devices.merge(first, second, on_conflict='update').devices[0]
+    assert updated == {'Brand': 'Apple', 'DeviceName': 'iPhone 7',
+                       'nfc': 'Yes', 'os': 'iOS 11'}
+    assert 'nfc' not in first.devices[0]
+    assert len(Devices.merge(first, second, key=['Brand']).devices) == 2
+    assert Devices.merge(first, second, on_conflict=lambda a, b: {
+        'Brand': 'x'}).devices[0] == {'Brand': 'x'}
+    assert Devices.merge().null
+    with pytest.raises(ValueError):
+        Devices.merge(first, on_conflict='newest')
+
+
+def test_filter_raw_and_typed_attributes():
+    devices = Devices([
+        {'Brand': 'A', 'DeviceName': 'a1', 'os': 'Android 7.0', 'nfc': 'Yes',
+         'announced': '2017, May', 'battery_c': '3000 mAh',
+         'price': 'About 300 EUR'},
+        {'Brand': 'A', 'DeviceName': 'a2', 'os': 'Android 6.0', 'nfc': 'No',
+         'announced': '2016, June', 'battery_c': '2500 mAh'},
+        {'Brand': 'B', 'DeviceName': 'b1', 'os': 'iOS 11', 'nfc': 'Yes',
+         'announced': '2017, September', 'battery_c': '1960 mAh',
+         'price': 'About 800 EUR'},
+        {'Brand': 'C', 'DeviceName': 'c1', 'announced': 'Not announced yet'},
+    ], brand='A')
+
+    def names(**conditions):
+        return [d['DeviceName'] for d in devices.filter(**conditions).devices]
+
+    assert names(os__contains='android', announced_year__ge=2017,
+                 nfc='Yes') == ['a1']
+    assert names(nfc__ne='Yes') == ['a2']
+    assert names(Brand__in=['B', 'C']) == ['b1', 'c1']
+    assert names(battery_mah__between=(1960, 2500)) == ['a2', 'b1']
+    assert names(battery_mah__lt=2500) == ['b1']
+    assert names(battery_mah=3000) == ['a1']
+    assert names(announced_year__ne=2017) == ['a2']
+    assert names(announced_date__gt='2017-05-01') == ['b1']
+    assert names(DeviceName='x') == [] and names() == ['a1', 'a2', 'b1', 'c1']
+    filtered = devices.filter(nfc='Yes')
+    assert filtered.input_parameters == {'brand': 'A',
+                                         'filter': {'nfc': 'Yes'}}
+    # Indices are built once and reused
+    index = devices.index
+    assert set(index._inverted) == {'os', 'nfc', 'Brand', 'DeviceName'}
+    assert set(index._sorted) == {'announced_year', 'battery_mah',
+                                  'announced_date'}
+    # The raw price text and its typed value are separate attributes
+    assert names(price='About 300 EUR') == ['a1']
+    assert names(price__contains='800') == ['b1']
+    assert names(price_value__gt=500, price_currency='EUR') == ['b1']
+    assert names(announced_year='2016') == ['a2']
+    with pytest.raises(ValueError):
+        devices.filter(os__gt='Android')
+    with pytest.raises(ValueError):
+        devices.filter(os__startswith='Android')
+    with pytest.raises(ValueError):
+        devices.filter(Brand__in='A')
+    with pytest.raises(ValueError):
+        devices.filter(battery_mah__between=(1960, 2500, 3000))
@@ -0,0 +1,79 @@
+"""test_export.py - tests of the chunked exports of devices.
+"""
+
+import io
+import json
+
+import pandas as pd
+import pytest
+
+from fonoapi import Devices
+from fonoapi.export import chunks, write_arrow, write_jsonl, write_parquet
+from fonoapi.testing import synthetic_devices
+
+
+DEVICES = synthetic_devices(25)
+
+
+def test_chunks_of_devices_and_generators():
+    assert [len(c) for c in chunks(Devices(DEVICES), 10)] == [10, 10, 5]
+    assert [len(c) for c in chunks(iter(DEVICES), 25)] == [25]
+    assert list(chunks(Devices([]), 10)) == []
+
+
+def test_iter_dataframes_matches_dataframe():
+    devices = Devices(DEVICES)
+    frames = list(devices.iter_dataframes(chunksize=10))
+    assert [len(frame) for frame in frames] == [10, 10, 5]
+    # An attribute missing from every device of a chunk is an object column
+    # in that chunk, so only the values are compared
+    pd.testing.assert_frame_equal(pd.concat(frames), devices.dataframe(),
+                                  check_dtype=False)
+    compact = devices.compact()
+    pd.testing.assert_frame_equal(
+        pd.concat(compact.iter_dataframes(7, columns=['Brand', 'os'])),
+        devices.dataframe(['Brand', 'os']), check_dtype=False)
+
+
+def test_iter_dataframes_categorical_chunks_concatenate():
+    devices = Devices(synthetic_devices(200))
+    frames = list(devices.iter_dataframes(chunksize=30, categorical=True))
+    frame = pd.concat(frames)
+    assert frame['Brand'].dtype == 'category'
+    assert frame['Brand'].dtype == frames[0]['Brand'].dtype
+    pd.testing.assert_frame_equal(frame.astype(object),
+                                  devices.dataframe().astype(object))
+
+
+def test_write_jsonl(tmpdir):
+    path = str(tmpdir.join('devices.jsonl'))
+    assert write_jsonl(Devices(DEVICES), path, chunksize=4) == 25
+    with open(path) as f:
+        assert [json.loads(line) for line in f] == DEVICES
+    buffer = io.StringIO()
+    write_jsonl(iter(DEVICES[:2]), buffer)
+    assert buffer.getvalue().count('\n') == 2
+
+
+def test_write_parquet_and_arrow(tmpdir):
+    pa = pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+    devices = Devices(DEVICES)
+    expected = devices.dataframe().astype(object).where(
+        devices.dataframe().notnull(), None)
+
+    path = str(tmpdir.join('devices.parquet'))
+    assert write_parquet(devices, path, chunksize=10) == 25
+    parquet = pq.ParquetFile(path)
+    assert parquet.metadata.num_row_groups == 3
+    frame = parquet.read().to_pandas().astype(object)
+    assert frame.where(frame.notnull(), None).equals(expected)
+
+    path = str(tmpdir.join('devices.arrow'))
+    assert write_arrow(iter(DEVICES), path, columns=['Brand', 'nfc'],
+                       chunksize=10) == 25
+    with pa.ipc.open_file(path) as reader:
+        assert reader.num_record_batches == 3
+        table = reader.read_all()
+    assert table.column_names == ['Brand', 'nfc']
+    assert table.column('nfc').to_pylist() == [d.get('nfc') for d in DEVICES]
@@ -0,0 +1,31 @@
+"""test_import.py - importing fonoapi must stay cheap.
+"""
+
+import os
+import subprocess
+import sys
+
+
+def modules_after(code):
+    """Run code in a fresh interpreter and return the modules it loaded.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code += '\nimport sys; print(" ".join(sys.modules))'
+    env = dict(os.environ, PYTHONPATH=root)
+    output = subprocess.check_output([sys.executable, '-c', code], env=env)
+    return set(output.decode('utf-8').split())
+
+
+def test_import_does_not_load_dataframe_dependencies():
+    modules = modules_after('import fonoapi')
+    assert not modules & {'numpy', 'pandas', 'asyncio', 'aiohttp'}
+
+
+def test_dataframe_loads_pandas_on_first_use():
+    modules = modules_after(
+        'import fonoapi\n'
+        'devices = fonoapi.Devices([{"Brand": "LG", "DeviceName": "LG G6"}])\n'
+        'assert devices.list_of_dicts()\n'
+        'assert "pandas" not in __import__("sys").modules\n'
+        'assert devices.dataframe(["Brand"]).shape == (1, 1)')
+    assert 'pandas' in modules
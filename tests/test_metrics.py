@@ -0,0 +1,74 @@
+"""test_metrics.py - tests of the instrumentation of FonoAPI calls.
+"""
+
+import fonoapi
+import pytest
+from fonoapi.cache import LRUCache
+from fonoapi.metrics import Histogram, Metrics
+
+
+def test_histogram_quantiles():
+    histogram = Histogram(buckets=(1.0, 2.0, 4.0))
+    for value in (0.5, 0.5, 1.5, 3.0, 10.0):
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert snapshot['count'] == 5 and snapshot['sum'] == 15.5
+    assert snapshot['buckets'] == [(1.0, 2), (2.0, 3), (4.0, 4),
+                                   (float('inf'), 5)]
+    assert histogram.quantile(0.5) == pytest.approx(1.5)
+    assert histogram.quantile(1.0) == 4.0
+    assert Histogram().quantile(0.5) is None
+
+
+def test_outcomes_sources_and_bytes(stub_server):
+    metrics = Metrics()
+    records = []
+    metrics.add_hook(after=records.append)
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url, cache=LRUCache(),
+                         metrics=metrics) as fon:
+        fon.getdevice('iPhone 7', brand='Apple')
+        fon.getdevice('iPhone 7', brand='Apple')
+        fon.getdevice('madeupcellphone', verbose=False)
+        fon.getlatest('Huawei')
+        stub_server.inject(500, times=1)
+        with pytest.raises(fonoapi.StatusCodeErrorNon200Exception):
+            fon.getlatest('LG')
+    with pytest.raises(fonoapi.InvalidAPITokenException):
+        fonoapi.FonoAPI('XYZ', api_url=stub_server.api_url,
+                        metrics=metrics).getlatest('LG')
+
+    snapshot = metrics.snapshot()
+    getdevice, getlatest = snapshot['getdevice'], snapshot['getlatest']
+    assert getdevice['requests'] == {'ok': 2, 'no-results': 1}
+    assert getdevice['sources'] == {'api': 2, 'cache': 1}
+    assert getlatest['requests'] == {'ok': 1, 'http-error': 1,
+                                     'invalid-token': 1}
+    assert getdevice['attempts'] == 2 and getdevice['retries'] == 0
+    assert getdevice['bytes_received'] > getdevice['bytes_sent'] > 0
+    assert getdevice['latency']['ok']['count'] == 2
+    assert set(getdevice['phases']) == {'network', 'decode', 'devices'}
+    assert [r.outcome for r in records][:3] == ['ok', 'ok', 'no-results']
+    assert 'token' not in records[0].parameters
+    assert records[0].status_code == 200 and records[1].source == 'cache'
+
+    text = metrics.prometheus()
+    assert ('fonoapi_requests_total{endpoint="getdevice",outcome="ok"} 2'
+            in text)
+    assert 'fonoapi_request_seconds_bucket{endpoint="getlatest",' in text
+    metrics.reset()
+    assert metrics.snapshot() == {}
+
+
+def test_retries_and_before_hooks(stub_server):
+    started = []
+    metrics = Metrics()
+    metrics.add_hook(before=lambda record: started.append(record.endpoint))
+    retry = fonoapi.Retry(total=2, backoff_factor=0, sleep=lambda s: None)
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url, retry=retry,
+                         rate_limit=1000, metrics=metrics) as fon:
+        stub_server.inject(503, times=2)
+        assert fon.getlatest('LG').not_null
+    data = metrics.snapshot()['getlatest']
+    assert started == ['getlatest']
+    assert data['attempts'] == 3 and data['retries'] == 2
+    assert 'throttle' in data['phases'] and 'backoff' in data['phases']
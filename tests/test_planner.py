@@ -0,0 +1,67 @@
+"""test_planner.py - tests of the BatchPlanner against a local stub server.
+"""
+
+import fonoapi
+from fonoapi.planner import BatchPlanner
+
+
+QUERIES = [('iPhone 7', 'Apple'), ('7 Plus', 'apple'), ('iPhone X', 'Apple'),
+           ('iPhone 7', 'Apple', 1), ('Honor 9', 'Huawei'), 'Stylo',
+           ('iPhone', 'Apple', 0)]
+
+
+def test_plan_uses_the_cost_model(stub_server):
+    planner = BatchPlanner(fonoapi.FonoAPI('ABC', api_url=stub_server.api_url))
+    plan = planner.plan(QUERIES)
+    assert list(plan.pulls) == ['apple'] and plan.pulls['apple'] == [0, 1, 2,
+                                                                     3, 6]
+    assert plan.calls == [4, 5]
+    assert plan.estimated_requests == 2 + 2.5 + 2
+    assert not BatchPlanner(None, pull_cost=3).plan(QUERIES).pulls
+
+
+def test_run_matches_getdevices(stub_server):
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url,
+                         coalesce=False) as fon:
+        expected = fon.getdevices(QUERIES)
+        requests = stub_server.stats['requests']
+        planner = BatchPlanner(fon)
+        results, report = planner.run(QUERIES)
+    assert [r.list_of_dicts() for r in results] == [
+        r.list_of_dicts() for r in expected]
+    assert results[2].null
+    assert stub_server.stats['requests'] - requests == 3
+    assert (report.brand_pulls, report.answered_locally,
+            report.device_calls, report.requests_saved) == (1, 5, 2, 4)
+    assert planner.hit_rates == {'apple': 1.0}
+
+
+def test_truncated_and_failed_pulls_fall_back(stub_server):
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url) as fon:
+        # With limit=1 the Apple pull is truncated, so none of its queries is
+        # answered locally and the results are those of getdevices
+        expected = fon.getdevices(QUERIES)
+        planner = BatchPlanner(fon, limit=1)
+        results, report = planner.run(QUERIES)
+        assert [r.list_of_dicts() for r in results] == [
+            r.list_of_dicts() for r in expected]
+        assert (report.brand_pulls, report.answered_locally,
+                report.device_calls) == (1, 0, 7)
+        assert planner.hit_rates == {'apple': 0.0}
+        stub_server.inject(500)
+        merged, report = BatchPlanner(fon).run(QUERIES, merge=True)
+    assert report.failed_pulls == 1 and report.device_calls == 7
+    assert report.requests_saved == -1
+    assert len(merged.list_of_dicts()) == 8
+    assert merged.input_parameters['errors'] == {}
+
+
+def test_malformed_query_fails_alone(stub_server):
+    queries = QUERIES + [42]
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url) as fon:
+        planner = BatchPlanner(fon)
+        plan = planner.plan(queries)
+        assert 7 not in plan.calls and plan.pulls['apple'] == [0, 1, 2, 3, 6]
+        results, report = planner.run(queries)
+    assert isinstance(results[7], ValueError)
+    assert results[0].not_null and report.device_calls == 2
@@ -0,0 +1,98 @@
+"""test_ratelimit.py - tests of the rate limiter and of retries.
+"""
+
+import threading
+
+import fonoapi
+import pytest
+from fonoapi.ratelimit import Retry, TokenBucket
+
+
+class FakeTime(object):
+    """A clock that only moves when something sleeps.
+    """
+
+    def __init__(self):
+        self.now, self.sleeps = 0.0, []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+################################################################################
+# TokenBucket
+################################################################################
+
+
+def test_token_bucket_burst_then_rate():
+    fake = FakeTime()
+    bucket = TokenBucket(rate=10, burst=5, clock=fake.clock, sleep=fake.sleep)
+    for _ in range(5):
+        assert bucket.acquire() == 0
+    assert bucket.acquire() == pytest.approx(0.1)
+    assert bucket.acquire() == pytest.approx(0.1)
+    fake.now += 10
+    assert bucket.acquire() == 0
+
+
+def test_token_bucket_shared_by_threads():
+    fake = FakeTime()
+    bucket = TokenBucket(rate=100, burst=1, clock=fake.clock,
+                         sleep=lambda seconds: None)
+    threads = [threading.Thread(target=bucket.acquire) for _ in range(11)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # The n-th call beyond the burst waits n / 100 seconds
+    assert bucket.waited == pytest.approx(sum(i / 100.0 for i in range(11)))
+
+
+################################################################################
+# Retry
+################################################################################
+
+
+def test_backoff_and_retry_after():
+    retry = Retry(backoff_factor=1, max_backoff=5, jitter=False)
+    assert [retry.backoff(n) for n in range(4)] == [1, 2, 4, 5]
+
+    class Response(object):
+        headers = {'Retry-After': '3'}
+
+    assert retry.delay(0, Response()) == 3
+    assert Retry(jitter=True).backoff(2) <= 2
+
+
+def test_retries_429_and_5xx(stub_server):
+    fake = FakeTime()
+    retry = Retry(total=3, backoff_factor=0.01, sleep=fake.sleep)
+    stub_server.inject(429, headers={'Retry-After': '0.05'})
+    stub_server.inject(502, '<html>Bad Gateway</html>')
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url,
+                         retry=retry, rate_limit=1000) as fon:
+        devices = fon.getdevice('Honor 9')
+    assert len(devices.list_of_dicts()) == 2
+    assert stub_server.stats['requests'] == 3
+    assert fake.sleeps[0] >= 0.05
+
+
+def test_non200_raised_when_retries_exhausted(stub_server):
+    stub_server.inject(503, times=3)
+    retry = Retry(total=2, backoff_factor=0)
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url,
+                         retry=retry) as fon:
+        with pytest.raises(fonoapi.StatusCodeErrorNon200Exception):
+            fon.getdevice('Honor 9')
+    assert stub_server.stats['requests'] == 3
+
+
+def test_non200_raised_without_retry(stub_server):
+    stub_server.inject(500, '<html>Internal Server Error</html>')
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url) as fon:
+        with pytest.raises(fonoapi.StatusCodeErrorNon200Exception):
+            fon.getlatest('LG')
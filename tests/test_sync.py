@@ -0,0 +1,47 @@
+"""test_sync.py - tests of the incremental catalog sync.
+"""
+
+import fonoapi
+from fonoapi.sync import CatalogSync, Snapshot
+
+BRANDS = ['Apple', 'LG', 'Huawei', 'Prestigio']
+
+
+def test_sync_writes_only_new_and_changed(stub_server, tmpdir):
+    snapshot = Snapshot(str(tmpdir.join('snapshot.sqlite')))
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url) as fon:
+        first = CatalogSync(fon, snapshot, BRANDS).run()
+        assert [r.new for r in first] == [2, 1, 2, 1]
+        assert len(snapshot) == 6
+        stub_server.devices[0] = dict(stub_server.devices[0], nfc=u'No')
+        stub_server.devices.append({u'Brand': u'LG', u'DeviceName': u'LG V30'})
+        second = CatalogSync(fon, snapshot, BRANDS).run()
+    assert [(r.new, r.changed, r.unchanged) for r in second] == \
+        [(0, 1, 1), (1, 0, 1), (0, 0, 2), (0, 0, 1)]
+    assert all(r.throughput > 0 for r in second)
+    assert len(snapshot) == 7
+    apple = snapshot.devices('Apple').list_of_dicts()
+    assert apple[0]['nfc'] == u'No'
+
+
+def test_sync_resumes_after_interruption(stub_server, tmpdir):
+    snapshot = Snapshot(str(tmpdir.join('snapshot.sqlite')))
+    with fonoapi.FonoAPI('ABC', api_url=stub_server.api_url) as fon:
+        getlatest = fon.getlatest
+
+        def flaky_getlatest(brand, **kwargs):
+            if brand == 'Huawei':
+                raise IOError('connection lost')
+            return getlatest(brand, **kwargs)
+
+        fon.getlatest = flaky_getlatest
+        reports = CatalogSync(fon, snapshot, BRANDS).run()
+        assert isinstance(reports[2].error, IOError)
+        requests_made = stub_server.stats['requests']
+        fon.getlatest = getlatest
+        reports = CatalogSync(fon, snapshot, BRANDS).run()
+    assert [r.skipped for r in reports] == [True, True, False, True]
+    assert stub_server.stats['requests'] == requests_made + 1
+    assert len(snapshot.devices().list_of_dicts()) == 6
+    # The run is finished, so the next one crawls everything again
+    assert snapshot.completed_brands(snapshot.start_run()) == set()